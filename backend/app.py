@@ -1,35 +1,252 @@
-from flask import Flask, render_template, request, jsonify
-import requests
+import asyncio
+import os
+import time
 
-app = Flask(__name__)
+import httpx
+from quart import Quart, Response, render_template, request, jsonify
+
+app = Quart(__name__)
+
+CONTROLLER_URL = os.getenv('CONTROLLER_URL') or 'http://controller:6000'
+
+# Tempos limite das chamadas ao Controller, em segundos, por rota. As requisições de relatório são apenas
+# enfileiradas, e o andamento é consultado depois em /api/jobs/<id>
+JOBS_TIMEOUT = 5
+SUBMIT_TIMEOUT = 10
+JOB_STATUS_TIMEOUT = 5
+JOB_WAIT_MAX_SECONDS = 25
+
+# Conexões keep-alive mantidas com o Controller. Os fluxos de eventos dos jobs, que ocupam uma conexão durante todo
+# o job, usam um pool separado, para não esgotar as conexões das demais chamadas
+CONTROLLER_MAX_CONNECTIONS = int(os.getenv('BACKEND_CONTROLLER_MAX_CONNECTIONS') or 20)
+CONTROLLER_MAX_STREAMS = int(os.getenv('BACKEND_CONTROLLER_MAX_STREAMS') or 100)
+
+# Tempo, em segundos, que cada página da listagem de jobs é reaproveitada antes de ser revalidada no Controller
+JOBS_CACHE_TTL = float(os.getenv('BACKEND_JOBS_CACHE_TTL') or 2)
+JOBS_CACHE_MAX_ENTRIES = 100
+
+# Jobs carregados por página em /jobs; as páginas seguintes são buscadas pelo navegador em /api/jobs
+JOBS_PAGE_SIZE = 50
+JOBS_QUERY_PARAMS = ('state', 'requester', 'created_from', 'created_to', 'limit', 'cursor', 'fields')
+
+
+class CircuitOpenError(Exception):
+    """
+    Lançada quando o circuito do Controller está aberto e as chamadas são recusadas sem acessar a rede.
+    """
+
+    def __init__(self, retry_after):
+        super().__init__(f"O Controller está indisponível. Tente novamente em {retry_after} segundos.")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Disjuntor das chamadas ao Controller. Após 'failure_threshold' falhas consecutivas (erros de conexão, tempos
+    esgotados ou respostas 5xx), as chamadas são recusadas imediatamente por 'reset_seconds'. Depois desse tempo,
+    uma única chamada de teste é liberada: se ela tiver sucesso o circuito fecha, caso contrário volta a abrir.
+    Chamadas que não chegam ao Controller (ex: pool de conexões do próprio backend esgotado) não são contadas.
+    """
+
+    def __init__(self, failure_threshold=5, reset_seconds=15):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def before_call(self):
+        """
+        Exceções:
+            CircuitOpenError: Lançada se o circuito estiver aberto.
+        """
+        if self._opened_at is None:
+            return
+
+        elapsed = time.monotonic() - self._opened_at
+        if elapsed < self.reset_seconds or self._probing:
+            raise CircuitOpenError(max(1, int(self.reset_seconds - elapsed)))
+        self._probing = True
+
+    def record_success(self):
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def record_skipped(self):
+        """Registra uma chamada que não chegou ao Controller, liberando a chamada de teste sem alterar o circuito."""
+        self._probing = False
+
+    def record_failure(self):
+        self._failures += 1
+        self._probing = False
+        if self._failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+
+
+controller_circuit = CircuitBreaker()
+controller_client = None
+controller_stream_client = None
+_jobs_cache = {}
+# Chamada em andamento ao Controller para cada conjunto de parâmetros da listagem de jobs
+_jobs_refreshes = {}
+
+
+@app.before_serving
+async def open_controller_client():
+    global controller_client, controller_stream_client
+    controller_client = httpx.AsyncClient(
+        base_url=CONTROLLER_URL,
+        limits=httpx.Limits(max_connections=CONTROLLER_MAX_CONNECTIONS, max_keepalive_connections=CONTROLLER_MAX_CONNECTIONS),
+        timeout=JOBS_TIMEOUT
+    )
+    controller_stream_client = httpx.AsyncClient(
+        base_url=CONTROLLER_URL,
+        limits=httpx.Limits(max_connections=CONTROLLER_MAX_STREAMS, max_keepalive_connections=0),
+        timeout=httpx.Timeout(JOB_STATUS_TIMEOUT, read=60)
+    )
+
+
+@app.after_serving
+async def close_controller_client():
+    await controller_client.aclose()
+    await controller_stream_client.aclose()
+
+
+async def call_controller(method, path, timeout, **kwargs):
+    """
+    Executa uma chamada ao Controller pelo pool de conexões, passando pelo disjuntor. A espera por uma conexão
+    livre do pool (httpx.PoolTimeout) não é uma falha do Controller e não abre o circuito.
+
+    Exceções:
+        CircuitOpenError: Lançada se o circuito estiver aberto.
+        httpx.RequestError: Lançada em caso de erro de conexão ou tempo esgotado.
+    """
+    controller_circuit.before_call()
+    try:
+        response = await controller_client.request(method, path, timeout=timeout, **kwargs)
+    except httpx.PoolTimeout:
+        controller_circuit.record_skipped()
+        raise
+    except httpx.RequestError:
+        controller_circuit.record_failure()
+        raise
+
+    if response.status_code >= 500:
+        controller_circuit.record_failure()
+    else:
+        controller_circuit.record_success()
+    return response
+
+
+async def get_jobs_listing(params):
+    """
+    Retorna uma página da listagem de jobs do Controller, reaproveitada por JOBS_CACHE_TTL segundos para os mesmos
+    parâmetros. Requisições simultâneas com os mesmos parâmetros aguardam uma única chamada ao Controller, sem
+    bloquear as demais. Após o prazo, a página é revalidada com o ETag recebido, e uma resposta 304 apenas renova
+    o prazo, sem transferir a listagem novamente.
+
+    Parâmetros:
+        params (dict): Filtros, cursor e campos repassados ao /api/jobs do Controller.
+
+    Exceções:
+        CircuitOpenError: Lançada se o circuito estiver aberto.
+        httpx.HTTPError: Lançada em caso de erro de conexão, tempo esgotado ou resposta de erro do Controller.
+    """
+    key = tuple(sorted(params.items()))
+    entry = _jobs_cache.get(key)
+    if entry is not None and time.monotonic() < entry['expires_at']:
+        return entry['data']
+
+    refresh = _jobs_refreshes.get(key)
+    if refresh is None:
+        refresh = asyncio.ensure_future(refresh_jobs_listing(key, params))
+        _jobs_refreshes[key] = refresh
+        refresh.add_done_callback(lambda task: finish_jobs_refresh(key, task))
+    # O cancelamento de uma requisição não cancela a chamada compartilhada com as demais
+    return await asyncio.shield(refresh)
+
+
+def finish_jobs_refresh(key, task):
+    _jobs_refreshes.pop(key, None)
+    if not task.cancelled():
+        # Marca o erro como tratado mesmo que todas as requisições que o aguardavam tenham sido canceladas
+        task.exception()
+
+
+async def refresh_jobs_listing(key, params):
+    """Busca (ou revalida) no Controller uma página da listagem de jobs e a grava no cache."""
+    entry = _jobs_cache.get(key)
+    headers = {'If-None-Match': entry['etag']} if entry is not None and entry['etag'] else {}
+    response = await call_controller('GET', '/api/jobs', JOBS_TIMEOUT, params=params, headers=headers)
+    now = time.monotonic()
+    if response.status_code == 304 and entry is not None:
+        entry['expires_at'] = now + JOBS_CACHE_TTL
+        return entry['data']
+
+    response.raise_for_status()
+    if len(_jobs_cache) >= JOBS_CACHE_MAX_ENTRIES:
+        for expired_key in [k for k, v in _jobs_cache.items() if v['expires_at'] <= now]:
+            del _jobs_cache[expired_key]
+        if len(_jobs_cache) >= JOBS_CACHE_MAX_ENTRIES:
+            _jobs_cache.clear()
+
+    entry = {'data': response.json(), 'etag': response.headers.get('ETag'), 'expires_at': now + JOBS_CACHE_TTL}
+    _jobs_cache[key] = entry
+    return entry['data']
+
+
+def circuit_open_response(error):
+    return jsonify({
+        'success': False,
+        'error': str(error),
+        'retry_after': error.retry_after
+    }), 503, {'Retry-After': str(error.retry_after)}
 
-CONTROLLER_URL = 'http://controller:6000'
 
 @app.route('/')
-def index():
-    return render_template('index.html')
+async def index():
+    return await render_template('index.html')
 
 @app.route('/jobs', methods=['GET'])
-def list_jobs():
-    try:
-        endpoint_url = f"{CONTROLLER_URL}/api/jobs"
+async def list_jobs():
+    state = request.args.get('state') or ''
+    params = {'limit': JOBS_PAGE_SIZE}
+    if state:
+        params['state'] = state
 
-        response = requests.get(endpoint_url)
-        response.raise_for_status()  
+    try:
+        data = await get_jobs_listing(params)
+        return await render_template(
+            'jobs.html', jobs=data.get('jobs', []), queue=data.get('queue'), states=data.get('states', []),
+            state=state, next_cursor=data.get('next_cursor')
+        )
 
-        jobs = response.json()
+    except (CircuitOpenError, httpx.HTTPError) as e:
+        return await render_template('jobs.html', jobs=[], states=[], state=state, error=str(e) or type(e).__name__)
 
-        return render_template('jobs.html', jobs=jobs)
+@app.route('/api/jobs', methods=['GET'])
+async def list_jobs_page():
+    """
+    Repassa ao navegador uma página da listagem de jobs do Controller, usada pela página /jobs para carregar
+    as páginas seguintes. Aceita os mesmos filtros do Controller: state, requester, created_from, created_to,
+    limit, cursor e fields.
+    """
+    params = {name: request.args[name] for name in JOBS_QUERY_PARAMS if request.args.get(name)}
 
-    except requests.exceptions.RequestException as e:
-        return render_template('jobs.html', jobs=[], error=str(e))
+    try:
+        return jsonify(await get_jobs_listing(params))
+    except CircuitOpenError as e:
+        return circuit_open_response(e)
+    except httpx.HTTPStatusError as e:
+        return Response(e.response.content, status=e.response.status_code, mimetype='application/json')
+    except httpx.RequestError as e:
+        return jsonify({'success': False, 'error': f'Erro ao consultar os jobs no Controller: {e}'}), 502
 
 @app.route('/api/submit', methods=['POST'])
-def submit():
-    data = request.json
-    
-    endpoint_url = f"{CONTROLLER_URL}/api/schedule"
-    
+async def submit():
+    data = await request.get_json()
+
     initial_date = data.get('initial_date')
     final_date = data.get('final_date')
     email = data.get('email')
@@ -45,42 +262,114 @@ def submit():
     }
 
     try:
-        response = requests.post(endpoint_url, json=controller_payload, timeout=5*60)
-        
-        if response.status_code == 200:
+        response = await call_controller('POST', '/api/schedule', SUBMIT_TIMEOUT, json=controller_payload)
+
+        if response.status_code in (200, 202):
+            request_id = response.json().get('request_id')
             return jsonify({
                 'success': True,
                 'message': 'Job enviado ao Controller com sucesso!',
-                # 'controller_response': response.json()
-            })
+                'request_id': request_id,
+                'status_url': f'/api/jobs/{request_id}',
+                'events_url': f'/api/jobs/{request_id}/events'
+            }), 202
+        elif response.status_code == 429:
+            retry_after = response.headers.get('Retry-After')
+            return jsonify({
+                'success': False,
+                'error': f'O Controller está sobrecarregado. Tente novamente em {retry_after} segundos.',
+                'retry_after': retry_after
+            }), 429, {'Retry-After': retry_after}
         else:
             return jsonify({
                 'success': False,
                 'error': f'Erro ao chamar o Controller: {response.text}'
             }), response.status_code
 
-    except requests.exceptions.ConnectionError:
+    except CircuitOpenError as e:
+        return circuit_open_response(e)
+
+    except httpx.ConnectError:
         return jsonify({
             'success': False,
             'error': 'Não foi possível conectar ao serviço do Controller. Verifique se o serviço está em execução e acessível.'
         }), 500
 
-    except requests.exceptions.Timeout:
+    except httpx.TimeoutException:
         return jsonify({
             'success': False,
             'error': 'A requisição ao Controller demorou muito para responder. Tente novamente mais tarde.'
         }), 500
 
-    except requests.exceptions.RequestException as e:
-        if isinstance(e, requests.exceptions.NameResolutionError):
-            return jsonify({
-                'success': False,
-                'error': 'Erro ao resolver o nome do serviço Controller. Verifique se o nome do host está correto.'
-            }), 500
+    except httpx.RequestError as e:
         return jsonify({
             'success': False,
             'error': f'Erro ao se conectar com o Controller: {e}'
         }), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+async def job_status(job_id):
+    """
+    Repassa ao navegador o andamento de um job no Controller. Aceita os parâmetros de long polling
+    'wait' (limitado a JOB_WAIT_MAX_SECONDS) e 'since'.
+    """
+    try:
+        wait = min(max(float(request.args.get('wait') or 0), 0), JOB_WAIT_MAX_SECONDS)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'O parâmetro "wait" deve ser numérico.'}), 400
+
+    try:
+        response = await call_controller(
+            'GET', f'/api/jobs/{job_id}', wait + JOB_STATUS_TIMEOUT,
+            params={'wait': wait, 'since': request.args.get('since') or 0}
+        )
+        return jsonify(response.json()), response.status_code
+    except CircuitOpenError as e:
+        return circuit_open_response(e)
+    except httpx.RequestError as e:
+        return jsonify({'success': False, 'error': f'Erro ao consultar o job no Controller: {e}'}), 502
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+async def job_events(job_id):
+    """
+    Repassa ao navegador o fluxo de Server-Sent Events com as etapas de um job no Controller, pelo pool de conexões
+    dos fluxos (até BACKEND_CONTROLLER_MAX_STREAMS fluxos simultâneos).
+    """
+    try:
+        controller_circuit.before_call()
+        controller_request = controller_stream_client.build_request('GET', f'/api/jobs/{job_id}/events')
+        response = await controller_stream_client.send(controller_request, stream=True)
+    except CircuitOpenError as e:
+        return circuit_open_response(e)
+    except httpx.PoolTimeout:
+        controller_circuit.record_skipped()
+        return jsonify({
+            'success': False,
+            'error': 'Muitos acompanhamentos de jobs simultâneos. Consulte o andamento em /api/jobs/<id>.'
+        }), 503, {'Retry-After': str(JOB_STATUS_TIMEOUT)}
+    except httpx.RequestError as e:
+        controller_circuit.record_failure()
+        return jsonify({'success': False, 'error': f'Erro ao consultar o job no Controller: {e}'}), 502
+
+    controller_circuit.record_success()
+    if response.status_code != 200:
+        body = await response.aread()
+        await response.aclose()
+        return Response(body, status=response.status_code, mimetype='application/json')
+
+    async def generate():
+        try:
+            async for chunk in response.aiter_raw():
+                yield chunk
+        except httpx.RequestError:
+            return
+        finally:
+            await response.aclose()
+
+    return Response(
+        generate(), mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
@@ -0,0 +1,203 @@
+"""
+Teste de carga do gateway do backend contra um Controller simulado.
+
+Inicia um Controller simulado (com latência configurável) e o gateway no Hypercorn, cada um em seu processo, e dispara requisições
+simultâneas ao formulário (/api/submit) e à página de jobs (/jobs). Ao final, exibe a vazão, as latências por rota,
+os erros e quantas conexões TCP e chamadas o Controller simulado recebeu, mostrando o reaproveitamento das conexões
+e o efeito do cache da listagem de jobs.
+
+Uso (na pasta backend):
+    python load_test.py --concurrency 100 --requests 5000 --controller-latency 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+
+class StubControllerHandler(BaseHTTPRequestHandler):
+    """Controller simulado: responde às rotas usadas pelo backend após a latência configurada."""
+
+    protocol_version = 'HTTP/1.1'
+    latency = 0.05
+    stats = {'connections': 0, 'requests': {}}
+    stats_lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with self.stats_lock:
+            self.stats['connections'] += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _count(self, route):
+        with self.stats_lock:
+            self.stats['requests'][route] = self.stats['requests'].get(route, 0) + 1
+        time.sleep(self.latency)
+
+    def do_GET(self):
+        if self.path == '/__stats':
+            with self.stats_lock:
+                self._reply(200, self.stats)
+        elif self.path.startswith('/api/jobs'):
+            self._count('GET /api/jobs')
+            self._reply(200, {
+                'jobs': [
+                    {
+                        'id': str(uuid.uuid4()), 'name': f'Relatório {index}', 'state': 'queued', 'error': None,
+                        'next_run_time': None, 'trigger': 'queue[normal]'
+                    }
+                    for index in range(50)
+                ],
+                'queue': {
+                    'depth': 50, 'max_depth': 100, 'running': 2, 'max_concurrency': 2,
+                    'wait_seconds': {'avg': 1.0}, 'run_seconds': {'avg': 5.0}
+                }
+            })
+        else:
+            self._reply(404, {'success': False})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        if self.path == '/api/schedule':
+            self._count('POST /api/schedule')
+            self._reply(202, {'success': True, 'request_id': str(uuid.uuid4())})
+        else:
+            self._reply(404, {'success': False})
+
+
+def run_stub_controller(port, latency):
+    StubControllerHandler.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubControllerHandler)
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+def start_stub_controller(port, latency):
+    """Inicia o Controller simulado em outro processo, para não disputar a CPU com o gateway e os clientes."""
+    process = multiprocessing.Process(target=run_stub_controller, args=(port, latency), daemon=True)
+    process.start()
+    return process
+
+
+def start_gateway(port, controller_url):
+    """Inicia o gateway (app.py) no Hypercorn, como no container do backend."""
+    return subprocess.Popen(
+        [sys.executable, '-m', 'hypercorn', 'app:app', '--bind', f'127.0.0.1:{port}', '--backlog', '1024'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env={**os.environ, 'CONTROLLER_URL': controller_url}
+    )
+
+
+async def wait_until_ready(url, timeout=15):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.RequestError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f'O gateway não respondeu em {url}.')
+
+
+async def drive_load(gateway_url, total_requests, concurrency, jobs_ratio):
+    """Dispara as requisições com 'concurrency' clientes simultâneos e retorna as latências por rota."""
+    results = {}
+    counter = iter(range(total_requests))
+    payload = {'initial_date': '2024-01-01', 'final_date': '2024-06-30', 'email': 'carga@example.com'}
+
+    async def worker(client):
+        for index in counter:
+            route = 'GET /jobs' if (index % 100) < jobs_ratio * 100 else 'POST /api/submit'
+            start_time = time.perf_counter()
+            try:
+                if route == 'GET /jobs':
+                    response = await client.get('/jobs')
+                    ok = response.status_code == 200 and 'error-message' not in response.text
+                else:
+                    response = await client.post('/api/submit', json=payload)
+                    ok = response.status_code == 202
+            except httpx.HTTPError:
+                ok = False
+            elapsed = time.perf_counter() - start_time
+
+            route_results = results.setdefault(route, {'latencies': [], 'errors': 0})
+            route_results['latencies'].append(elapsed)
+            if not ok:
+                route_results['errors'] += 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=gateway_url, limits=limits, timeout=60) as client:
+        await asyncio.gather(*[worker(client) for _ in range(concurrency)])
+    return results
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga do gateway do backend.')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--jobs-ratio', type=float, default=0.5, help='Fração das requisições feitas à página /jobs.')
+    parser.add_argument('--controller-latency', type=float, default=0.05, help='Latência do Controller simulado, em segundos.')
+    parser.add_argument('--controller-port', type=int, default=6065)
+    parser.add_argument('--gateway-port', type=int, default=5055)
+    args = parser.parse_args()
+
+    controller_url = f'http://127.0.0.1:{args.controller_port}'
+    gateway_url = f'http://127.0.0.1:{args.gateway_port}'
+    controller = start_stub_controller(args.controller_port, args.controller_latency)
+    gateway = start_gateway(args.gateway_port, controller_url)
+
+    try:
+        asyncio.run(wait_until_ready(gateway_url))
+        start_time = time.perf_counter()
+        results = asyncio.run(drive_load(gateway_url, args.requests, args.concurrency, args.jobs_ratio))
+        elapsed = time.perf_counter() - start_time
+        stats = httpx.get(f'{controller_url}/__stats').json()
+    finally:
+        gateway.terminate()
+        gateway.wait()
+        controller.terminate()
+
+    print(f"{args.requests} requisições, {args.concurrency} clientes simultâneos, "
+          f"latência do Controller {args.controller_latency * 1000:.0f} ms")
+    print(f"Tempo total: {elapsed:.2f}s ({args.requests / elapsed:.0f} req/s)")
+    print(f"{'rota':<18} | {'total':>6} | {'erros':>5} | {'p50 (ms)':>8} | {'p95 (ms)':>8} | {'máx (ms)':>8}")
+    for route, route_results in sorted(results.items()):
+        latencies = route_results['latencies']
+        print(
+            f"{route:<18} | {len(latencies):>6} | {route_results['errors']:>5} | "
+            f"{percentile(latencies, 0.5) * 1000:>8.1f} | {percentile(latencies, 0.95) * 1000:>8.1f} | "
+            f"{max(latencies) * 1000:>8.1f}"
+        )
+
+    print(f"Controller simulado: {stats['connections']} conexão(ões) TCP, chamadas por rota: {stats['requests']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -101,6 +101,7 @@ document.getElementById('dataForm').addEventListener('submit', async function(ev
         
         if (result.success) {
             showAlert('Relatório requisitado com sucesso.');
+            followJob(result.events_url);
         } else {
             showAlert(`Error: ${result.error}`, 'danger');
         }
@@ -111,6 +112,40 @@ document.getElementById('dataForm').addEventListener('submit', async function(ev
     }
 });
 
+const STAGE_LABELS = {
+    queued: 'Na fila',
+    fetching: 'Atualizando os dados de mercado',
+    spark: 'Calculando os retornos',
+    collecting: 'Coletando os resultados',
+    charting: 'Gerando os gráficos',
+    emailing: 'Enviando o e-mail',
+    done: 'Concluído',
+    failed: 'Falhou'
+};
+
+function followJob(eventsUrl) {
+    const source = new EventSource(eventsUrl);
+
+    source.addEventListener('state', function(event) {
+        const stage = JSON.parse(event.data);
+        showAlert(`Relatório requisitado com sucesso. Etapa: ${STAGE_LABELS[stage.state] || stage.state}.`);
+    });
+
+    source.addEventListener('end', function(event) {
+        const job = JSON.parse(event.data);
+        source.close();
+        if (job.state === 'done') {
+            showAlert('Relatório enviado para o e-mail informado.');
+        } else {
+            showAlert(`Error: ${job.error || 'Falha ao gerar o relatório.'}`, 'danger');
+        }
+    });
+
+    source.onerror = function() {
+        source.close();
+    };
+}
+
 function validateDate(date) {
     const re = /^(0[1-9]|[12][0-9]|3[01])\/(0[1-9]|1[0-2])\/(19|20)\d{2}$/;
     return re.test(date);
@@ -0,0 +1,57 @@
+const loadMoreButton = document.querySelector('.load-more');
+const jobsBody = document.getElementById('jobs-body');
+
+function appendCell(row, text, title) {
+    const cell = document.createElement('td');
+    cell.textContent = text;
+    if (title) {
+        cell.title = title;
+    }
+    row.appendChild(cell);
+}
+
+async function loadMoreJobs() {
+    const params = new URLSearchParams({
+        cursor: loadMoreButton.dataset.nextCursor,
+        fields: 'id,name,state,error,next_run_time,trigger'
+    });
+    if (loadMoreButton.dataset.state) {
+        params.set('state', loadMoreButton.dataset.state);
+    }
+
+    loadMoreButton.disabled = true;
+    loadMoreButton.textContent = 'Carregando...';
+
+    try {
+        const response = await fetch(`/api/jobs?${params}`);
+        const result = await response.json();
+        if (!response.ok) {
+            throw new Error(result.error);
+        }
+
+        result.jobs.forEach(function(job) {
+            const row = document.createElement('tr');
+            appendCell(row, job.id);
+            appendCell(row, job.name);
+            appendCell(row, job.state, job.error || '');
+            appendCell(row, job.next_run_time || '-');
+            appendCell(row, job.trigger);
+            jobsBody.appendChild(row);
+        });
+
+        if (result.next_cursor) {
+            loadMoreButton.dataset.nextCursor = result.next_cursor;
+            loadMoreButton.disabled = false;
+            loadMoreButton.textContent = 'Carregar mais';
+        } else {
+            loadMoreButton.remove();
+        }
+    } catch (error) {
+        loadMoreButton.disabled = false;
+        loadMoreButton.textContent = `Erro ao carregar: ${error.message}. Tentar novamente`;
+    }
+}
+
+if (loadMoreButton) {
+    loadMoreButton.addEventListener('click', loadMoreJobs);
+}
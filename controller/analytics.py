@@ -0,0 +1,395 @@
+import math
+
+import numpy as np
+
+from returns import DATE_COLUMN, log_return_column, simple_return_column
+
+# Pregões por ano, usados para anualizar a média e a volatilidade dos retornos diários
+TRADING_DAYS_PER_YEAR = 252
+
+# Quantidade de pregões da janela móvel final do período (retorno e volatilidade dos últimos N pregões)
+DEFAULT_ROLLING_WINDOW = 20
+
+# Coluna auxiliar do backend Spark: ano do pregão, usado como bloco da agregação
+_BUCKET = "bucket"
+
+
+def _empty_asset():
+    return {
+        'count': 0, 'mean': 0.0, 'm2': 0.0,
+        'log_sum': 0.0, 'log_max': 0.0, 'log_min': 0.0, 'drawdown': 0.0,
+        'tail': []
+    }
+
+
+def _empty_pair():
+    return {'count': 0, 'mean_x': 0.0, 'mean_y': 0.0, 'm2_x': 0.0, 'm2_y': 0.0, 'comoment': 0.0}
+
+
+def _pairs(price_columns):
+    """Pares de ativos (na ordem da lista) cujas covariâncias são acumuladas."""
+    return [(first, second) for index, first in enumerate(price_columns) for second in price_columns[index + 1:]]
+
+
+def _optional(value):
+    return None if value is None or math.isnan(value) else float(value)
+
+
+def empty_partial(price_columns, window=DEFAULT_ROLLING_WINDOW):
+    """
+    Acumulador vazio (elemento neutro de merge_partials).
+    """
+    pairs = {}
+    for first, second in _pairs(price_columns):
+        pairs.setdefault(first, {})[second] = _empty_pair()
+    return {'window': window, 'assets': {column: _empty_asset() for column in price_columns}, 'pairs': pairs}
+
+
+def partial_from_frame(daily_returns_df, price_columns, window=DEFAULT_ROLLING_WINDOW):
+    """
+    Calcula o acumulador das análises de um bloco de pregões consecutivos.
+
+    O acumulador guarda, por ativo, a quantidade, a média e a soma dos quadrados dos desvios (M2) dos retornos
+    simples, o estado do drawdown sobre os retornos logarítmicos acumulados e os últimos 'window' retornos; por par
+    de ativos, os mesmos momentos sobre os pregões em que ambos têm retorno, e o co-momento. Acumuladores de blocos
+    consecutivos são combinados com merge_partials sem rever os dados, e o resultado é um dicionário serializável
+    em JSON, que pode ser guardado em cache ou nos metadados de um arquivo.
+
+    Parâmetros:
+        daily_returns_df (pd.DataFrame): Retornos diários no layout largo, ordenados por data.
+        price_columns (list): Colunas de preço dos ativos; ativos sem colunas de retorno no DataFrame são ignorados.
+        window (int): Quantidade de pregões da janela móvel final.
+
+    Retorna:
+        dict: Acumulador do bloco.
+    """
+    price_columns = [column for column in price_columns if simple_return_column(column) in daily_returns_df.columns]
+    partial = empty_partial(price_columns, window)
+
+    simple_returns = {}
+    for column in price_columns:
+        simple = daily_returns_df[simple_return_column(column)].to_numpy(dtype="float64")
+        log = daily_returns_df[log_return_column(column)].to_numpy(dtype="float64")
+        valid = ~np.isnan(simple)
+        simple_returns[column] = (simple, valid)
+
+        values = simple[valid]
+        asset = partial['assets'][column]
+        if len(values):
+            asset['count'] = int(len(values))
+            asset['mean'] = float(values.mean())
+            asset['m2'] = float(((values - asset['mean']) ** 2).sum())
+
+        # Crescimento logarítmico acumulado (pregões sem retorno não alteram o patrimônio) e o pico anterior a cada
+        # pregão, incluindo o início do bloco
+        growth = np.cumsum(np.nan_to_num(log))
+        if len(growth):
+            peaks = np.maximum.accumulate(np.concatenate([[0.0], growth]))[1:]
+            asset['log_sum'] = float(growth[-1])
+            asset['log_max'] = float(max(0.0, growth.max()))
+            asset['log_min'] = float(min(0.0, growth.min()))
+            asset['drawdown'] = float(min(0.0, (growth - peaks).min()))
+
+        if window > 0:
+            asset['tail'] = [[float(s), _optional(l)] for s, l in zip(values[-window:], log[valid][-window:])]
+
+    for first, second in _pairs(price_columns):
+        (x, valid_x), (y, valid_y) = simple_returns[first], simple_returns[second]
+        both = valid_x & valid_y
+        if not both.any():
+            continue
+        x, y = x[both], y[both]
+        mean_x, mean_y = float(x.mean()), float(y.mean())
+        partial['pairs'][first][second] = {
+            'count': int(both.sum()),
+            'mean_x': mean_x,
+            'mean_y': mean_y,
+            'm2_x': float(((x - mean_x) ** 2).sum()),
+            'm2_y': float(((y - mean_y) ** 2).sum()),
+            'comoment': float(((x - mean_x) * (y - mean_y)).sum())
+        }
+
+    return partial
+
+
+def _merge_asset(first, second, window):
+    count = first['count'] + second['count']
+    if first['count'] == 0 or second['count'] == 0:
+        moments = first if second['count'] == 0 else second
+        mean, m2 = moments['mean'], moments['m2']
+    else:
+        delta = second['mean'] - first['mean']
+        mean = first['mean'] + delta * second['count'] / count
+        m2 = first['m2'] + second['m2'] + delta * delta * first['count'] * second['count'] / count
+
+    # O segundo bloco parte do patrimônio acumulado no primeiro: seu pior ponto é comparado ao pico do primeiro
+    offset = first['log_sum']
+    tail = first['tail'] + second['tail']
+    return {
+        'count': count, 'mean': mean, 'm2': m2,
+        'log_sum': offset + second['log_sum'],
+        'log_max': max(first['log_max'], offset + second['log_max']),
+        'log_min': min(first['log_min'], offset + second['log_min']),
+        'drawdown': min(first['drawdown'], second['drawdown'], offset + second['log_min'] - first['log_max']),
+        'tail': tail[-window:] if window > 0 else []
+    }
+
+
+def _merge_pair(first, second):
+    count = first['count'] + second['count']
+    if first['count'] == 0 or second['count'] == 0:
+        return dict(first if second['count'] == 0 else second)
+
+    delta_x = second['mean_x'] - first['mean_x']
+    delta_y = second['mean_y'] - first['mean_y']
+    weight = first['count'] * second['count'] / count
+    return {
+        'count': count,
+        'mean_x': first['mean_x'] + delta_x * second['count'] / count,
+        'mean_y': first['mean_y'] + delta_y * second['count'] / count,
+        'm2_x': first['m2_x'] + second['m2_x'] + delta_x * delta_x * weight,
+        'm2_y': first['m2_y'] + second['m2_y'] + delta_y * delta_y * weight,
+        'comoment': first['comoment'] + second['comoment'] + delta_x * delta_y * weight
+    }
+
+
+def merge_partials(first, second):
+    """
+    Combina os acumuladores de dois blocos consecutivos (o primeiro anterior ao segundo), com as fórmulas de Chan
+    para a média, M2 e o co-momento. O resultado é idêntico ao acumulador calculado sobre os dois blocos juntos,
+    a menos de arredondamentos.
+
+    Retorna:
+        dict: Acumulador dos dois blocos.
+    """
+    window = first['window']
+    assets = {}
+    for column in list(first['assets']) + [column for column in second['assets'] if column not in first['assets']]:
+        assets[column] = _merge_asset(
+            first['assets'].get(column, _empty_asset()), second['assets'].get(column, _empty_asset()), window
+        )
+
+    pairs = {}
+    keys = {(column, other) for source in (first['pairs'], second['pairs']) for column in source for other in source[column]}
+    for column, other in sorted(keys):
+        pairs.setdefault(column, {})[other] = _merge_pair(
+            first['pairs'].get(column, {}).get(other, _empty_pair()),
+            second['pairs'].get(column, {}).get(other, _empty_pair())
+        )
+    return {'window': window, 'assets': assets, 'pairs': pairs}
+
+
+def merge_all(partials, price_columns, window=DEFAULT_ROLLING_WINDOW):
+    """Combina, em ordem, os acumuladores de uma sequência de blocos consecutivos."""
+    merged = empty_partial(price_columns, window)
+    for partial in partials:
+        merged = merge_partials(merged, partial)
+    return merged
+
+
+def summarize(partial, benchmark=None, risk_free_rate=0.0, trading_days=TRADING_DAYS_PER_YEAR):
+    """
+    Calcula as análises do período a partir do acumulador.
+
+    Os retornos e as volatilidades estão em %: a volatilidade é o desvio padrão amostral dos retornos diários
+    simples anualizado, o índice de Sharpe é o excesso do retorno médio anualizado sobre a taxa livre de risco
+    dividido pela volatilidade, o retorno acumulado e o drawdown máximo são compostos a partir dos retornos
+    logarítmicos e o beta é a covariância com o ativo de referência dividida pela variância do ativo de referência.
+
+    Parâmetros:
+        partial (dict): Acumulador do período (ver partial_from_frame).
+        benchmark (str, opcional): Coluna de preço do ativo de referência do beta.
+        risk_free_rate (float): Taxa livre de risco anual, em %.
+        trading_days (int): Pregões por ano.
+
+    Retorna:
+        dict: 'window', 'benchmark', indicadores por ativo ('assets') e as matrizes de correlação ('correlation')
+        e de covariância amostral dos retornos diários ('covariance').
+    """
+    columns = list(partial['assets'])
+    benchmark = benchmark if benchmark in partial['assets'] else None
+
+    def pair(first, second):
+        if first == second:
+            asset = partial['assets'][first]
+            return {'count': asset['count'], 'm2_x': asset['m2'], 'm2_y': asset['m2'], 'comoment': asset['m2']}
+        if second in partial['pairs'].get(first, {}):
+            return partial['pairs'][first][second]
+        flipped = partial['pairs'].get(second, {}).get(first)
+        if flipped is None:
+            return None
+        return {**flipped, 'm2_x': flipped['m2_y'], 'm2_y': flipped['m2_x']}
+
+    correlation = {column: {} for column in columns}
+    covariance = {column: {} for column in columns}
+    for first in columns:
+        for second in columns:
+            moments = pair(first, second)
+            if moments is None or moments['count'] < 2:
+                correlation[first][second] = covariance[first][second] = None
+                continue
+            covariance[first][second] = moments['comoment'] / (moments['count'] - 1)
+            denominator = math.sqrt(moments['m2_x'] * moments['m2_y'])
+            correlation[first][second] = moments['comoment'] / denominator if denominator > 0 else None
+
+    assets = {}
+    for column, asset in partial['assets'].items():
+        count = asset['count']
+        volatility = math.sqrt(asset['m2'] / (count - 1) * trading_days) if count > 1 else None
+        annual_return = asset['mean'] * trading_days if count else None
+        sharpe = (annual_return - risk_free_rate) / volatility if volatility else None
+
+        tail = [values[0] for values in asset['tail']]
+        tail_logs = [values[1] for values in asset['tail'] if values[1] is not None]
+        rolling_volatility = float(np.std(tail, ddof=1) * math.sqrt(trading_days)) if len(tail) > 1 else None
+
+        beta = None
+        if benchmark is not None:
+            moments = pair(column, benchmark)
+            if moments is not None and moments['count'] > 1 and moments['m2_y'] > 0:
+                beta = moments['comoment'] / moments['m2_y']
+
+        assets[column] = {
+            'count': count,
+            'mean': asset['mean'] if count else None,
+            'annual_return': annual_return,
+            'volatility': volatility,
+            'sharpe': sharpe,
+            'cumulative_return': math.expm1(asset['log_sum'] / 100) * 100,
+            'max_drawdown': math.expm1(asset['drawdown'] / 100) * 100,
+            'rolling_return': math.expm1(sum(tail_logs) / 100) * 100 if tail_logs else None,
+            'rolling_volatility': rolling_volatility,
+            'beta': beta
+        }
+
+    return {
+        'window': partial['window'],
+        'benchmark': benchmark,
+        'assets': assets,
+        'correlation': correlation,
+        'covariance': covariance
+    }
+
+
+def calculate_analytics(daily_returns_df, price_columns, window=DEFAULT_ROLLING_WINDOW, **options):
+    """
+    Calcula as análises de um DataFrame de retornos diários (backend pandas de calculate_analytics_spark).
+
+    Retorna:
+        dict: Análises no formato de summarize.
+    """
+    return summarize(partial_from_frame(daily_returns_df, price_columns, window), **options)
+
+
+def partial_from_spark(daily_returns, price_columns, window=DEFAULT_ROLLING_WINDOW):
+    """
+    Backend Spark de partial_from_frame: calcula os acumuladores de cada ano do período em uma única agregação
+    (uma leitura e um shuffle), com os agregados nativos de média, variância e covariância do Spark, e combina no
+    driver os acumuladores anuais, que são poucos e pequenos.
+
+    O drawdown e os últimos retornos de cada ano dependem da ordem dos pregões: os retornos do ano são coletados
+    junto com a data, ordenados e percorridos por uma função de ordem superior (aggregate) no próprio executor.
+
+    Parâmetros:
+        daily_returns (pyspark.sql.DataFrame): Retornos diários no layout largo (ver calculate_returns_spark).
+        price_columns (list): Colunas de preço dos ativos.
+        window (int): Quantidade de pregões da janela móvel final.
+
+    Retorna:
+        dict: Acumulador do período, no formato de partial_from_frame.
+    """
+    from pyspark.sql import functions as F
+
+    def simple(column):
+        return F.col(f"`{simple_return_column(column)}`")
+
+    aggregations = []
+    for index, column in enumerate(price_columns):
+        aggregations += [
+            F.count(simple(column)).alias(f"asset{index}_count"),
+            F.avg(simple(column)).alias(f"asset{index}_mean"),
+            (F.var_pop(simple(column)) * F.count(simple(column))).alias(f"asset{index}_m2"),
+            F.sort_array(F.collect_list(F.struct(
+                F.col(DATE_COLUMN).alias("date"),
+                simple(column).alias("simple"),
+                F.col(f"`{log_return_column(column)}`").alias("log")
+            ))).alias(f"asset{index}_rows")
+        ]
+
+    pairs = _pairs(price_columns)
+    for index, (first, second) in enumerate(pairs):
+        both = simple(first).isNotNull() & simple(second).isNotNull()
+        x, y = F.when(both, simple(first)), F.when(both, simple(second))
+        count = F.count(F.when(both, F.lit(1)))
+        aggregations += [
+            count.alias(f"pair{index}_count"),
+            F.avg(x).alias(f"pair{index}_mean_x"),
+            F.avg(y).alias(f"pair{index}_mean_y"),
+            (F.var_pop(x) * count).alias(f"pair{index}_m2_x"),
+            (F.var_pop(y) * count).alias(f"pair{index}_m2_y"),
+            (F.covar_pop(x, y) * count).alias(f"pair{index}_comoment")
+        ]
+
+    def drawdown_step(state, row):
+        log_sum = state["log_sum"] + F.coalesce(row["log"], F.lit(0.0))
+        peak = F.greatest(state["log_max"], log_sum)
+        return F.struct(
+            log_sum.alias("log_sum"),
+            peak.alias("log_max"),
+            F.least(state["log_min"], log_sum).alias("log_min"),
+            F.least(state["drawdown"], log_sum - peak).alias("drawdown")
+        )
+
+    initial_state = F.struct(*[F.lit(0.0).alias(name) for name in ("log_sum", "log_max", "log_min", "drawdown")])
+    selected_columns = [F.col(_BUCKET)]
+    for index in range(len(price_columns)):
+        rows = F.col(f"asset{index}_rows")
+        valid_rows = F.filter(rows, lambda row: row["simple"].isNotNull())
+        selected_columns += [
+            F.col(f"asset{index}_count"), F.col(f"asset{index}_mean"), F.col(f"asset{index}_m2"),
+            F.aggregate(rows, initial_state, drawdown_step).alias(f"asset{index}_drawdown"),
+            F.slice(valid_rows, F.greatest(F.size(valid_rows) - window + 1, F.lit(1)), F.lit(max(window, 0)))
+                .alias(f"asset{index}_tail")
+        ]
+    selected_columns += [F.col(name) for index in range(len(pairs)) for name in (
+        f"pair{index}_count", f"pair{index}_mean_x", f"pair{index}_mean_y",
+        f"pair{index}_m2_x", f"pair{index}_m2_y", f"pair{index}_comoment"
+    )]
+
+    buckets = daily_returns \
+        .groupBy(F.year(DATE_COLUMN).alias(_BUCKET)) \
+        .agg(*aggregations) \
+        .select(*selected_columns) \
+        .collect()
+
+    partials = []
+    for bucket in sorted(buckets, key=lambda row: row[_BUCKET]):
+        partial = empty_partial(price_columns, window)
+        for index, column in enumerate(price_columns):
+            drawdown = bucket[f"asset{index}_drawdown"]
+            partial['assets'][column] = {
+                'count': int(bucket[f"asset{index}_count"]),
+                'mean': float(bucket[f"asset{index}_mean"] or 0.0),
+                'm2': float(bucket[f"asset{index}_m2"] or 0.0),
+                'log_sum': float(drawdown["log_sum"]),
+                'log_max': float(drawdown["log_max"]),
+                'log_min': float(drawdown["log_min"]),
+                'drawdown': float(drawdown["drawdown"]),
+                'tail': [[float(row["simple"]), _optional(row["log"])] for row in bucket[f"asset{index}_tail"]]
+                if window > 0 else []
+            }
+        for index, (first, second) in enumerate(pairs):
+            partial['pairs'][first][second] = {
+                name: (int if name == 'count' else float)(bucket[f"pair{index}_{name}"] or 0)
+                for name in ('count', 'mean_x', 'mean_y', 'm2_x', 'm2_y', 'comoment')
+            }
+        partials.append(partial)
+
+    return merge_all(partials, price_columns, window)
+
+
+def calculate_analytics_spark(daily_returns, price_columns, window=DEFAULT_ROLLING_WINDOW, **options):
+    """
+    Backend Spark de calculate_analytics.
+    """
+    return summarize(partial_from_spark(daily_returns, price_columns, window), **options)
@@ -1,40 +1,396 @@
+import analytics
 import atexit
 import glob
+import hashlib
+import inspect
+import json
 import os
 import pandas as pd
-import plotly.graph_objects as go
+import pyarrow as pa
 import re
+import returns
+import rolling
 import shutil
-import smtplib
 import subprocess
+import time
 import uuid
-import yfinance as yf
-from apscheduler.schedulers.background import BackgroundScheduler
+from batching import ReportRequest, slice_report_data, union_date_range
+from cache import ResultCache, file_version
+from charts import CHART_FORMAT_HTML, DEFAULT_MAX_POINTS, render_report_chart
 from datetime import datetime, timedelta
-from email.message import EmailMessage
-from flask import Flask, request, jsonify
+from dataset import DATASET_NAME, UPDATE_MARKER_PREFIX, get_update_marker, read_partitioned_dataset, to_date
+from dataset_statistics import load_statistics, range_calendar
+from filesystem import download_directory, get_filesystem, get_spark_filesystem_url
+from flask import Flask, Response, request, jsonify, stream_with_context
+from job_queue import PRIORITIES, QueueFullError, ReportQueue
+from job_store import JOB_STATES, TERMINAL_STATES, JobStore, decode_cursor, encode_cursor
+from mailer import MailQueueFullError, build_message, get_mail_queue, get_mail_queue_if_started, stop_mail_queue
+from metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, METRICS_ENABLED, count_cache_request, count_job_finished, job_context,
+    recent_spans, register_gauge, render_metrics, span
+)
+from planner import (
+    ENGINE_LOCAL, ENGINE_SPARK_LOCAL, TRADING_DAYS_PER_YEAR, estimate_trading_days, load_costs, plan_execution
+)
+from returns_store import ReturnsStore, partitions_start_date
+from rollups import RESOLUTION_DAILY, RESOLUTION_LABELS, TRADING_DAYS_COLUMN, choose_resolution
+from ingest import (
+    clear_pending_partitions, dataset_lock, get_market_data_fetcher, ingest_market_data, list_local_partitions, load_manifest,
+    range_quality, refresh_statistics
+)
+from spark_session import (
+    SPARK_MODE_SESSION, get_job_timings, get_spark_master, get_session_pool, get_spark_mode, load_script_module,
+    record_job_timing, stop_session_pool
+)
 
 app = Flask(__name__)
 
-scheduler = BackgroundScheduler()
-scheduler.start()
+atexit.register(stop_session_pool)
 
-atexit.register(lambda: scheduler.shutdown())
+result_cache = ResultCache(
+    cache_dir=os.getenv('CONTROLLER_CACHE_DIR') or '/tmp/cache',
+    max_bytes=int(os.getenv('CONTROLLER_CACHE_MAX_MB') or 256) * 1024 * 1024,
+    max_age_seconds=int(os.getenv('CONTROLLER_CACHE_MAX_AGE') or 24 * 60 * 60)
+)
+
+BATCH_WINDOW_SECONDS = int(os.getenv('CONTROLLER_BATCH_WINDOW') or 60)
+
+report_queue = ReportQueue(
+    lambda report_requests: process_report_batch(report_requests),
+    max_concurrency=int(os.getenv('CONTROLLER_MAX_CONCURRENT_JOBS') or 2),
+    max_depth=int(os.getenv('CONTROLLER_QUEUE_MAX_DEPTH') or 100),
+    max_per_requester=int(os.getenv('CONTROLLER_QUEUE_MAX_PER_REQUESTER') or 10),
+    max_batch_size=int(os.getenv('CONTROLLER_BATCH_MAX_SIZE') or 50)
+)
+
+job_store = JobStore(os.getenv('CONTROLLER_JOB_STORE_PATH') or '/tmp/data/state/jobs.db')
+
+def requeue_unfinished_jobs():
+    """
+    Reenfileira os jobs que não foram concluídos antes do último encerramento do controller.
+    """
+    unfinished_jobs = job_store.unfinished_jobs()
+    for job in unfinished_jobs:
+        report_request = ReportRequest(
+            job['script_path'], job['initial_date'], job['final_date'], job['email'],
+            priority=job['priority'],
+            delay_seconds=max(0, job['not_before'] - time.time()),
+            request_id=job['id']
+        )
+        report_queue.submit(report_request, enforce_limits=False)
+        if job['state'] != 'queued':
+            job_store.transition(job['id'], 'queued', f"Reenfileirado após reinício (estado anterior: {job['state']}).")
+
+    if unfinished_jobs:
+        print(f"{len(unfinished_jobs)} job(s) não concluído(s) reenfileirado(s).")
+
+requeue_unfinished_jobs()
+report_queue.start()
+
+atexit.register(report_queue.stop)
+atexit.register(stop_mail_queue)
+
+register_gauge('report_queue_depth', 'Requisições aguardando na fila de relatórios.', lambda: report_queue.stats()['depth'])
+register_gauge('report_queue_running', 'Lotes de relatórios em execução.', lambda: report_queue.stats()['running'])
+register_gauge('report_jobs', 'Jobs de relatório por estado atual.', job_store.count_by_state, labelname='state')
+register_gauge(
+    'report_mail_queue_depth', 'E-mails aguardando envio.',
+    lambda: get_mail_queue_if_started().stats()['depth'] if get_mail_queue_if_started() else 0
+)
+
+# Paginação da listagem de jobs
+JOBS_PAGE_SIZE = 50
+JOBS_PAGE_MAX_SIZE = 500
+JOB_FIELDS = ('id', 'name', 'state', 'error', 'initial_date', 'final_date', 'created_at', 'updated_at', 'next_run_time', 'trigger')
+
+def format_job(job):
+    """
+    Formata um job da listagem.
+    """
+    return {
+        'id': job['id'],
+        'name': f"Relatório {format_date(job['initial_date'])} - {format_date(job['final_date'])}",
+        'state': job['state'],
+        'error': job['error'],
+        'initial_date': job['initial_date'],
+        'final_date': job['final_date'],
+        'created_at': str(datetime.fromtimestamp(job['created_at'])),
+        'updated_at': str(datetime.fromtimestamp(job['updated_at'])),
+        'next_run_time': str(datetime.fromtimestamp(job['not_before'])) if job['state'] == 'queued' else None,
+        'trigger': f"queue[{job['priority']}]"
+    }
+
+def parse_jobs_query(args):
+    """
+    Valida os parâmetros da listagem de jobs.
+
+    Parâmetros aceitos:
+        state: Estados separados por vírgula.
+        requester: E-mail do solicitante.
+        created_from, created_to: Intervalo de criação dos jobs ('yyyy-mm-dd', inclusive).
+        limit: Quantidade de jobs por página (padrão 50, máximo 500).
+        cursor: Cursor da próxima página, retornado em 'next_cursor'.
+        fields: Campos de cada job, separados por vírgula.
+
+    Retorna:
+        dict: Filtros da consulta ao armazenamento de jobs e os campos selecionados.
+
+    Exceções:
+        ValueError: Lançada se algum parâmetro for inválido.
+    """
+    states = [state for state in (args.get('state') or '').split(',') if state]
+    invalid_states = [state for state in states if state not in JOB_STATES]
+    if invalid_states:
+        raise ValueError(f"Estado(s) inválido(s): {', '.join(invalid_states)}. Valores aceitos: {', '.join(JOB_STATES)}.")
+
+    fields = [field for field in (args.get('fields') or '').split(',') if field] or list(JOB_FIELDS)
+    invalid_fields = [field for field in fields if field not in JOB_FIELDS]
+    if invalid_fields:
+        raise ValueError(f"Campo(s) inválido(s): {', '.join(invalid_fields)}. Valores aceitos: {', '.join(JOB_FIELDS)}.")
+
+    try:
+        limit = int(args.get('limit') or JOBS_PAGE_SIZE)
+    except ValueError:
+        raise ValueError('O parâmetro "limit" deve ser numérico.')
+    if not 1 <= limit <= JOBS_PAGE_MAX_SIZE:
+        raise ValueError(f'O parâmetro "limit" deve estar entre 1 e {JOBS_PAGE_MAX_SIZE}.')
+
+    created_range = []
+    for name, day_offset in (('created_from', 0), ('created_to', 1)):
+        value = args.get(name)
+        if not value:
+            created_range.append(None)
+            continue
+        try:
+            created_range.append(datetime.strptime(value, '%Y-%m-%d').timestamp() + day_offset * 24 * 60 * 60)
+        except ValueError:
+            raise ValueError(f'O parâmetro "{name}" deve estar no formato "yyyy-mm-dd".')
+
+    return {
+        'states': states,
+        'requester': args.get('requester') or None,
+        'created_from': created_range[0],
+        'created_to': created_range[1],
+        'after': decode_cursor(args['cursor']) if args.get('cursor') else None,
+        'limit': limit,
+        'fields': fields
+    }
 
 @app.route('/api/jobs', methods=['GET'])
 def list_jobs():
     """
-    Retorna a lista de jobs agendados com informações básicas.
+    Retorna uma página dos jobs mais recentes com o estado atual, a quantidade de jobs por estado e as métricas
+    da fila (profundidade, tempos de espera e de execução). Os filtros e a paginação estão descritos em
+    parse_jobs_query; a próxima página é obtida com o cursor 'next_cursor'.
+
+    A resposta tem um ETag derivado da versão do armazenamento de jobs, da consulta e das métricas da fila:
+    com 'If-None-Match', uma listagem inalterada responde HTTP 304 sem consultar os jobs.
     """
+    try:
+        query = parse_jobs_query(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    queue_stats = report_queue.stats()
+    etag = hashlib.sha1(json.dumps(
+        [job_store.last_event_id(), sorted(request.args.items(multi=True)), queue_stats], sort_keys=True, default=str
+    ).encode('utf-8')).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+
+    fields = query.pop('fields')
+    limit = query['limit']
+    query['limit'] = limit + 1
+    rows = job_store.list_jobs(**query)
+
     jobs = []
-    for job in scheduler.get_jobs():
-        jobs.append({
-            'id': job.id,
-            'name': job.name,
-            'next_run_time': str(job.next_run_time),
-            'trigger': str(job.trigger)
-        })
-    return jsonify(jobs)
+    for job in rows[:limit]:
+        formatted_job = format_job(job)
+        jobs.append({field: formatted_job[field] for field in fields})
+
+    response = jsonify({
+        'jobs': jobs,
+        'next_cursor': encode_cursor(rows[limit - 1]) if len(rows) > limit else None,
+        'states': job_store.count_by_state(),
+        'queue': queue_stats
+    })
+    response.set_etag(etag, weak=True)
+    return response
+
+# Tempo máximo de espera de uma consulta de andamento em long polling, em segundos
+JOB_WAIT_MAX_SECONDS = 60
+
+def job_status(job):
+    """
+    Formata o andamento de um job: estado atual, erro e o histórico de etapas com o horário de cada uma.
+    """
+    return {
+        'id': job['id'],
+        'state': job['state'],
+        'finished': job['state'] in TERMINAL_STATES,
+        'error': job['error'],
+        'initial_date': job['initial_date'],
+        'final_date': job['final_date'],
+        'created_at': job['created_at'],
+        'updated_at': job['updated_at'],
+        'events': job['events']
+    }
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """
+    Retorna o andamento de um job. Com 'wait' (segundos), a resposta aguarda até que o job tenha mais eventos do que
+    os 'since' já conhecidos pelo cliente ou que ele termine (long polling).
+    """
+    try:
+        wait = min(max(float(request.args.get('wait') or 0), 0), JOB_WAIT_MAX_SECONDS)
+        since = int(request.args.get('since') or 0)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Os parâmetros "wait" e "since" devem ser numéricos.'}), 400
+
+    job = job_store.wait_for_events(job_id, since, wait) if wait else job_store.get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': f'Job {job_id} não encontrado.'}), 404
+    return jsonify({'success': True, 'job': job_status(job)})
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    """
+    Transmite as etapas de um job como Server-Sent Events ('event: state'), encerrando a transmissão quando o job
+    termina. Comentários periódicos mantêm a conexão aberta enquanto não há novas etapas.
+    """
+    if job_store.get_job(job_id) is None:
+        return jsonify({'success': False, 'error': f'Job {job_id} não encontrado.'}), 404
+
+    def generate():
+        seen_events = 0
+        while True:
+            job = job_store.wait_for_events(job_id, seen_events, timeout=15)
+            if job is None:
+                return
+            if len(job['events']) == seen_events:
+                yield ": keep-alive\n\n"
+                continue
+
+            for event in job['events'][seen_events:]:
+                yield f"event: state\ndata: {json.dumps(event)}\n\n"
+            seen_events = len(job['events'])
+
+            if job['state'] in TERMINAL_STATES:
+                yield f"event: end\ndata: {json.dumps(job_status(job))}\n\n"
+                return
+
+    return Response(
+        stream_with_context(generate()), mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/jobs/timings', methods=['GET'])
+def list_job_timings():
+    """
+    Retorna os tempos de execução dos jobs recentes e as médias por modo de execução Spark.
+    """
+    return jsonify(get_job_timings())
+
+@app.route('/api/returns', methods=['GET'])
+def returns_statistics():
+    """
+    Retorna a média, a variância e a quantidade de retornos de cada ativo no intervalo informado
+    ('initial_date' e 'final_date' no formato 'yyyy-mm-dd'), consultados na tabela materializada de retornos.
+    """
+    initial_date = request.args.get('initial_date')
+    final_date = request.args.get('final_date')
+    try:
+        datetime.strptime(initial_date or '', '%Y-%m-%d')
+        datetime.strptime(final_date or '', '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Informe "initial_date" e "final_date" no formato "yyyy-mm-dd".'}), 400
+
+    return jsonify({
+        'dataset_version': returns_store.dataset_version,
+        'statistics': returns_store.range_statistics(initial_date, final_date)
+    })
+
+@app.route('/api/analytics', methods=['GET'])
+def returns_analytics():
+    """
+    Retorna as análises de cada ativo no intervalo informado ('initial_date' e 'final_date' no formato 'yyyy-mm-dd'):
+    volatilidade anualizada, drawdown máximo, Sharpe, retorno acumulado, janela móvel final, beta e as matrizes de
+    correlação e covariância, combinando os acumuladores mensais da tabela materializada de retornos.
+    """
+    initial_date = request.args.get('initial_date')
+    final_date = request.args.get('final_date')
+    try:
+        datetime.strptime(initial_date or '', '%Y-%m-%d')
+        datetime.strptime(final_date or '', '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Informe "initial_date" e "final_date" no formato "yyyy-mm-dd".'}), 400
+
+    return jsonify({
+        'dataset_version': returns_store.dataset_version,
+        'analytics': analytics.summarize(
+            returns_store.analytics_partial(initial_date, final_date), ANALYTICS_BENCHMARK, RISK_FREE_RATE
+        )
+    })
+
+@app.route('/api/quality', methods=['GET'])
+def data_quality():
+    """
+    Retorna o resumo de qualidade do dataset de mercado (cotações válidas, ausentes e inválidas, maior sequência
+    sem cotação, datas repetidas ou fora de ordem), registrado durante a ingestão. Com 'initial_date' e 'final_date'
+    (formato 'yyyy-mm-dd'), considera apenas as partições mensais do intervalo.
+    """
+    manifest = load_manifest(LOCAL_DATASET_PATH)
+    initial_date = request.args.get('initial_date')
+    final_date = request.args.get('final_date')
+    if initial_date is None and final_date is None and manifest.get('quality'):
+        initial_date = partitions_start_date(manifest['quality']).isoformat()
+        final_date = datetime.today().strftime('%Y-%m-%d')
+    try:
+        datetime.strptime(initial_date or '', '%Y-%m-%d')
+        datetime.strptime(final_date or '', '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Informe "initial_date" e "final_date" no formato "yyyy-mm-dd".'}), 400
+
+    return jsonify({
+        'dataset_version': manifest.get('version', 0),
+        'quality': range_quality(manifest, initial_date, final_date)
+    })
+
+@app.route('/api/mail', methods=['GET'])
+def mail_stats():
+    """
+    Retorna as métricas da fila de e-mails: profundidade, mensagens enviadas, falhas, novas tentativas,
+    latência de entrega e as falhas mais recentes.
+    """
+    return jsonify(get_mail_queue().stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Exporta no formato do Prometheus os histogramas das etapas do fluxo de relatórios (duração, bytes e linhas),
+    o tempo de espera na fila, as consultas ao cache, os jobs concluídos e os medidores das filas.
+    """
+    if not METRICS_ENABLED:
+        return jsonify({'success': False, 'error': 'As métricas estão desativadas (CONTROLLER_METRICS_ENABLED).'}), 404
+    return Response(render_metrics(), mimetype=None, content_type=METRICS_CONTENT_TYPE)
+
+@app.route('/api/jobs/<job_id>/trace', methods=['GET'])
+def get_job_trace(job_id):
+    """
+    Retorna os spans recentes de um job (etapa, início, duração, situação, bytes e linhas), em ordem cronológica.
+    Os spans de um lote são associados a todos os jobs do lote.
+    """
+    return jsonify({'job_id': job_id, 'spans': recent_spans(job_id)})
+
+@app.route('/api/cache', methods=['GET'])
+def cache_stats():
+    """
+    Retorna os contadores de acertos e ausências do cache de resultados.
+    """
+    return jsonify(result_cache.stats())
 
 @app.route('/api/submit', methods=['POST'])
 def submit_spark_job():
@@ -51,12 +407,15 @@ def submit_spark_job():
         email = data['email']
 
         try:
-            process_spark_job_and_send_report(script_path, initial_date, final_date, email)
-            return jsonify({'success': True, 'message': 'Job Spark realizado com sucesso!'})
-        except RuntimeError as re:
-            return jsonify({'success': False, 'error': f'Erro ao executar o job Spark: {re}'}), 500
+            # A execução passa pela fila, respeitando o limite de concorrência do cluster. A resposta é imediata;
+            # o andamento do job é consultado em /api/jobs/<id>
+            report_request = ReportRequest(script_path, initial_date, final_date, email, priority='high')
+            enqueue_report_request(report_request)
+            return accepted_response(report_request, 'Job Spark enfileirado com sucesso!')
+        except QueueFullError as qfe:
+            return queue_full_response(qfe)
         except Exception as e:
-            return jsonify({'success': False, 'error': f'Erro inesperado ao executar o job Spark: {e}'}), 500
+            return jsonify({'success': False, 'error': f'Erro inesperado ao enfileirar o job Spark: {e}'}), 500
     except Exception as e:
         return jsonify({'success': False, 'error': f'Erro inesperado na solicitação: {e}'}), 500
 
@@ -75,14 +434,15 @@ def schedule_spark_job():
         email = data['email']
 
         try:
-            schedule_time = datetime.now() + timedelta(minutes=1)
-            scheduler.add_job(
-                process_spark_job_and_send_report,
-                'date',
-                run_date=schedule_time,
-                args=[script_path, initial_date, final_date, email]
+            report_request = ReportRequest(
+                script_path, initial_date, final_date, email,
+                priority=data.get('priority') or 'normal',
+                delay_seconds=BATCH_WINDOW_SECONDS
             )
-            return jsonify({'success': True, 'message': 'Job Spark agendado com sucesso!'})
+            enqueue_report_request(report_request)
+            return accepted_response(report_request, 'Job Spark agendado com sucesso!')
+        except QueueFullError as qfe:
+            return queue_full_response(qfe)
         except ValueError as ve:
             return jsonify({'success': False, 'error': f'Erro ao agendar o job: {ve}'}), 400
         except Exception as e:
@@ -90,53 +450,520 @@ def schedule_spark_job():
     except Exception as e:
         return jsonify({'success': False, 'error': f'Erro inesperado na solicitação: {e}'}), 500
 
-def process_spark_job_and_send_report(script_path, initial_date, final_date, email):
+# Ativos do relatório: ticker no Yahoo Finance, nome da coluna no dataset, nome nos gráficos e descrição no e-mail.
+# Para incluir um ativo no relatório basta adicioná-lo a esta lista
+ASSETS = [
+    {"ticker": "^GSPC", "column": "S&P500", "name": "S&P500", "label": "S&P 500"},
+    {"ticker": "BRL=X", "column": "DOLAR", "name": "Dólar", "label": "USD/BRL"},
+    # {"ticker": "AAPL", "column": "Apple", "name": "Apple", "label": "Apple"},
+    # {"ticker": "MSFT", "column": "Microsoft", "name": "Microsoft", "label": "Microsoft"},
+]
+TICKERS = [asset["ticker"] for asset in ASSETS]
+COLUMN_MAPPING = {asset["ticker"]: asset["column"] for asset in ASSETS}
+PRICE_COLUMNS = [asset["column"] for asset in ASSETS]
+DATASET_DIR = os.getenv('CONTROLLER_DATASET_DIR') or "/tmp/dataset"
+LOCAL_DATASET_PATH = os.path.join(DATASET_DIR, DATASET_NAME)
+
+# Análises do relatório: pregões da janela móvel final, ativo de referência do beta e taxa livre de risco anual (%)
+ANALYTICS_WINDOW = int(os.getenv('CONTROLLER_ANALYTICS_WINDOW') or analytics.DEFAULT_ROLLING_WINDOW)
+ANALYTICS_BENCHMARK = os.getenv('CONTROLLER_ANALYTICS_BENCHMARK') or "S&P500"
+RISK_FREE_RATE = float(os.getenv('CONTROLLER_RISK_FREE_RATE') or 0)
+
+# Tabela materializada dos retornos diários, com somas acumuladas para consultas por intervalo
+returns_store = ReturnsStore(os.path.join(DATASET_DIR, "returns_store"), analytics_window=ANALYTICS_WINDOW)
+
+# Arquivo Arrow com os resultados devolvidos diretamente pelo driver Spark
+RESULT_FILE_NAME = "result.arrow"
+RESULT_MAX_ROWS = int(os.getenv('CONTROLLER_RESULT_MAX_ROWS') or 500000)
+
+# Planejador de execução: cada job é calculado no motor de menor custo estimado entre o backend pandas do controller
+# ('local', apenas para o script padrão), o Spark em modo local no controller ('spark_local') e o cluster ('cluster',
+# no modo Spark configurado). Os custos vêm da calibração gravada pelo benchmark_planner.py
+DEFAULT_SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'script.py')
+PLANNER_ENGINE_CLUSTER = 'cluster'
+PLANNER_ENGINES = [
+    engine.strip().lower()
+    for engine in (os.getenv('CONTROLLER_PLANNER_ENGINES') or f"{ENGINE_LOCAL},{ENGINE_SPARK_LOCAL},{PLANNER_ENGINE_CLUSTER}").split(",")
+    if engine.strip()
+]
+PLANNER_CALIBRATION_PATH = os.getenv('CONTROLLER_PLANNER_CALIBRATION') or os.path.join(DATASET_DIR, "planner_calibration.json")
+LOCAL_ENGINE_MAX_ROWS = int(os.getenv('CONTROLLER_LOCAL_ENGINE_MAX_ROWS') or 5000000)
+SPARK_LOCAL_MASTER = os.getenv('CONTROLLER_SPARK_LOCAL_MASTER') or "local[*]"
+
+# Períodos longos do script padrão são montados com as agregações da tabela de retornos, sem os dados diários
+ENGINE_ROLLUP = 'rollup'
+
+# Períodos sem pregões (fins de semana, feriados ou fora do histórico) são respondidos com as estatísticas do dataset
+ENGINE_STATISTICS = 'statistics'
+
+# Gráficos do relatório: um único arquivo por relatório, com as séries longas reduzidas por LTTB
+CHART_FORMAT = (os.getenv('CONTROLLER_CHART_FORMAT') or CHART_FORMAT_HTML).strip().lower()
+CHART_MAX_POINTS = int(os.getenv('CONTROLLER_CHART_MAX_POINTS') or DEFAULT_MAX_POINTS)
+
+def enqueue_report_request(report_request):
     """
-    Gerencia todo o fluxo de execução do job Spark, cópia dos arquivos, geração de gráficos e envio de relatório.
+    Registra a requisição no armazenamento persistente de jobs e a adiciona à fila de execução.
+
+    Exceções:
+        QueueFullError: Lançada se a fila recusar a requisição; nesse caso o registro é descartado.
+    """
+    job_store.create_job(report_request)
+    try:
+        report_queue.submit(report_request)
+    except QueueFullError:
+        job_store.delete_job(report_request.request_id)
+        raise
+
+def accepted_response(report_request, message):
+    """
+    Monta a resposta HTTP 202 de uma requisição enfileirada, com o endereço de consulta do andamento do job.
+    """
+    status_url = f"/api/jobs/{report_request.request_id}"
+    return jsonify({
+        'success': True,
+        'message': message,
+        'request_id': report_request.request_id,
+        'status_url': status_url,
+        'events_url': f"{status_url}/events"
+    }), 202, {'Location': status_url}
+
+def queue_full_response(error):
+    """
+    Monta a resposta HTTP 429 para requisições recusadas pela fila, com a sugestão de nova tentativa.
+    """
+    response = jsonify({'success': False, 'error': str(error), 'retry_after': error.retry_after})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
+def process_report_batch(report_requests):
+    """
+    Processa um lote de requisições de relatório: atualiza o dataset uma única vez, obtém do cache os resultados
+    já calculados e executa um único job Spark sobre a união dos intervalos das demais requisições.
+    O resultado é então recortado por requisição e cada relatório é enviado ao respectivo destinatário.
+    Requisições do script padrão com mais pregões do que o limite de pontos dos gráficos são montadas a partir das
+    agregações semanais, mensais ou anuais da tabela de retornos, sem executar o job Spark.
+    Cada etapa é registrada no armazenamento persistente de jobs.
+
+    Parâmetros:
+        report_requests (list): Requisições (ReportRequest) a serem processadas.
+    """
+    start_time = time.perf_counter()
+    spark_mode = None
+    spark_seconds = None
+    batch_error = None
+    results = {}
+    resolutions = {}
+    report_analytics = {}
+    rolling_frames = {}
+
+    with job_context([report_request.request_id for report_request in report_requests]):
+        try:
+            spark_mode = get_spark_mode()
+            print(f"Iniciando o processamento de {len(report_requests)} requisição(ões) (modo '{spark_mode}')...")
+            
+            # Períodos já verificados e sem pregões são respondidos sem atualizar o dataset
+            statistics = load_statistics(LOCAL_DATASET_PATH)
+            pending_requests = resolve_empty_requests(report_requests, statistics, results, verified_only=True)
+            if pending_requests:
+                # Atualiza o dataset local e o envia ao HDFS, se necessário
+                job_store.transition([r.request_id for r in pending_requests], 'fetching')
+                hdfs_dataset_path, dataset_version = prepare_dataset()
+                print(hdfs_dataset_path)
+
+                # Com as estatísticas atualizadas, responde as requisições sem pregões no período
+                statistics = load_statistics(LOCAL_DATASET_PATH)
+                if statistics['version'] == dataset_version:
+                    pending_requests = resolve_empty_requests(pending_requests, statistics, results)
+                else:
+                    statistics = None
+
+            # Consulta as agregações da tabela de retornos e o cache de resultados antes de executar o job Spark
+            pending_by_script = {}
+            for report_request in pending_requests:
+                if os.path.abspath(report_request.script_path) == DEFAULT_SCRIPT_PATH and returns_store.dataset_version == dataset_version:
+                    resolution = choose_resolution(
+                        returns_store.points_by_resolution(report_request.initial_date, report_request.final_date),
+                        CHART_MAX_POINTS
+                    )
+                    if resolution != RESOLUTION_DAILY:
+                        print(f"Requisição {report_request.request_id} montada com as agregações '{resolution}' da tabela de retornos.")
+                        with job_context(report_request.request_id), span('rollup', resolution=resolution) as rollup_span:
+                            rollup_df = returns_store.rollup(report_request.initial_date, report_request.final_date, resolution)
+                            rollup_span.set(rows=len(rollup_df))
+                        results[report_request.request_id] = (
+                            rollup_df,
+                            returns_store.average_returns(report_request.initial_date, report_request.final_date),
+                            ENGINE_ROLLUP
+                        )
+                        resolutions[report_request.request_id] = resolution
+                        with job_context(report_request.request_id), span('rolling', resolution=resolution):
+                            rolling_frames[report_request.request_id] = returns_store.rolling_statistics(
+                                report_request.initial_date, report_request.final_date, resolution
+                            )
+                        report_analytics[report_request.request_id] = calculate_report_analytics(report_request, dataset_version)
+                        count_cache_request('rollup')
+                        continue
+
+                cache_key = result_cache.make_key(
+                    dataset_version, report_request.initial_date, report_request.final_date,
+                    TICKERS, f"{file_version(report_request.script_path)}-{file_version(returns.__file__)}"
+                )
+                with job_context(report_request.request_id), span('cache_lookup'):
+                    cached_result = result_cache.get(cache_key)
+                count_cache_request('miss' if cached_result is None else 'hit')
+                if cached_result is not None:
+                    print(f"Resultado obtido do cache para a requisição {report_request.request_id}.")
+                    results[report_request.request_id] = (*cached_result, 'cache')
+                    report_analytics[report_request.request_id] = calculate_report_analytics(
+                        report_request, dataset_version, daily_returns_df=cached_result[0]
+                    )
+                else:
+                    pending_by_script.setdefault(report_request.script_path, []).append((report_request, cache_key))
+
+            # Um único job Spark por script, sobre a união dos intervalos das requisições pendentes
+            for script_path, pending in pending_by_script.items():
+                pending_ids = [report_request.request_id for report_request, _ in pending]
+                union_initial_date, union_final_date = union_date_range([report_request for report_request, _ in pending])
+
+                # O cálculo é limitado ao primeiro e ao último pregão do período, e o job lê apenas as partições
+                # com pregões, conforme as estatísticas do dataset
+                compute_initial_date, compute_final_date, partitions = union_initial_date, union_final_date, None
+                if statistics is not None:
+                    calendar = range_calendar(statistics, union_initial_date, union_final_date)
+                    compute_initial_date, compute_final_date = calendar['first_date'], calendar['last_date']
+                    partitions = calendar['partitions']
+
+                plan = plan_report_job(
+                    spark_mode, script_path, compute_initial_date, compute_final_date,
+                    calendar['trading_days'] if statistics is not None else None
+                )
+                engine = plan['engine']
+                print(f"Plano de execução de {len(pending)} requisição(ões): {plan['description']}.")
+                job_store.transition(pending_ids, 'spark', f"Plano de execução: {plan['description']}.")
+                spark_start_time = time.perf_counter()
+                with job_context(pending_ids), span(
+                    'compute', engine=engine, requests=len(pending), estimated_rows=plan['rows'],
+                    estimated_seconds=plan['estimates'][engine]
+                ) as compute_span:
+                    job_id, daily_returns_df, average_daily_return_df, analytics_partial = compute_report_data(
+                        engine, script_path, compute_initial_date, compute_final_date, hdfs_dataset_path,
+                        on_collecting=lambda: job_store.transition(pending_ids, 'collecting'), partitions=partitions
+                    )
+                    compute_span.set(rows=len(daily_returns_df))
+                spark_seconds = time.perf_counter() - spark_start_time
+                print(f"Job {job_id} (modo '{engine}') calculou {len(pending)} requisição(ões) de {union_initial_date} a {union_final_date}.")
+
+                for report_request, cache_key in pending:
+                    # O acumulador das análises calculado pelo job vale apenas para o intervalo da união
+                    request_analytics_partial = None
+                    if (report_request.initial_date, report_request.final_date) == (union_initial_date, union_final_date):
+                        request_result = (daily_returns_df, average_daily_return_df)
+                        request_analytics_partial = analytics_partial
+                    else:
+                        request_result = slice_report_data(daily_returns_df, report_request.initial_date, report_request.final_date)
+
+                    # As médias do script padrão vêm da tabela de retornos, quando ela está na versão atual do dataset
+                    if os.path.abspath(script_path) == DEFAULT_SCRIPT_PATH and returns_store.dataset_version == dataset_version:
+                        request_result = (
+                            request_result[0],
+                            returns_store.average_returns(report_request.initial_date, report_request.final_date)
+                        )
+                    result_cache.put(cache_key, *request_result)
+                    results[report_request.request_id] = (*request_result, engine)
+                    report_analytics[report_request.request_id] = calculate_report_analytics(
+                        report_request, dataset_version, request_result[0], request_analytics_partial
+                    )
+
+        except RuntimeError as e:
+            batch_error = f"Erro durante o processamento do job: {e}"
+            print(batch_error)
+        except FileNotFoundError as fnf_error:
+            batch_error = f"Erro: {fnf_error}"
+            print(batch_error)
+        except ValueError as ve:
+            batch_error = f"Erro nos dados: {ve}"
+            print(batch_error)
+        except Exception as ex:
+            batch_error = f"Erro inesperado durante o processamento do job: {str(ex)}"
+            print(batch_error)
+
+    # Resumo de qualidade dos dados de cada período, registrado no manifesto durante a ingestão
+    manifest = load_manifest(LOCAL_DATASET_PATH)
+
+    # Envia os relatórios de cada requisição com resultado disponível
+    for report_request in report_requests:
+        with job_context(report_request.request_id):
+            request_mode = spark_mode
+            request_error = batch_error
+            success = False
+            delivery_queued = False
+            local_output_path = f"/tmp/output/{report_request.request_id}"
+
+            try:
+                if report_request.request_id not in results:
+                    continue
+
+                daily_returns_df, average_daily_return_df, request_mode = results[report_request.request_id]
+                send_report(
+                    report_request.initial_date, report_request.final_date, report_request.email,
+                    daily_returns_df, average_daily_return_df, local_output_path,
+                    on_stage=lambda stage, request_id=report_request.request_id: job_store.transition(request_id, stage),
+                    on_delivery=delivery_callback(report_request.request_id, request_mode),
+                    resolution=resolutions.get(report_request.request_id, RESOLUTION_DAILY),
+                    analytics_summary=report_analytics.get(report_request.request_id),
+                    rolling_statistics_df=rolling_frames.get(report_request.request_id),
+                    data_quality=range_quality(manifest, report_request.initial_date, report_request.final_date)
+                )
+                success = True
+                delivery_queued = True
+            except RuntimeError as e:
+                request_error = f"Erro durante o envio do relatório {report_request.request_id}: {e}"
+                print(request_error)
+            except FileNotFoundError as fnf_error:
+                request_error = f"Erro: {fnf_error}"
+                print(request_error)
+            except ValueError as ve:
+                request_error = f"Erro nos dados: {ve}"
+                print(request_error)
+            except Exception as ex:
+                request_error = f"Erro inesperado durante o envio do relatório {report_request.request_id}: {str(ex)}"
+                print(request_error)
+            finally:
+                # Registrar o tempo de execução do job para comparação entre os modos. Com o e-mail na fila de envio,
+                # o estado final é registrado ao término da entrega
+                if not delivery_queued:
+                    job_store.transition(report_request.request_id, 'failed', request_error or 'Resultado não disponível.')
+                    count_job_finished('failed', request_mode)
+                record_job_timing(
+                    report_request.request_id, request_mode,
+                    spark_seconds if request_mode not in ('cache', ENGINE_ROLLUP, ENGINE_STATISTICS) else None,
+                    time.perf_counter() - start_time, success
+                )
+
+                # Remover o diretório local do job ao terminar o processo
+                if os.path.exists(local_output_path):
+                    try:
+                        shutil.rmtree(local_output_path)
+                        print(f"Diretório local '{local_output_path}' removido com sucesso.")
+                    except Exception as cleanup_error:
+                        print(f"Erro ao remover o diretório local '{local_output_path}': {cleanup_error}")
+
+def delivery_callback(request_id, request_mode):
+    """
+    Cria a função chamada pela fila de e-mails ao término da entrega do relatório de uma requisição,
+    que registra o estado final do job.
+    """
+    def on_delivery(success, error):
+        if success:
+            job_store.transition(request_id, 'done', f"Resultado obtido no modo '{request_mode}'.")
+        else:
+            job_store.transition(request_id, 'failed', error or 'Falha no envio do e-mail.')
+        count_job_finished('done' if success else 'failed', request_mode)
+    return on_delivery
+
+def calculate_report_analytics(report_request, dataset_version, daily_returns_df=None, analytics_partial=None):
+    """
+    Calcula as análises do período de uma requisição (volatilidade, drawdown, Sharpe, retorno acumulado, janela
+    móvel, correlações e beta em relação a CONTROLLER_ANALYTICS_BENCHMARK).
+
+    O acumulador vem, nesta ordem, da tabela de retornos (combinando os acumuladores mensais pré-calculados), quando
+    ela está na versão atual do dataset e o script é o padrão; do job que calculou o relatório; ou dos retornos
+    diários do relatório. As análises são complementares: em caso de erro, o relatório é enviado sem elas.
+
+    Parâmetros:
+        report_request (ReportRequest): Requisição do relatório.
+        dataset_version (int): Versão atual do dataset.
+        daily_returns_df (pd.DataFrame, opcional): Retornos diários do período da requisição.
+        analytics_partial (dict, opcional): Acumulador calculado pelo job para o período da requisição.
+
+    Retorna:
+        dict: Análises no formato de analytics.summarize, ou None se não puderem ser calculadas.
+    """
+    try:
+        with span('analytics') as analytics_span:
+            if os.path.abspath(report_request.script_path) == DEFAULT_SCRIPT_PATH and returns_store.dataset_version == dataset_version:
+                analytics_partial = returns_store.analytics_partial(report_request.initial_date, report_request.final_date)
+                analytics_span.set(source='returns_store')
+            elif analytics_partial is not None:
+                analytics_span.set(source='job')
+            elif daily_returns_df is not None:
+                analytics_partial = analytics.partial_from_frame(daily_returns_df, PRICE_COLUMNS, ANALYTICS_WINDOW)
+                analytics_span.set(source='daily_returns')
+            else:
+                return None
+            return analytics.summarize(analytics_partial, ANALYTICS_BENCHMARK, RISK_FREE_RATE)
+    except Exception as e:
+        print(f"Erro ao calcular as análises da requisição {report_request.request_id}; o relatório será enviado sem elas: {e}")
+        return None
+
+def prepare_dataset():
+    """
+    Atualiza o dataset local de forma incremental e envia as partições alteradas ao HDFS.
+
+    Retorna:
+        tuple: Caminho do dataset no HDFS e versão atual do dataset.
+    """
+    with dataset_lock:
+        # Busca apenas os pregões ainda não armazenados
+        with span('fetch') as fetch_span:
+            written_partitions = ingest_market_data(get_market_data_fetcher(), TICKERS, COLUMN_MAPPING, LOCAL_DATASET_PATH)
+            fetch_span.set(partitions=len(written_partitions))
+        manifest = load_manifest(LOCAL_DATASET_PATH)
+        dataset_version = manifest.get('version', 0)
+
+        # Estatísticas do dataset (calendário de pregões), reconstruídas se estiverem ausentes ou defasadas
+        try:
+            refresh_statistics(LOCAL_DATASET_PATH, manifest)
+        except Exception as e:
+            print(f"Erro ao atualizar as estatísticas do dataset; os períodos serão calculados sem elas: {e}")
+
+        # Atualiza a tabela de retornos a partir das partições regravadas (ou por completo, se estiver defasada)
+        if returns_store.dataset_version != dataset_version:
+            since_date = partitions_start_date(written_partitions) if returns_store.dataset_version == dataset_version - 1 else None
+            try:
+                with span('returns_update', incremental=since_date is not None):
+                    returns_store.update(LOCAL_DATASET_PATH, PRICE_COLUMNS, dataset_version, since_date)
+            except Exception as e:
+                print(f"Erro ao atualizar a tabela de retornos; as médias serão calculadas pelo job: {e}")
+
+        # Em seguida, envia para o HDFS as partições alteradas
+        hdfs_dataset_path = upload_dataset_to_hdfs(LOCAL_DATASET_PATH, "/input")
+
+    return hdfs_dataset_path, dataset_version
+
+def empty_report_data():
+    """
+    Resultado de um período sem pregões: retornos diários sem linhas e médias nulas, no formato do cálculo do relatório.
+    """
+    daily_returns_df = pd.DataFrame(columns=returns.output_columns(PRICE_COLUMNS))
+    return daily_returns_df, returns.calculate_average_returns(daily_returns_df)
+
+def resolve_empty_requests(report_requests, statistics, results, verified_only=False):
+    """
+    Responde no próprio controller as requisições cujo período não tem pregões no dataset (fins de semana, feriados
+    ou datas fora do histórico), consultando o calendário de pregões das estatísticas do dataset, sem ler os dados
+    nem executar o job Spark.
 
     Parâmetros:
+        report_requests (list): Requisições (ReportRequest) a serem verificadas.
+        statistics (dict): Estatísticas do dataset (ver dataset_statistics.load_statistics).
+        results (dict): Resultados do lote por ID da requisição, que recebe as requisições respondidas.
+        verified_only (bool): Se True (consulta antes da atualização do dataset), responde apenas os períodos
+            até a última verificação de novos pregões, com as estatísticas na versão atual do dataset e cobrindo
+            todos os ativos.
+
+    Retorna:
+        list: Requisições restantes, com pregões no período ou não verificadas.
+    """
+    if verified_only and (
+        statistics['version'] != load_manifest(LOCAL_DATASET_PATH).get('version', 0) or
+        not statistics['last_checked'] or not set(PRICE_COLUMNS) <= set(statistics['columns'])
+    ):
+        return list(report_requests)
+
+    pending_requests = []
+    for report_request in report_requests:
+        if (
+            (verified_only and report_request.final_date > statistics['last_checked']) or
+            range_calendar(statistics, report_request.initial_date, report_request.final_date)['trading_days'] > 0
+        ):
+            pending_requests.append(report_request)
+            continue
+
+        print(f"Requisição {report_request.request_id} sem pregões no período; respondida com as estatísticas do dataset.")
+        results[report_request.request_id] = (*empty_report_data(), ENGINE_STATISTICS)
+        count_cache_request(ENGINE_STATISTICS)
+    return pending_requests
+
+def plan_report_job(spark_mode, script_path, initial_date, final_date, trading_days=None):
+    """
+    Escolhe onde um job será calculado (ver planner.plan_execution). As linhas são estimadas pelos pregões do período,
+    obtidos das estatísticas do dataset, e pela quantidade de ativos; o backend pandas do controller é candidato
+    apenas para o script padrão.
+
+    Parâmetros:
+        spark_mode (str): Modo Spark do cluster ('submit' ou 'session').
+        script_path (str): Caminho do script Spark do job.
+        initial_date (str): Data inicial do cálculo.
+        final_date (str): Data final do cálculo.
+        trading_days (int, opcional): Pregões do período (padrão: estimados pela quantidade de dias do período).
+
+    Retorna:
+        dict: Plano de execução, com o motor escolhido em 'engine' ('local', 'spark_local', 'submit' ou 'session').
+    """
+    if trading_days is None:
+        trading_days = estimate_trading_days((to_date(final_date) - to_date(initial_date)).days)
+
+    candidates = []
+    for engine in PLANNER_ENGINES:
+        if engine == PLANNER_ENGINE_CLUSTER:
+            engine = spark_mode
+        if engine == ENGINE_LOCAL and os.path.abspath(script_path) != DEFAULT_SCRIPT_PATH:
+            continue
+        if engine not in candidates:
+            candidates.append(engine)
+    if not candidates:
+        candidates = [spark_mode]
+
+    return plan_execution(
+        trading_days, len(PRICE_COLUMNS), candidates, load_costs(PLANNER_CALIBRATION_PATH), LOCAL_ENGINE_MAX_ROWS
+    )
+
+def compute_report_data(spark_mode, script_path, initial_date, final_date, hdfs_dataset_path, on_collecting=None,
+                        partitions=None):
+    """
+    Executa o job Spark no modo configurado e retorna os resultados como DataFrames pandas.
+    No modo 'submit', os resultados são lidos do arquivo Arrow entregue pelo driver ou, quando excedem
+    CONTROLLER_RESULT_MAX_ROWS linhas, dos arquivos CSV gravados no HDFS.
+
+    Parâmetros:
+        spark_mode (str): Modo de execução ('local', 'spark_local', 'submit' ou 'session').
         script_path (str): Caminho do script Spark a ser executado.
         initial_date (str): Data inicial para o processamento dos dados.
         final_date (str): Data final para o processamento dos dados.
-        email (str): Endereço de e-mail do destinatário do relatório.
-    
+        hdfs_dataset_path (str): Caminho do dataset no HDFS.
+        on_collecting (callable, opcional): Chamada quando o job termina e os resultados começam a ser coletados.
+        partitions (list, opcional): Partições do dataset com pregões no período, lidas pelo job Spark
+            (padrão: o job filtra todas as partições pelo período).
+
+    Retorna:
+        tuple: ID do job, DataFrame dos retornos diários, DataFrame das médias dos retornos e o acumulador das
+        análises do período (None quando os resultados vêm do HDFS).
+
     Exceções:
         RuntimeError: Lançada em caso de erro durante o processamento do job Spark.
         FileNotFoundError: Lançada se algum dos arquivos CSV esperados não for encontrado.
-        Exception: Lançada para qualquer outro erro inesperado.
     """
-    job_id = None
-    local_output_path = None
+    if spark_mode == ENGINE_LOCAL:
+        # Executa o cálculo no controller, sobre o dataset local
+        return execute_local_job(initial_date, final_date)
+
+    if spark_mode == SPARK_MODE_SESSION:
+        # Executa o cálculo na SparkSession persistente do controller
+        return execute_spark_job_in_session(script_path, initial_date, final_date, hdfs_dataset_path, partitions)
+
+    # No modo 'spark_local', o mesmo script é executado pelo spark-submit com o master local do controller
+    master = SPARK_LOCAL_MASTER if spark_mode == ENGINE_SPARK_LOCAL else None
+    job_id = execute_spark_job(script_path, initial_date, final_date, hdfs_dataset_path, partitions, master)
+    if on_collecting:
+        on_collecting()
+    
+    # Definir caminhos dos arquivos de entrada e saída
+    hdfs_output_path = f"/output/{job_id}"
+    local_output_path = f"/tmp/output/{job_id}"
+    local_output_result_path = os.path.join(local_output_path, RESULT_FILE_NAME)
+    local_output_daily_returns_path = os.path.join(local_output_path, 'daily_returns.csv')
+    local_output_average_daily_return_path = os.path.join(local_output_path, 'average_daily_return.csv')
     
     try:
-        print("Iniciando o processamento do job Spark...")
-        
-        # Primeiro, baixa o dataset localmente
-        tickers = [
-            "^GSPC", "BRL=X", 
-            # "AAPL", "MSFT"
-        ]
-        column_mapping = {
-            "^GSPC": "S&P500",
-            "BRL=X": "DOLAR",
-            # "AAPL": "Apple",
-            # "MSFT": "Microsoft"
-        }
-        local_dataset_path = fetch_latest_dataset(tickers, column_mapping=column_mapping, dataset_dir="/tmp/dataset")
-
-        # Em seguida, envia para o HDFS, se não estiver lá
-        hdfs_dataset_path = upload_to_hdfs(local_dataset_path, "/input")
-        print(hdfs_dataset_path)
-        
-        job_id = execute_spark_job(script_path, initial_date, final_date, hdfs_dataset_path)
-        
-        # Definir caminhos dos arquivos de entrada e saída
-        hdfs_output_path = f"/output/{job_id}"
-        local_output_path = f"/tmp/output/{job_id}"
-        local_output_daily_returns_path = os.path.join(local_output_path, 'daily_returns.csv')
-        local_output_average_daily_return_path = os.path.join(local_output_path, 'average_daily_return.csv')
-        
-        # Copiar e organizar arquivos do HDFS
+        # Resultados pequenos são entregues pelo driver diretamente em um arquivo Arrow local
+        if os.path.exists(local_output_result_path):
+            with span('read_result', bytes=os.path.getsize(local_output_result_path)) as read_span:
+                daily_returns_df, average_daily_return_df, analytics_partial = read_result_file(local_output_result_path)
+                read_span.set(rows=len(daily_returns_df))
+            return job_id, daily_returns_df, average_daily_return_df, analytics_partial
+
+        # Resultados grandes são gravados no HDFS: copiar e organizar os arquivos
         copy_files_and_delete_from_hdfs(hdfs_output_path, local_output_path)
         move_files_and_remove_subdirectories(local_output_path)
 
@@ -145,153 +972,294 @@ def process_spark_job_and_send_report(script_path, initial_date, final_date, ema
             raise FileNotFoundError("Um ou mais arquivos CSV não foram encontrados após o processamento do job Spark.")
         
         # Carregar dados dos CSVs
-        daily_returns_df = pd.read_csv(local_output_daily_returns_path)
-        average_daily_return_df = pd.read_csv(local_output_average_daily_return_path)
-        
-        # Contar registros e calcular retornos médios
-        daily_returns_count = daily_returns_df.shape[0]
-        
-        # Verificação de registros no DataFrame
-        if daily_returns_count == 0:
-            report_body = f"""
-                <body>
-                    <h2>Prezado,</h2>
-                    <p>Para o período solicitado de <strong>{format_date(initial_date)}</strong> até <strong>{format_date(final_date)}</strong>, 
-                    não foram encontrados registros para gerar o relatório de mercado.</p>
-                    <p>Atenciosamente,<br>Grupo do Trabalho</p>
-                </body>
-            """
-            send_email(
-                subject="Relatório de mercado (Trabalho Big Data) - Sem Registros",
-                body=report_body,
-                to_email=email
-            )
-            print("Nenhum registro encontrado no período especificado. E-mail de notificação enviado.")
-            return
+        csv_bytes = os.path.getsize(local_output_daily_returns_path) + os.path.getsize(local_output_average_daily_return_path)
+        with span('read_csv', bytes=csv_bytes) as read_span:
+            daily_returns_df = pd.read_csv(local_output_daily_returns_path)
+            average_daily_return_df = pd.read_csv(local_output_average_daily_return_path)
+            read_span.set(rows=len(daily_returns_df))
+    finally:
+        # Os resultados já estão em memória; os arquivos do job não são mais necessários
+        shutil.rmtree(local_output_path, ignore_errors=True)
 
-        # Se há registros, calcular retornos médios
-        dolar_average_daily_return = float(average_daily_return_df["Media_DOLAR_Retorno"].iloc[0])
-        sp500_average_daily_return = float(average_daily_return_df["Media_SP500_Retorno"].iloc[0])
-        
-        print(f"Número de registros de retornos diários: {daily_returns_count}.")
-        
-        # Gerar gráficos dos retornos diários
-        dolar_daily_returns_plot_path = save_graph(
-            daily_returns_df, "Date", "DOLAR_Retorno", "Dólar - Retornos Diários", "dolar_daily_returns.html", local_output_path
-        )
-        sp500_daily_returns_plot_path = save_graph(
-            daily_returns_df, "Date", "S&P500_Retorno", "S&P500 - Retornos Diários", "sp500_daily_returns.html", local_output_path
-        )
-        
-        print("Gráficos gerados com sucesso.")
-        
-        # Construir o corpo do e-mail em HTML
+    return job_id, daily_returns_df, average_daily_return_df, None
+
+def send_report(initial_date, final_date, email, daily_returns_df, average_daily_return_df, local_output_path, on_stage=None,
+                on_delivery=None, resolution=RESOLUTION_DAILY, analytics_summary=None, rolling_statistics_df=None,
+                data_quality=None):
+    """
+    Gera os gráficos dos retornos diários e envia o relatório por e-mail.
+
+    Parâmetros:
+        initial_date (str): Data inicial do período do relatório.
+        final_date (str): Data final do período do relatório.
+        email (str): Endereço de e-mail do destinatário do relatório.
+        daily_returns_df (pd.DataFrame): Retornos diários do período.
+        average_daily_return_df (pd.DataFrame): Médias dos retornos diários do período.
+        local_output_path (str): Diretório local onde os gráficos serão gerados.
+        on_stage (callable, opcional): Chamada com o nome de cada etapa ('charting', 'emailing') ao iniciá-la.
+        on_delivery (callable, opcional): Chamada ao final do envio do e-mail com (sucesso, mensagem de erro ou None).
+        resolution (str, opcional): Resolução dos dados ('D' para os retornos diários; 'W', 'M' ou 'Y' para os dados
+            agregados por semana, mês ou ano, com a quantidade de pregões de cada período).
+        analytics_summary (dict, opcional): Análises do período (ver calculate_report_analytics), incluídas no e-mail
+            em uma tabela de indicadores por ativo e uma matriz de correlação.
+        rolling_statistics_df (pd.DataFrame, opcional): Estatísticas móveis do período (ver
+            rolling.calculate_rolling_statistics); na resolução diária, são calculadas a partir dos retornos diários
+            quando não informadas (ver report_rolling_statistics).
+        data_quality (dict, opcional): Resumo de qualidade das partições do período (ver ingest.range_quality);
+            as cotações ausentes ou inválidas, excluídas do cálculo dos retornos, são informadas no e-mail.
+    """
+    on_stage = on_stage or (lambda stage: None)
+
+    # Contar registros (pregões) do período
+    if resolution == RESOLUTION_DAILY:
+        daily_returns_count = daily_returns_df.shape[0]
+    else:
+        daily_returns_count = int(daily_returns_df[TRADING_DAYS_COLUMN].sum())
+    
+    # Verificação de registros no DataFrame
+    if daily_returns_count == 0:
         report_body = f"""
             <body>
                 <h2>Prezado,</h2>
-                <p>Para o período solicitado de <strong>{format_date(initial_date)}</strong> até <strong>{format_date(final_date)}</strong>, segue o relatório de mercado:</p>
-                <ul>
-                    <li>O ativo <strong>USD/BRL (BRL=X)</strong> teve o retorno médio de <strong>{dolar_average_daily_return:.2f}%</strong>.</li>
-                    <li>O ativo <strong>S&P 500 (^GSPC)</strong> teve o retorno médio de <strong>{sp500_average_daily_return:.2f}%</strong>.</li>
-                    <li>Total de <strong>{daily_returns_count}</strong> registros encontrados.</li>
-                </ul>
-                <p>Em anexo se encontram também a performance dos ativos no período selecionado.</p>
+                <p>Para o período solicitado de <strong>{format_date(initial_date)}</strong> até <strong>{format_date(final_date)}</strong>, 
+                não foram encontrados registros para gerar o relatório de mercado.</p>
                 <p>Atenciosamente,<br>Grupo do Trabalho</p>
             </body>
         """
-        
-        # Enviar o e-mail com o relatório e anexos
+        on_stage('emailing')
         send_email(
-            subject="Relatório de mercado (Trabalho Big Data)",
+            subject="Relatório de mercado (Trabalho Big Data) - Sem Registros",
             body=report_body,
             to_email=email,
-            attachment_paths=[dolar_daily_returns_plot_path, sp500_daily_returns_plot_path]
+            on_result=on_delivery
         )
-        
-        print("Relatório enviado com sucesso.")
-        print("Processamento completo e relatório enviado com sucesso.")
+        print("Nenhum registro encontrado no período especificado. E-mail de notificação enfileirado.")
+        return
+
+    print(f"Número de registros de retornos diários: {daily_returns_count}.")
     
-    except RuntimeError as e:
-        print(f"Erro durante o processamento do job: {e}")
-    except FileNotFoundError as fnf_error:
-        print(f"Erro: {fnf_error}")
-    except ValueError as ve:
-        print(f"Erro nos dados: {ve}")
-    except Exception as ex:
-        print(f"Erro inesperado durante o processamento do job: {str(ex)}")
-    finally:
-        # Remover o diretório local do job ao terminar o processo
-        if local_output_path and os.path.exists(local_output_path):
-            try:
-                shutil.rmtree(local_output_path)
-                print(f"Diretório local '{local_output_path}' removido com sucesso.")
-            except Exception as cleanup_error:
-                print(f"Erro ao remover o diretório local '{local_output_path}': {cleanup_error}")
+    # Gerar um único arquivo com os gráficos dos retornos diários e os retornos médios de cada ativo
+    on_stage('charting')
+    chart_series = []
+    asset_items = []
+    for asset in ASSETS:
+        return_column = returns.simple_return_column(asset["column"])
+        if return_column not in daily_returns_df.columns:
+            continue
+
+        chart_series.append((return_column, f"{asset['name']} - Retornos {RESOLUTION_LABELS[resolution]}"))
+        average_daily_return = float(average_daily_return_df[returns.average_column(return_column)].iloc[0])
+        asset_items.append(
+            f"<li>O ativo <strong>{asset['label']} ({asset['ticker']})</strong> teve o retorno médio de "
+            f"<strong>{average_daily_return:.2f}%</strong>.</li>"
+        )
 
-def fetch_latest_dataset(tickers, start_date="2000-01-01", end_date=None, dataset_dir="/tmp/data/dataset", dataset_prefix="market_data", column_mapping=None):
+    plot_paths = []
+    if chart_series:
+        with span('chart', format=CHART_FORMAT, rows=len(daily_returns_df)) as chart_span:
+            plot_paths.append(render_report_chart(
+                daily_returns_df, "Date", chart_series,
+                f"Retornos {RESOLUTION_LABELS[resolution]} de {format_date(initial_date)} a {format_date(final_date)}",
+                local_output_path, "returns", chart_format=CHART_FORMAT, max_points=CHART_MAX_POINTS
+            ))
+            chart_span.set(bytes=os.path.getsize(plot_paths[-1]))
+
+    # Gerar o arquivo com as estatísticas móveis (média, desvio padrão, correlação e distância da máxima)
+    if rolling_statistics_df is None and resolution == RESOLUTION_DAILY:
+        with span('rolling', rows=len(daily_returns_df)):
+            rolling_statistics_df = report_rolling_statistics(daily_returns_df)
+    rolling_series = build_rolling_series(rolling_statistics_df) if rolling_statistics_df is not None else []
+    if rolling_series:
+        with span('chart', format=CHART_FORMAT, chart='rolling', rows=len(rolling_statistics_df)) as chart_span:
+            plot_paths.append(render_report_chart(
+                rolling_statistics_df, "Date", rolling_series,
+                f"Estatísticas móveis de {format_date(initial_date)} a {format_date(final_date)}",
+                local_output_path, "rolling", chart_format=CHART_FORMAT, max_points=CHART_MAX_POINTS
+            ))
+            chart_span.set(bytes=os.path.getsize(plot_paths[-1]))
+    
+    print("Gráficos gerados com sucesso.")
+    
+    # Construir o corpo do e-mail em HTML
+    asset_items_html = "\n                ".join(asset_items)
+    analytics_html = format_analytics_html(analytics_summary) if analytics_summary else ""
+    rolling_note = (
+        f" e as estatísticas móveis de {', '.join(str(window) for window in rolling.DEFAULT_WINDOWS[:-1])} e "
+        f"{rolling.DEFAULT_WINDOWS[-1]} pregões" if rolling_series else ""
+    )
+    resolution_note = "" if resolution == RESOLUTION_DAILY else f" (retornos {RESOLUTION_LABELS[resolution].lower()})"
+    unusable_quotes = sum(
+        values['missing'] + values['invalid'] for column, values in (data_quality or {}).get('columns', {}).items()
+        if column in PRICE_COLUMNS
+    )
+    quality_item = (
+        f"<li>{unusable_quotes} cotação(ões) ausente(s) ou inválida(s) nos meses do período foram desconsideradas "
+        f"no cálculo dos retornos.</li>" if unusable_quotes else ""
+    )
+    report_body = f"""
+        <body>
+            <h2>Prezado,</h2>
+            <p>Para o período solicitado de <strong>{format_date(initial_date)}</strong> até <strong>{format_date(final_date)}</strong>, segue o relatório de mercado:</p>
+            <ul>
+                {asset_items_html}
+                <li>Total de <strong>{daily_returns_count}</strong> registros encontrados.</li>
+                {quality_item}
+            </ul>
+            {analytics_html}
+            <p>Em anexo se encontram também a performance dos ativos no período selecionado{resolution_note}{rolling_note}.</p>
+            <p>Atenciosamente,<br>Grupo do Trabalho</p>
+        </body>
     """
-    Verifica se o dataset mais recente existe no diretório especificado. Se não existir, baixa os dados mais recentes e salva como CSV.
+    
+    # Enviar o e-mail com o relatório e anexos
+    on_stage('emailing')
+    send_email(
+        subject="Relatório de mercado (Trabalho Big Data)",
+        body=report_body,
+        to_email=email,
+        attachment_paths=plot_paths,
+        on_result=on_delivery
+    )
+    
+    print("Processamento completo e relatório enfileirado para envio.")
+
+def report_rolling_statistics(daily_returns_df):
+    """
+    Calcula as estatísticas móveis dos retornos diários de um relatório. As janelas incluem os pregões anteriores
+    ao período (ver rolling.halo_rows), lidos do dataset local, de modo que as janelas longas também tenham valor em
+    períodos curtos; o resultado é recortado aos pregões do período. Sem as colunas de preço no resultado (scripts
+    próprios), as janelas usam apenas os pregões do período.
 
     Parâmetros:
-        tickers (list): Lista de tickers para buscar dados.
-        start_date (str): Data de início no formato 'yyyy-mm-dd'. Padrão é '2000-01-01'.
-        end_date (str): Data de término no formato 'yyyy-mm-dd'. Se não especificado, será a data atual.
-        dataset_dir (str): Diretório onde o dataset será salvo. Padrão é '/tmp/data/dataset'.
-        dataset_prefix (str): Prefixo para o nome do arquivo de saída. Padrão é 'market_data'.
-        column_mapping (dict): Dicionário para renomear colunas (ex: {'BRL=X': 'DOLAR'}).
-    
+        daily_returns_df (pd.DataFrame): Preços e retornos diários do período, ordenados por data.
+
     Retorna:
-        str: Caminho do arquivo CSV gerado ou existente.
+        pd.DataFrame: Estatísticas móveis (ver rolling.calculate_rolling_statistics), uma linha por pregão do período.
     """
-    # Define a data final como a data atual, caso não seja especificada
-    if end_date is None:
-        end_date = datetime.today().strftime('%Y-%m-%d')
-    
-    # Define a data do dia para o nome do arquivo
-    today_date_str = datetime.today().strftime('%Y-%m-%d')
-
-    # Cria o nome completo do arquivo com a data atual no nome
-    dataset_name = f"{dataset_prefix}_{today_date_str}.csv"
-    dataset_path = os.path.join(dataset_dir, dataset_name)
-
-    # Verifica se o arquivo já existe
-    if os.path.exists(dataset_path):
-        print(f"Dataset já existe em: {dataset_path}")
-        return dataset_path
-
-    # Baixa os dados de mercado para os tickers especificados
-    print(f"Baixando dados de mercado para o período de {start_date} a {end_date}...")
-    dados_mercado = yf.download(tickers, start=start_date, end=end_date)["Adj Close"]
-
-    # Preencher valores ausentes com 0
-    dados_mercado = dados_mercado.fillna(0)
-
-    # Renomear as colunas se o mapeamento for fornecido
-    if column_mapping:
-        # Verifica se todas as colunas especificadas no mapeamento estão presentes no DataFrame
-        missing_columns = [col for col in column_mapping.keys() if col not in dados_mercado.columns]
-        if missing_columns:
-            raise KeyError(f"As seguintes colunas para renomeação estão ausentes no DataFrame: {missing_columns}")
-        
-        # Renomeia as colunas com base no mapeamento fornecido
-        dados_mercado = dados_mercado.rename(columns=column_mapping)
-        print(f"Colunas renomeadas de acordo com o mapeamento: {column_mapping}")
-    else:
-        # Renomeia as colunas dos tickers para facilitar o uso
-        dados_mercado.columns = [ticker.replace('^', '') for ticker in dados_mercado.columns]
+    if daily_returns_df.empty or any(column not in daily_returns_df.columns for column in PRICE_COLUMNS):
+        return rolling.calculate_rolling_statistics(daily_returns_df, PRICE_COLUMNS)
+
+    dates = pd.to_datetime(daily_returns_df["Date"])
+    first_date = dates.iloc[0].date()
+    # Dias corridos que cobrem os pregões do halo, com folga para os feriados e para as cotações válidas anteriores
+    # a eles, das quais partem os retornos dos primeiros pregões do halo
+    lookback_days = int(rolling.halo_rows() * 365 / TRADING_DAYS_PER_YEAR) + 90
+    try:
+        history_df = read_partitioned_dataset(
+            LOCAL_DATASET_PATH, first_date - timedelta(days=lookback_days), first_date - timedelta(days=1),
+            columns=PRICE_COLUMNS
+        )
+    except Exception as e:
+        print(f"Pregões anteriores ao período indisponíveis; as estatísticas móveis usarão apenas o período: {e}")
+        return rolling.calculate_rolling_statistics(daily_returns_df, PRICE_COLUMNS)
+
+    prices_df = pd.concat([
+        history_df.assign(Date=pd.to_datetime(history_df["Date"])),
+        daily_returns_df[PRICE_COLUMNS].assign(Date=dates)
+    ], ignore_index=True)[["Date"] + PRICE_COLUMNS]
+    rolling_statistics_df = rolling.calculate_rolling_statistics(
+        returns.calculate_returns(prices_df, PRICE_COLUMNS), PRICE_COLUMNS
+    ).iloc[len(history_df):].reset_index(drop=True)
+    rolling_statistics_df["Date"] = daily_returns_df["Date"].to_numpy()
+    return rolling_statistics_df
+
+def build_rolling_series(rolling_statistics_df):
+    """
+    Monta os gráficos das estatísticas móveis: para cada ativo, a média, o desvio padrão e a distância da máxima
+    móveis e, para cada par de ativos, a correlação móvel, com uma linha por janela. Janelas sem nenhum valor no
+    período (mais longas que o período) são omitidas.
 
-    # Verifica se o diretório de destino existe e cria se necessário
-    if not os.path.exists(dataset_dir):
-        os.makedirs(dataset_dir)
-        print(f"Diretório criado: {dataset_dir}")
+    Parâmetros:
+        rolling_statistics_df (pd.DataFrame): Estatísticas móveis (ver rolling.calculate_rolling_statistics).
+
+    Retorna:
+        list: Séries no formato de render_report_chart.
+    """
+    def lines(column_name):
+        return [
+            (column_name(window), f"{window} pregões") for window in rolling.DEFAULT_WINDOWS
+            if column_name(window) in rolling_statistics_df.columns and rolling_statistics_df[column_name(window)].notna().any()
+        ]
 
-    # Salva o DataFrame no caminho especificado
-    dados_mercado.to_csv(dataset_path)
-    print(f"Dados de mercado salvos em: {dataset_path}")
+    series = []
+    assets = [asset for asset in ASSETS if asset["column"] in PRICE_COLUMNS]
+    for asset in assets:
+        column = asset["column"]
+        series += [
+            (lines(lambda window: rolling.rolling_mean_column(column, window)), f"{asset['name']} - Média móvel dos retornos"),
+            (lines(lambda window: rolling.rolling_std_column(column, window)), f"{asset['name']} - Desvio padrão móvel dos retornos"),
+            (lines(lambda window: rolling.distance_from_high_column(column, window)), f"{asset['name']} - Distância da máxima móvel")
+        ]
+    for index, first in enumerate(assets):
+        for second in assets[index + 1:]:
+            series.append((
+                lines(lambda window: rolling.rolling_correlation_column(first["column"], second["column"], window)),
+                f"Correlação móvel {first['name']} x {second['name']}"
+            ))
+    return [(series_lines, title) for series_lines, title in series if series_lines]
+
+def format_analytics_html(analytics_summary):
+    """
+    Monta as tabelas HTML das análises do período: os indicadores de cada ativo e a matriz de correlação
+    dos retornos diários.
 
-    return dataset_path
+    Parâmetros:
+        analytics_summary (dict): Análises no formato de analytics.summarize.
 
-def execute_spark_job(script_path, initial_date, final_date, hdfs_dataset_path):
+    Retorna:
+        str: Tabelas HTML para o corpo do e-mail.
+    """
+    def number(value, suffix=""):
+        return "-" if value is None else f"{value:.2f}{suffix}"
+
+    labels = {asset["column"]: asset["label"] for asset in ASSETS}
+    columns = [column for column in PRICE_COLUMNS if column in analytics_summary['assets']]
+    cell = 'style="border: 1px solid #ddd; padding: 4px 8px; text-align: right;"'
+    header = 'style="border: 1px solid #ddd; padding: 4px 8px; background: #f2f2f2;"'
+
+    benchmark = analytics_summary.get('benchmark')
+    beta_header = f"Beta ({labels.get(benchmark, benchmark)})" if benchmark else "Beta"
+    window = analytics_summary['window']
+    headers = [
+        "Ativo", "Retorno acumulado", "Volatilidade anual", "Sharpe", "Drawdown máximo", beta_header,
+        f"Retorno ({window} pregões)", f"Volatilidade ({window} pregões)"
+    ]
+    rows = []
+    for column in columns:
+        values = analytics_summary['assets'][column]
+        rows.append("<tr>" + "".join([
+            f"<td {header}>{labels.get(column, column)}</td>",
+            f"<td {cell}>{number(values['cumulative_return'], '%')}</td>",
+            f"<td {cell}>{number(values['volatility'], '%')}</td>",
+            f"<td {cell}>{number(values['sharpe'])}</td>",
+            f"<td {cell}>{number(values['max_drawdown'], '%')}</td>",
+            f"<td {cell}>{number(values['beta'])}</td>",
+            f"<td {cell}>{number(values['rolling_return'], '%')}</td>",
+            f"<td {cell}>{number(values['rolling_volatility'], '%')}</td>"
+        ]) + "</tr>")
+
+    html = (
+        "<p>Indicadores do período:</p>"
+        "<table style=\"border-collapse: collapse;\">"
+        "<tr>" + "".join(f"<th {header}>{title}</th>" for title in headers) + "</tr>" +
+        "".join(rows) + "</table>"
+    )
+
+    if len(columns) > 1:
+        correlation = analytics_summary['correlation']
+        html += (
+            "<p>Correlação dos retornos diários:</p>"
+            "<table style=\"border-collapse: collapse;\">"
+            "<tr><th " + header + "></th>" + "".join(f"<th {header}>{labels.get(column, column)}</th>" for column in columns) + "</tr>" +
+            "".join(
+                f"<tr><td {header}>{labels.get(first, first)}</td>" +
+                "".join(f"<td {cell}>{number(correlation[first][second])}</td>" for second in columns) + "</tr>"
+                for first in columns
+            ) + "</table>"
+        )
+    return html
+
+def execute_spark_job(script_path, initial_date, final_date, hdfs_dataset_path, partitions=None, master=None):
     """
     Executa o job Spark e retorna o job_id.
 
@@ -299,6 +1267,8 @@ def execute_spark_job(script_path, initial_date, final_date, hdfs_dataset_path):
         script_path (str): Caminho para o script do Spark a ser executado.
         initial_date (str): Data inicial para o processamento dos dados.
         final_date (str): Data final para o processamento dos dados.
+        partitions (list, opcional): Partições do dataset com pregões no período, repassadas em '--partitions'.
+        master (str, opcional): Master Spark do job (padrão: o master do cluster).
 
     Retorna:
         str: ID único do job executado.
@@ -316,20 +1286,30 @@ def execute_spark_job(script_path, initial_date, final_date, hdfs_dataset_path):
         print(error_message)
         raise FileNotFoundError(error_message)
 
-    # Comando para executar o job Spark
+    # Comando para executar o job Spark. O driver roda no controller e grava os resultados pequenos
+    # diretamente no diretório local do job
     command = [
         'spark-submit',
         script_path,
         initial_date,
         final_date,
         job_id,
-        hdfs_dataset_path
+        hdfs_dataset_path,
+        '--result-path', os.path.join(f"/tmp/output/{job_id}", RESULT_FILE_NAME),
+        '--max-result-rows', str(RESULT_MAX_ROWS),
+        '--columns', ','.join(PRICE_COLUMNS),
+        '--filesystem-url', get_spark_filesystem_url(),
+        '--master', master or get_spark_master(),
+        '--analytics-window', str(ANALYTICS_WINDOW)
     ]
+    if partitions:
+        command += ['--partitions', ','.join(partitions)]
 
     try:
         # Executar o comando e capturar a saída
         print(f"Executando comando: {' '.join(command)}")
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
+        with span('spark_submit', spark_job_id=job_id):
+            result = subprocess.run(command, capture_output=True, text=True, check=True)
         
         # Exibir a saída padrão e de erro, se houver
         print("Saída do job Spark:")
@@ -357,6 +1337,117 @@ def execute_spark_job(script_path, initial_date, final_date, hdfs_dataset_path):
         print(error_message)
         raise RuntimeError(error_message)
 
+def execute_spark_job_in_session(script_path, initial_date, final_date, hdfs_dataset_path, partitions=None):
+    """
+    Executa o cálculo do relatório na SparkSession persistente do controller, sem iniciar um novo spark-submit.
+
+    Parâmetros:
+        script_path (str): Caminho para o script do Spark que contém a função 'run_report'.
+        initial_date (str): Data inicial para o processamento dos dados.
+        final_date (str): Data final para o processamento dos dados.
+        hdfs_dataset_path (str): Caminho do dataset no HDFS.
+        partitions (list, opcional): Partições do dataset com pregões no período, repassadas a 'run_report'
+            quando o script aceita o parâmetro 'partitions'.
+
+    Retorna:
+        tuple: ID único do job, DataFrame pandas dos retornos diários, DataFrame pandas das médias e o acumulador
+        das análises (None se o script não define 'run_analytics').
+
+    Exceções:
+        RuntimeError: Lançada em caso de erro ao executar o job Spark.
+        FileNotFoundError: Lançada se o script especificado não for encontrado.
+    """
+    job_id = str(uuid.uuid4())
+    print(f"Iniciando job Spark na sessão persistente com ID único: {job_id}")
+
+    script_module = load_script_module(script_path)
+    hdfs_input_dataset_path = f"{get_spark_filesystem_url()}{hdfs_dataset_path}"
+
+    try:
+        with span('spark_session', spark_job_id=job_id), get_session_pool().acquire() as spark:
+            spark.sparkContext.setJobGroup(job_id, f"Relatório {initial_date} - {final_date}")
+            report_options = {}
+            if partitions and 'partitions' in inspect.signature(script_module.run_report).parameters:
+                report_options['partitions'] = partitions
+            daily_returns, average_returns = script_module.run_report(
+                spark, hdfs_input_dataset_path, initial_date, final_date, PRICE_COLUMNS, **report_options
+            )
+
+            # Os resultados são pequenos e podem ser coletados diretamente no controller. Os retornos ficam em cache
+            # durante a coleta e as análises, para que o dataset seja lido uma única vez
+            daily_returns = daily_returns.persist()
+            try:
+                with span('spark_collect', spark_job_id=job_id) as collect_span:
+                    daily_returns_df = daily_returns.toPandas()
+                    average_daily_return_df = average_returns.toPandas()
+                    collect_span.set(rows=len(daily_returns_df))
+
+                analytics_partial = None
+                if hasattr(script_module, 'run_analytics'):
+                    with span('spark_analytics', spark_job_id=job_id):
+                        analytics_partial = script_module.run_analytics(daily_returns, PRICE_COLUMNS, ANALYTICS_WINDOW)
+            finally:
+                daily_returns.unpersist()
+
+        return job_id, daily_returns_df, average_daily_return_df, analytics_partial
+
+    except RuntimeError:
+        raise
+    except Exception as ex:
+        error_message = f"Erro inesperado ao executar o job Spark com ID {job_id} na sessão persistente: {str(ex)}"
+        print(error_message)
+        raise RuntimeError(error_message)
+
+def execute_local_job(initial_date, final_date):
+    """
+    Calcula o relatório no próprio controller com o backend pandas do motor de retornos, lendo do dataset
+    local apenas as partições do período. Os resultados são idênticos aos do script Spark.
+
+    Parâmetros:
+        initial_date (str): Data inicial para o processamento dos dados.
+        final_date (str): Data final para o processamento dos dados.
+
+    Retorna:
+        tuple: ID único do job, DataFrame pandas dos retornos diários, DataFrame pandas das médias e o acumulador
+        das análises.
+    """
+    job_id = str(uuid.uuid4())
+    print(f"Iniciando cálculo local com ID único: {job_id}")
+
+    try:
+        with span('local_engine') as local_span:
+            df = read_partitioned_dataset(LOCAL_DATASET_PATH, initial_date, final_date, columns=PRICE_COLUMNS)
+
+            daily_returns_df = returns.calculate_returns(df, PRICE_COLUMNS)
+            average_daily_return_df = returns.calculate_average_returns(daily_returns_df)
+            analytics_partial = analytics.partial_from_frame(daily_returns_df, PRICE_COLUMNS, ANALYTICS_WINDOW)
+            local_span.set(rows=len(daily_returns_df))
+        return job_id, daily_returns_df, average_daily_return_df, analytics_partial
+
+    except Exception as ex:
+        error_message = f"Erro inesperado ao calcular o relatório {job_id} no controller: {str(ex)}"
+        print(error_message)
+        raise RuntimeError(error_message)
+
+def read_result_file(result_file_path):
+    """
+    Lê o arquivo Arrow com os resultados do job Spark.
+
+    Parâmetros:
+        result_file_path (str): Caminho do arquivo Arrow gravado pelo driver Spark.
+
+    Retorna:
+        tuple: DataFrame dos retornos diários, DataFrame das médias dos retornos e o acumulador das análises
+        (None se o arquivo não o contém).
+    """
+    with pa.OSFile(result_file_path, 'rb') as source:
+        table = pa.ipc.open_file(source).read_all()
+
+    metadata = table.schema.metadata or {}
+    averages = json.loads(metadata.get(b'average_returns', b'{}'))
+    analytics_partial = json.loads(metadata[b'analytics']) if b'analytics' in metadata else None
+    return table.to_pandas(), pd.DataFrame([averages]), analytics_partial
+
 def copy_files_and_delete_from_hdfs(hdfs_output_path, local_output_path):
     """
     Copia arquivos do HDFS para o sistema de arquivos local e remove a pasta do HDFS após a cópia.
@@ -369,60 +1460,29 @@ def copy_files_and_delete_from_hdfs(hdfs_output_path, local_output_path):
         str: Caminho completo do diretório local onde os arquivos foram copiados.
 
     Exceções:
-        FileNotFoundError: Se a pasta copiada não for encontrada no sistema local após a cópia.
+        FileNotFoundError: Se a pasta não for encontrada no HDFS.
         RuntimeError: Se ocorrer um erro ao copiar ou excluir a pasta do HDFS.
     """
-    # Adiciona o esquema HDFS ao caminho de origem
-    hdfs_full_path = f"hdfs://coordinator:9000{hdfs_output_path}"
-    
-    def copy_files():
-        """Copia arquivos do HDFS para o diretório local."""
-        # Verifica se o diretório local já existe e cria se necessário
-        if not os.path.exists(local_output_path):
-            os.makedirs(local_output_path)
-        
-        # Comando para copiar os arquivos do HDFS para o diretório local
-        copy_command = ['hdfs', 'dfs', '-get', f"{hdfs_full_path}/*", local_output_path]
-        try:
-            print(f"Copiando arquivos do HDFS para {local_output_path}...")
-            subprocess.run(copy_command, check=True)
-            
-            # Verifica se o diretório local existe após a cópia
-            if not os.path.exists(local_output_path):
-                raise FileNotFoundError(f"Diretório não encontrado em {local_output_path}. Verifique se a cópia foi bem-sucedida.")
-            
-            print(f"Arquivos copiados com sucesso do HDFS para {local_output_path}")
-        
-        except subprocess.CalledProcessError as e:
-            error_message = f"Erro ao copiar arquivos do HDFS: {e.stderr}"
-            print(error_message)
-            raise RuntimeError(error_message)
-    
-    def delete_hdfs_directory():
-        """Remove a pasta do HDFS após a cópia."""
-        delete_command = ['hdfs', 'dfs', '-rm', '-r', hdfs_full_path]
-        try:
-            print(f"Removendo a pasta {hdfs_output_path} do HDFS...")
-            subprocess.run(delete_command, check=True)
-            print(f"Pasta {hdfs_output_path} excluída com sucesso do HDFS")
-        
-        except subprocess.CalledProcessError as e:
-            error_message = f"Erro ao excluir pasta do HDFS: {e.stderr}"
-            print(error_message)
-            raise RuntimeError(error_message)
-    
+    filesystem = get_filesystem()
+
     try:
         # Copiar arquivos do HDFS para o sistema local
-        copy_files()
-        
+        print(f"Copiando arquivos do HDFS para {local_output_path}...")
+        with span('hdfs_download') as download_span:
+            downloaded_files = download_directory(filesystem, hdfs_output_path, local_output_path)
+            download_span.set(bytes=sum(os.path.getsize(path) for path in downloaded_files), files=len(downloaded_files))
+        print(f"{len(downloaded_files)} arquivo(s) copiado(s) com sucesso do HDFS para {local_output_path}")
+
         # Remover a pasta do HDFS após a cópia bem-sucedida
-        delete_hdfs_directory()
-        
+        print(f"Removendo a pasta {hdfs_output_path} do HDFS...")
+        filesystem.delete(hdfs_output_path, recursive=True)
+        print(f"Pasta {hdfs_output_path} excluída com sucesso do HDFS")
+
         return local_output_path
 
-    except FileNotFoundError as fnf_error:
-        print(fnf_error)
-        raise fnf_error
+    except (FileNotFoundError, RuntimeError) as e:
+        print(e)
+        raise
     except Exception as ex:
         error_message = f"Erro inesperado ao copiar e excluir arquivos do HDFS: {str(ex)}"
         print(error_message)
@@ -502,161 +1562,41 @@ def move_files_and_remove_subdirectories(local_output_path):
         print(error_message)
         raise RuntimeError(error_message)
 
-def save_graph(df, x_col, y_col, title, filename, dataset_dir='.', line_mode='lines', line_color='blue', line_width=2):
-    """
-    Gera e salva um gráfico de linha utilizando o Plotly com base em um DataFrame e salva como arquivo HTML.
-
-    Parâmetros:
-        df (pd.DataFrame): DataFrame com os dados a serem plotados.
-        x_col (str): Nome da coluna que será usada como eixo X.
-        y_col (str): Nome da coluna que será usada como eixo Y.
-        title (str): Título do gráfico.
-        filename (str): Nome do arquivo HTML para salvar o gráfico.
-        dataset_dir (str): Diretório onde o arquivo será salvo. Padrão é o diretório atual.
-        line_mode (str): Modo de linha para o gráfico (padrão é 'lines'). Ex.: 'lines', 'markers', 'lines+markers'.
-        line_color (str): Cor da linha do gráfico (padrão é 'blue').
-        line_width (int): Largura da linha do gráfico (padrão é 2).
-
-    Retorna:
-        str: Caminho completo do arquivo HTML salvo.
-
-    Exceções:
-        KeyError: Se as colunas especificadas não existirem no DataFrame.
-        ValueError: Se o DataFrame estiver vazio ou se as colunas especificadas não forem numéricas ou de data.
-    """
-    # Verificar se as colunas x_col e y_col estão presentes no DataFrame
-    if x_col not in df.columns:
-        raise KeyError(f"A coluna '{x_col}' não está presente no DataFrame. Colunas disponíveis: {df.columns.tolist()}")
-    if y_col not in df.columns:
-        raise KeyError(f"A coluna '{y_col}' não está presente no DataFrame. Colunas disponíveis: {df.columns.tolist()}")
-
-    # Verificar se o DataFrame não está vazio
-    if df.empty:
-        raise ValueError("O DataFrame está vazio. Verifique se os dados foram carregados corretamente.")
-
-    # Verificar se as colunas x_col e y_col são numéricas ou de data
-    # if not pd.api.types.is_numeric_dtype(df[x_col]) and not pd.api.types.is_datetime64_any_dtype(df[x_col]):
-    #     raise ValueError(f"A coluna '{x_col}' deve ser numérica ou de data.")
-    # if not pd.api.types.is_numeric_dtype(df[y_col]):
-    #     raise ValueError(f"A coluna '{y_col}' deve ser numérica.")
-
-    # Criar a figura do gráfico
-    fig = go.Figure()
-
-    # Adicionar a linha ao gráfico com os parâmetros personalizáveis
-    fig.add_trace(go.Scatter(
-        x=df[x_col], 
-        y=df[y_col], 
-        mode=line_mode, 
-        name=y_col,
-        line=dict(color=line_color, width=line_width)
-    ))
-    
-    # Atualizar o layout do gráfico
-    fig.update_layout(
-        title=title,
-        xaxis_title=x_col,
-        yaxis_title=y_col,
-        xaxis_tickangle=-45
-    )
-    
-    # Verificar se o diretório de destino existe e criá-lo se necessário
-    if not os.path.exists(dataset_dir):
-        try:
-            os.makedirs(dataset_dir)
-            print(f"Diretório criado: {dataset_dir}")
-        except OSError as e:
-            raise RuntimeError(f"Erro ao criar o diretório {dataset_dir}: {e}")
-    
-    # Caminho completo para o arquivo de saída
-    output_path = os.path.join(dataset_dir, filename)
-    
-    try:
-        # Salvar o gráfico como HTML
-        fig.write_html(output_path)
-        print(f"Gráfico salvo em: {output_path}")
-    except Exception as e:
-        raise RuntimeError(f"Erro ao salvar o gráfico como HTML: {e}")
-    
-    return output_path
-
-def send_email(subject, body, to_email, attachment_paths=None):
+def send_email(subject, body, to_email, attachment_paths=None, on_result=None):
     """
-    Função para enviar um relatório por e-mail com múltiplos anexos de diferentes formatos, incluindo imagens.
+    Monta o e-mail com os anexos e o adiciona à fila de envio. O envio é feito em segundo plano pelos workers
+    da fila, que reutilizam as conexões SMTP autenticadas e repetem as falhas temporárias com espera exponencial.
 
     Parâmetros:
         subject (str): Assunto do e-mail.
         body (str): Corpo do e-mail. Pode ser HTML.
         to_email (str): Endereço de e-mail do destinatário.
-        attachment_paths (list, opcional): Lista de caminhos para anexos. Cada caminho deve apontar para um arquivo local que será anexado ao e-mail.
+        attachment_paths (list, opcional): Lista de caminhos para anexos. Os arquivos são lidos neste momento.
+        on_result (callable, opcional): Chamada ao final do envio com (sucesso, mensagem de erro ou None).
 
     Variáveis de ambiente:
-        EMAIL_USER: Endereço de e-mail do remetente (usuário SMTP).
-        EMAIL_PASS: Senha do e-mail do remetente (senha SMTP).
+        CONTROLLER_SENDER_EMAIL: Endereço de e-mail do remetente (usuário SMTP).
+        CONTROLLER_SENDER_SERVER: Servidor SMTP.
 
-    Exceções:
-        FileNotFoundError: Lançada se um dos arquivos de anexo não for encontrado.
-        RuntimeError: Lançada em caso de erro ao enviar o e-mail ou ao anexar arquivos.
+    Retorna:
+        str: ID da mensagem na fila de envio.
 
+    Exceções:
+        RuntimeError: Lançada se o remetente não estiver configurado ou se a fila de envio estiver cheia.
     """
-    
-    #Obter e-mail e senha das variáveis de ambiente
-    smtp_server = os.getenv('CONTROLLER_SENDER_SERVER')
-    smtp_port = os.getenv('CONTROLLER_SENDER_PORT')
     from_email = os.getenv('CONTROLLER_SENDER_EMAIL')
-    password = os.getenv('CONTROLLER_SENDER_PASSWORD')
+    if not from_email or not os.getenv('CONTROLLER_SENDER_SERVER'):
+        raise RuntimeError("As variáveis de ambiente 'CONTROLLER_SENDER_EMAIL' e 'CONTROLLER_SENDER_SERVER' precisam estar definidas.")
 
-    if not from_email or not password:
-        raise RuntimeError("As variáveis de ambiente 'EMAIL_USER' e 'EMAIL_PASS' precisam estar definidas.")
+    with span('email_enqueue', bytes=sum(os.path.getsize(path) for path in attachment_paths or [])):
+        message = build_message(subject, body, from_email, to_email, attachment_paths)
+        try:
+            message_id = get_mail_queue().submit(message, on_result=on_result)
+        except MailQueueFullError as e:
+            raise RuntimeError(f"Erro ao enfileirar o e-mail para {to_email}: {e}")
 
-    msg = EmailMessage()
-    msg['Subject'] = subject
-    msg['From'] = from_email
-    msg['To'] = to_email
-    
-    # Definir o conteúdo do e-mail como HTML
-    msg.add_alternative(body, subtype='html')
-    
-    if attachment_paths:
-        for attachment_path in attachment_paths:
-            try:
-                with open(attachment_path, 'rb') as f:
-                    file_data = f.read()
-                    file_name = os.path.basename(attachment_path)
-                    
-                    # Detecta o tipo de anexo baseado na extensão do arquivo
-                    if file_name.endswith('.pdf'):
-                        maintype, subtype = 'application', 'pdf'
-                    elif file_name.endswith('.html'):
-                        maintype, subtype = 'text', 'html'
-                    elif file_name.endswith('.csv'):
-                        maintype, subtype = 'text', 'csv'
-                    elif file_name.endswith('.txt'):
-                        maintype, subtype = 'text', 'plain'
-                    elif file_name.endswith(('.png', '.jpg', '.jpeg')):
-                        maintype, subtype = 'image', file_name.split('.')[-1]  # Define 'image/png' ou 'image/jpeg'
-                    else:
-                        # Default para arquivos desconhecidos
-                        maintype, subtype = 'application', 'octet-stream'
-                    
-                    msg.add_attachment(file_data, maintype=maintype, subtype=subtype, filename=file_name)
-            except FileNotFoundError:
-                print(f"Arquivo {attachment_path} não encontrado.")
-                continue  # Pula esse anexo e continua com os outros
-    
-    try:
-        with smtplib.SMTP_SSL(smtp_server, smtp_port) as server:
-            server.login(from_email, password)
-            server.send_message(msg)
-            print(f"Relatório enviado para {to_email}")
-    except smtplib.SMTPException as e:
-        error_message = f"Erro ao enviar o e-mail: {e}"
-        print(error_message)
-        raise RuntimeError(error_message)
-    except Exception as ex:
-        error_message = f"Erro inesperado ao enviar o e-mail: {str(ex)}"
-        print(error_message)
-        raise RuntimeError(error_message)
+    print(f"E-mail para {to_email} adicionado à fila de envio ({message_id}).")
+    return message_id
 
 def format_date(value):
     """
@@ -701,6 +1641,10 @@ def validate_input(data):
         if field not in data or not data[field]:
             return error_message
 
+    # Validar prioridade, se informada
+    if data.get('priority') and data['priority'] not in PRIORITIES:
+        return f'A prioridade "{data["priority"]}" é inválida. Use {", ".join(PRIORITIES)}.'
+
     # Validar formato de e-mail
     email = data['email']
     email_pattern = r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$'
@@ -717,90 +1661,65 @@ def validate_input(data):
 
     return None
 
-def check_hdfs_file_exists(hdfs_path):
-    """
-    Verifica se um arquivo ou diretório já existe no HDFS.
-
-    Parâmetros:
-        hdfs_path (str): Caminho completo no HDFS para verificar.
-    
-    Retorna:
-        bool: True se o arquivo/diretório existir, False caso contrário.
-    """
-    check_command = ['hdfs', 'dfs', '-test', '-e', hdfs_path]
-    try:
-        subprocess.run(check_command, check=True)
-        print(f"O arquivo ou diretório {hdfs_path} já existe no HDFS.")
-        return True
-    except subprocess.CalledProcessError:
-        # Se o comando retorna um erro, significa que o arquivo não existe
-        print(f"O arquivo ou diretório {hdfs_path} não existe no HDFS.")
-        return False
-    
-def create_hdfs_directory(hdfs_path):
+def upload_dataset_to_hdfs(local_dataset_path, hdfs_input_path):
     """
-    Cria um diretório no HDFS, incluindo todos os diretórios pai, se necessário.
+    Envia ao HDFS as partições do dataset Parquet alteradas desde o último envio (registradas no manifesto).
+    Se o dataset ainda não existir no HDFS, todas as partições são enviadas.
 
     Parâmetros:
-        hdfs_path (str): Caminho completo do diretório a ser criado no HDFS.
-    
-    Exceções:
-        RuntimeError: Se ocorrer um erro ao criar o diretório no HDFS.
-    """
-    mkdir_command = ['hdfs', 'dfs', '-mkdir', '-p', hdfs_path]
-    try:
-        subprocess.run(mkdir_command, check=True)
-        print(f"Diretório {hdfs_path} criado com sucesso no HDFS.")
-    except subprocess.CalledProcessError as e:
-        error_message = f"Erro ao criar diretório no HDFS: {e.stderr}"
-        print(error_message)
-        raise RuntimeError(error_message)
-
-def upload_to_hdfs(local_dataset_path, hdfs_input_path):
-    """
-    Envia um arquivo local para um diretório especificado no HDFS, criando o caminho completo se necessário.
+        local_dataset_path (str): Diretório local do dataset Parquet.
+        hdfs_input_path (str): Diretório de destino no HDFS onde o dataset será enviado.
 
-    Parâmetros:
-        local_dataset_path (str): Caminho completo do arquivo local que será enviado ao HDFS.
-        hdfs_input_path (str): Diretório de destino no HDFS onde o arquivo será enviado.
-    
     Retorna:
-        str: Caminho completo do arquivo no HDFS.
-    
+        str: Caminho do diretório do dataset no HDFS.
+
     Exceções:
-        FileNotFoundError: Se o arquivo local não for encontrado.
-        RuntimeError: Se ocorrer um erro ao enviar o arquivo para o HDFS.
+        FileNotFoundError: Se o dataset local não for encontrado.
+        RuntimeError: Se ocorrer um erro ao enviar o dataset para o HDFS.
     """
-    if not os.path.exists(local_dataset_path):
-        raise FileNotFoundError(f"Arquivo local não encontrado: {local_dataset_path}")
+    if not os.path.isdir(local_dataset_path):
+        raise FileNotFoundError(f"Dataset local não encontrado: {local_dataset_path}")
+
+    hdfs_dataset_path = os.path.join(hdfs_input_path, os.path.basename(local_dataset_path.rstrip('/')))
+    update_marker = get_update_marker(local_dataset_path)
+    partitions = load_manifest(local_dataset_path).get('pending_partitions', [])
+    filesystem = get_filesystem()
+
+    # Verificar se a versão atual do dataset já está no HDFS
+    if update_marker and filesystem.exists(os.path.join(hdfs_dataset_path, update_marker)):
+        if not partitions:
+            print(f"O dataset {hdfs_dataset_path} já está atualizado no HDFS. Nenhuma ação necessária.")
+            return hdfs_dataset_path
+    else:
+        # Dataset ausente ou desatualizado no HDFS: envia todas as partições
+        partitions = list_local_partitions(local_dataset_path)
 
-    # Define o caminho completo do arquivo no HDFS
-    hdfs_dataset_path = os.path.join(hdfs_input_path, os.path.basename(local_dataset_path))
-    
-    # Verificar se o arquivo já existe no HDFS
-    if check_hdfs_file_exists(hdfs_dataset_path):
-        print(f"O arquivo {hdfs_dataset_path} já existe no HDFS. Nenhuma ação necessária.")
-        return hdfs_dataset_path
-
-    # Verificar se o diretório pai no HDFS existe, e criar se necessário
-    hdfs_directory = os.path.dirname(hdfs_dataset_path)
-    if not check_hdfs_file_exists(hdfs_directory):
-        print(f"O diretório {hdfs_directory} não existe no HDFS. Criando...")
-        create_hdfs_directory(hdfs_directory)
-    
-    # Comando para enviar o arquivo para o HDFS
-    hdfs_put_command = ['hdfs', 'dfs', '-put', '-f', local_dataset_path, hdfs_dataset_path]
-    
     try:
-        # Executa o comando para enviar o arquivo ao HDFS
-        print(f"Enviando {local_dataset_path} para o HDFS em {hdfs_dataset_path}...")
-        subprocess.run(hdfs_put_command, check=True)
-        print(f"Arquivo enviado com sucesso para o HDFS: {hdfs_dataset_path}")
-    except subprocess.CalledProcessError as e:
-        error_message = f"Erro ao enviar o arquivo para o HDFS: {e.stderr}"
+        print(f"Enviando {len(partitions)} partição(ões) de {local_dataset_path} para o HDFS em {hdfs_dataset_path}...")
+        with span('hdfs_upload', partitions=len(partitions)) as upload_span:
+            uploaded_bytes = 0
+            for partition in partitions:
+                hdfs_partition_dir = os.path.join(hdfs_dataset_path, partition)
+                filesystem.makedirs(hdfs_partition_dir)
+                for local_file in glob.glob(os.path.join(local_dataset_path, partition, '*.parquet')):
+                    filesystem.upload(local_file, os.path.join(hdfs_partition_dir, os.path.basename(local_file)))
+                    uploaded_bytes += os.path.getsize(local_file)
+            upload_span.set(bytes=uploaded_bytes)
+
+        # O marcador é enviado por último, indicando que a versão está completa no HDFS
+        filesystem.makedirs(hdfs_dataset_path)
+        for name in filesystem.list_status(hdfs_dataset_path):
+            if name.startswith(UPDATE_MARKER_PREFIX):
+                filesystem.delete(os.path.join(hdfs_dataset_path, name))
+        if update_marker:
+            filesystem.upload(os.path.join(local_dataset_path, update_marker), os.path.join(hdfs_dataset_path, update_marker))
+        print(f"Dataset enviado com sucesso para o HDFS: {hdfs_dataset_path}")
+    except (FileNotFoundError, RuntimeError) as e:
+        error_message = f"Erro ao enviar o dataset para o HDFS: {e}"
         print(error_message)
         raise RuntimeError(error_message)
-    
+
+    clear_pending_partitions(local_dataset_path, partitions)
     return hdfs_dataset_path
 
 if __name__ == '__main__':
@@ -0,0 +1,81 @@
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import pandas as pd
+
+from returns import (
+    SIMPLE_RETURN_SUFFIX, calculate_average_returns, first_valid_positions, null_leading_returns, return_columns
+)
+
+
+class ReportRequest:
+    """
+    Requisição de relatório de um usuário, identificada por um ID único.
+
+    Parâmetros:
+        script_path (str): Caminho do script Spark.
+        initial_date (str): Data inicial do relatório.
+        final_date (str): Data final do relatório.
+        email (str): Destinatário do relatório, também usado como identificação do solicitante.
+        priority (str): Prioridade na fila ('high', 'normal' ou 'low').
+        delay_seconds (float): Tempo mínimo de espera antes do processamento, usado para agrupar requisições em lote.
+        request_id (str, opcional): ID da requisição. Gerado automaticamente se não informado.
+    """
+
+    def __init__(self, script_path, initial_date, final_date, email, priority='normal', delay_seconds=0, request_id=None):
+        self.request_id = request_id or str(uuid.uuid4())
+        self.script_path = script_path
+        self.initial_date = initial_date
+        self.final_date = final_date
+        self.email = email
+        self.requester = email.lower()
+        self.priority = priority
+        self.created_at = datetime.now()
+        self.submitted_at = time.time()
+        self.not_before = self.submitted_at + delay_seconds
+        self.completed = threading.Event()
+
+    def __repr__(self):
+        return f"ReportRequest({self.request_id}, {self.initial_date} - {self.final_date}, {self.email})"
+
+
+def union_date_range(report_requests):
+    """
+    Retorna o menor intervalo de datas que cobre todas as requisições.
+
+    Retorna:
+        tuple: Data inicial e data final ('yyyy-mm-dd').
+    """
+    return min(r.initial_date for r in report_requests), max(r.final_date for r in report_requests)
+
+
+def slice_report_data(daily_returns_df, initial_date, final_date):
+    """
+    Extrai de um resultado calculado sobre um intervalo maior os retornos diários e as médias de uma requisição.
+    Os retornos de cada ativo até a sua primeira cotação válida no intervalo, inclusive, são anulados, exatamente
+    como no cálculo isolado da requisição (sem as colunas de preço, apenas o primeiro pregão fica sem retorno).
+
+    Parâmetros:
+        daily_returns_df (pd.DataFrame): Retornos diários calculados sobre a união dos intervalos.
+        initial_date (str): Data inicial da requisição.
+        final_date (str): Data final da requisição.
+
+    Retorna:
+        tuple: DataFrame dos retornos diários e DataFrame das médias da requisição.
+    """
+    dates = pd.to_datetime(daily_returns_df["Date"])
+    mask = (dates >= pd.Timestamp(initial_date)) & (dates <= pd.Timestamp(final_date))
+    sliced_df = daily_returns_df.loc[mask].sort_values("Date").reset_index(drop=True)
+
+    price_columns = [
+        column[:-len(SIMPLE_RETURN_SUFFIX)] for column in return_columns(sliced_df.columns)
+        if column.endswith(SIMPLE_RETURN_SUFFIX)
+    ]
+    if all(column in sliced_df.columns for column in price_columns):
+        null_leading_returns(sliced_df, first_valid_positions(sliced_df, price_columns))
+    elif not sliced_df.empty:
+        sliced_df.loc[0, return_columns(sliced_df.columns)] = None
+
+    return sliced_df, calculate_average_returns(sliced_df)
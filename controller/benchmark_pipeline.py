@@ -0,0 +1,568 @@
+"""
+Benchmark de ponta a ponta do fluxo de relatórios, sem a infraestrutura do cluster.
+
+Cada cenário executa o fluxo real do controller (fila, ingestão, envio ao "HDFS", cálculo, gráficos e e-mail) em um
+processo próprio, com substitutos locais para os serviços externos:
+    - dados de mercado: arquivo CSV sintético no lugar do Yahoo Finance (CONTROLLER_MARKET_DATA_FIXTURE);
+    - HDFS: diretório local (CONTROLLER_FILESYSTEM=local), lido pelo Spark como URL 'file://';
+    - master Spark: Spark em modo local ('local[N]') no próprio processo (motor 'session') ou via spark-submit
+      (motor 'submit'); o motor 'local' calcula com o backend pandas do controller, e o motor 'auto' deixa a escolha
+      ao planejador de execução (ver benchmark_planner.py);
+    - SMTP: servidor local que aceita e descarta as mensagens.
+
+Para cada combinação de tamanho do dataset (anos de pregões), motor e concorrência, são registrados o tempo de cada
+etapa dos jobs (a partir do histórico de estados do armazenamento de jobs), a latência de ponta a ponta, a vazão e o
+pico de memória (RSS do controller e dos processos filhos, como a JVM do Spark) durante cada etapa. Os resultados são
+acrescentados em JSON Lines ao arquivo informado em --results, com a versão do código, e podem ser comparados com uma
+execução anterior (--baseline) para evidenciar regressões.
+
+Uso (no controller):
+    python benchmark_pipeline.py --years 5,20 --engines local,session --concurrency 1,4 --requests 8
+    python benchmark_pipeline.py --years 5,20 --engines local,session --concurrency 1,4 --requests 8 \\
+        --baseline benchmark_results.jsonl
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# Estados finais e ordem das etapas registradas no armazenamento de jobs
+TERMINAL_STATES = ('done', 'failed')
+STAGES = ('queued', 'fetching', 'spark', 'collecting', 'charting', 'emailing')
+
+ENGINES = ('local', 'session', 'submit', 'auto')
+
+# Intervalo entre as amostras de memória, em segundos
+MEMORY_SAMPLE_INTERVAL = 0.05
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+class SmtpSinkHandler(socketserver.StreamRequestHandler):
+    """Servidor SMTP mínimo: aceita qualquer remetente e destinatário e descarta as mensagens."""
+
+    def _reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode('ascii'))
+
+    def handle(self):
+        self._reply("220 benchmark ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+
+            command = line.decode('ascii', 'replace').strip().split(' ', 1)[0].upper()
+            if command in ('EHLO', 'HELO'):
+                self._reply("250 benchmark")
+            elif command in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self._reply("250 OK")
+            elif command == 'DATA':
+                self._reply("354 Fim com <CRLF>.<CRLF>")
+                size = 0
+                for data_line in iter(self.rfile.readline, b''):
+                    if data_line in (b'.\r\n', b'.\n'):
+                        break
+                    size += len(data_line)
+                reply = self.server.next_data_reply()
+                if reply == SmtpSink.DISCONNECT:
+                    return
+                if reply.startswith("250"):
+                    self.server.record_message(size)
+                self._reply(reply)
+            elif command == 'QUIT':
+                self._reply("221 Tchau")
+                return
+            else:
+                self._reply("502 Comando não implementado")
+
+
+class SmtpSink(socketserver.ThreadingTCPServer):
+    """
+    Servidor SMTP local usado no lugar do servidor de e-mails. Conta as mensagens e os bytes recebidos.
+    As respostas ao fim de cada DATA podem ser programadas em 'data_replies' (ex: "451 Tente mais tarde", ou
+    SmtpSink.DISCONNECT para encerrar a conexão sem resposta); esgotadas, as mensagens são aceitas.
+    """
+
+    DISCONNECT = 'disconnect'
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0, data_replies=None):
+        super().__init__((host, port), SmtpSinkHandler)
+        self.messages = 0
+        self.bytes = 0
+        self.connections = 0
+        self._data_replies = list(data_replies or [])
+        self._stats_lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self._stats_lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    def next_data_reply(self):
+        with self._stats_lock:
+            return self._data_replies.pop(0) if self._data_replies else "250 OK"
+
+    def record_message(self, size):
+        with self._stats_lock:
+            self.messages += 1
+            self.bytes += size
+
+    def stats(self):
+        with self._stats_lock:
+            return {'messages': self.messages, 'bytes': self.bytes, 'connections': self.connections}
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self.server_address[1]
+
+
+def build_market_data_fixture(path, tickers, years, end_date, seed=42):
+    """
+    Gera o arquivo CSV de preços sintéticos (passeio aleatório geométrico) no formato lido pelo LocalFixtureFetcher,
+    com pregões em dias úteis e cerca de 2% de dias sem cotação em cada ativo, como em calendários diferentes.
+    """
+    dates = pd.bdate_range(end=end_date, periods=years * 261)
+    random = np.random.default_rng(seed)
+
+    data = {'Date': dates.strftime('%Y-%m-%d')}
+    for index, ticker in enumerate(tickers):
+        prices = 100 * (index + 1) * np.exp(np.cumsum(random.normal(0.0002, 0.01, len(dates))))
+        prices[random.random(len(dates)) < 0.02] = np.nan
+        data[ticker] = prices.round(4)
+
+    pd.DataFrame(data).to_csv(path, index=False)
+    return dates
+
+
+def read_rss_bytes(pid):
+    with open(f"/proc/{pid}/statm") as statm:
+        return int(statm.read().split()[1]) * PAGE_SIZE
+
+
+def child_pids(pid):
+    pids = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children") as children:
+            pids += [int(child) for child in children.read().split()]
+    return pids
+
+
+def descendants_rss_bytes(pid):
+    """Soma o RSS dos processos descendentes (como a JVM do Spark e o spark-submit)."""
+    total = 0
+    pending = child_pids(pid)
+    while pending:
+        child = pending.pop()
+        try:
+            total += read_rss_bytes(child)
+            pending += child_pids(child)
+        except OSError:
+            continue
+    return total
+
+
+class MemorySampler(threading.Thread):
+    """
+    Amostra periodicamente o RSS do processo e dos seus descendentes (Linux, via /proc).
+    """
+
+    def __init__(self, interval=MEMORY_SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        pid = os.getpid()
+        while not self._stop_event.is_set():
+            try:
+                self.samples.append((time.time(), read_rss_bytes(pid), descendants_rss_bytes(pid)))
+            except OSError:
+                return
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return self.samples
+
+
+def summarize(values):
+    """Média, percentis e máximo de uma lista de durações, em segundos."""
+    if not values:
+        return {'count': 0, 'avg': None, 'p50': None, 'p95': None, 'max': None}
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'avg': round(sum(values) / len(values), 4),
+        'p50': round(values[min(len(values) - 1, int(len(values) * 0.5))], 4),
+        'p95': round(values[min(len(values) - 1, int(len(values) * 0.95))], 4),
+        'max': round(values[-1], 4)
+    }
+
+
+def to_mb(value):
+    return None if value is None else round(value / (1024 * 1024), 1)
+
+
+def stage_intervals(events):
+    """
+    Converte o histórico de estados de um job em intervalos (etapa, início, fim). Cada etapa dura até o
+    registro do estado seguinte.
+    """
+    return [
+        (event['state'], event['at'], next_event['at'])
+        for event, next_event in zip(events, events[1:])
+        if event['state'] in STAGES
+    ]
+
+
+def wait_for_jobs(app, request_ids, timeout):
+    """Aguarda até que todas as requisições estejam em um estado final."""
+    deadline = time.monotonic() + timeout
+    pending = set(request_ids)
+    while pending:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"{len(pending)} job(s) não terminaram em {timeout} segundos.")
+        pending = {request_id for request_id in pending if app.job_store.get_job(request_id)['state'] not in TERMINAL_STATES}
+        time.sleep(0.1)
+
+
+def run_scenario(config):
+    """
+    Executa um cenário no processo atual. As variáveis de ambiente do controller já foram definidas pelo processo
+    principal, antes da importação do app.
+
+    Retorna:
+        dict: Métricas do cenário.
+    """
+    import app
+    from batching import ReportRequest
+
+    end_date = date.fromisoformat(config['end_date'])
+    build_market_data_fixture(os.environ['CONTROLLER_MARKET_DATA_FIXTURE'], app.TICKERS, config['years'], end_date)
+
+    def report_request(offset_days, requester):
+        final_date = end_date - timedelta(days=offset_days)
+        initial_date = final_date - timedelta(days=config['range_days'])
+        return ReportRequest(
+            app.DEFAULT_SCRIPT_PATH, initial_date.isoformat(), final_date.isoformat(), f"{requester}@example.com"
+        )
+
+    # Primeira ingestão: grava o dataset, a tabela de retornos e o envio ao "HDFS"
+    start_time = time.perf_counter()
+    app.prepare_dataset()
+    ingest_seconds = time.perf_counter() - start_time
+
+    # Requisição de aquecimento (inicialização do Spark, importações e conexão SMTP), fora das métricas
+    warmup_request = report_request(config['requests'] + 1, 'aquecimento')
+    start_time = time.perf_counter()
+    app.enqueue_report_request(warmup_request)
+    wait_for_jobs(app, [warmup_request.request_id], config['timeout'])
+    cold_start_seconds = time.perf_counter() - start_time
+
+    # Requisições medidas: intervalos distintos, de solicitantes distintos, para não serem atendidas pelo cache
+    sampler = MemorySampler()
+    sampler.start()
+    report_requests = [report_request(index, f"benchmark{index}") for index in range(config['requests'])]
+    start_time = time.perf_counter()
+    for request in report_requests:
+        app.enqueue_report_request(request)
+    wait_for_jobs(app, [request.request_id for request in report_requests], config['timeout'])
+    wall_seconds = time.perf_counter() - start_time
+    samples = sampler.stop()
+
+    # Tempo e pico de memória de cada etapa, a partir do histórico de estados dos jobs
+    durations = {stage: [] for stage in STAGES}
+    peaks = {stage: None for stage in STAGES}
+    latencies = []
+    failed = []
+    for request in report_requests:
+        job = app.job_store.get_job(request.request_id)
+        events = job['events']
+        latencies.append(events[-1]['at'] - events[0]['at'])
+        if job['state'] == 'failed':
+            failed.append(job['error'])
+
+        for stage, started_at, finished_at in stage_intervals(events):
+            durations[stage].append(finished_at - started_at)
+            # Etapas mais curtas que o intervalo de amostragem usam a amostra imediatamente anterior
+            stage_samples = [
+                rss + children_rss for at, rss, children_rss in samples
+                if started_at - sampler.interval <= at <= finished_at
+            ]
+            if stage_samples:
+                peaks[stage] = max(peaks[stage] or 0, max(stage_samples))
+
+    engines_used = {}
+    measured_ids = {request.request_id for request in report_requests}
+    for timing in app.get_job_timings()['jobs']:
+        if timing['job_id'] in measured_ids:
+            engines_used[timing['mode']] = engines_used.get(timing['mode'], 0) + 1
+
+    return {
+        'requests': len(report_requests),
+        'failed': len(failed),
+        'errors': sorted(set(failed))[:5],
+        'engines_used': engines_used,
+        'wall_seconds': round(wall_seconds, 4),
+        'throughput': round(len(report_requests) / wall_seconds, 4),
+        'ingest_seconds': round(ingest_seconds, 4),
+        'cold_start_seconds': round(cold_start_seconds, 4),
+        'latency': summarize(latencies),
+        'stages': {
+            stage: {**summarize(durations[stage]), 'peak_rss_mb': to_mb(peaks[stage])}
+            for stage in STAGES if durations[stage]
+        },
+        'memory': {
+            'baseline_rss_mb': to_mb(samples[0][1]) if samples else None,
+            'peak_rss_mb': to_mb(max(rss for _, rss, _ in samples)) if samples else None,
+            'peak_children_rss_mb': to_mb(max(children_rss for _, _, children_rss in samples)) if samples else None
+        }
+    }
+
+
+def scenario_environment(work_dir, engine, concurrency, args, smtp_port):
+    """Variáveis de ambiente do controller de um cenário, com os substitutos locais dos serviços externos."""
+    env = {
+        **os.environ,
+        'CONTROLLER_FILESYSTEM': 'local',
+        'CONTROLLER_LOCAL_FS_ROOT': os.path.join(work_dir, 'hdfs'),
+        'CONTROLLER_DATASET_DIR': os.path.join(work_dir, 'dataset'),
+        'CONTROLLER_CACHE_DIR': os.path.join(work_dir, 'cache'),
+        'CONTROLLER_JOB_STORE_PATH': os.path.join(work_dir, 'jobs.db'),
+        'CONTROLLER_MARKET_DATA_FIXTURE': os.path.join(work_dir, 'market_data.csv'),
+        'CONTROLLER_MAX_CONCURRENT_JOBS': str(concurrency),
+        'CONTROLLER_QUEUE_MAX_DEPTH': str(max(100, args.requests + 1)),
+        'CONTROLLER_BATCH_MAX_SIZE': str(args.batch_size),
+        'CONTROLLER_SPARK_MODE': 'submit' if engine == 'submit' else 'session',
+        'CONTROLLER_SPARK_POOL_SIZE': str(concurrency),
+        'COORDINATOR_URL': f"local[{args.spark_cores}]",
+        # O motor 'local' atende qualquer intervalo no controller e os motores Spark, apenas o cluster; no motor 'auto',
+        # o planejador escolhe entre todos, com o Spark local no mesmo master do cluster substituto
+        'CONTROLLER_PLANNER_ENGINES': {'local': 'local', 'auto': 'local,spark_local,cluster'}.get(engine, 'cluster'),
+        'CONTROLLER_LOCAL_ENGINE_MAX_ROWS': str(10 ** 12) if engine == 'local' else os.environ.get('CONTROLLER_LOCAL_ENGINE_MAX_ROWS', ''),
+        'CONTROLLER_SPARK_LOCAL_MASTER': f"local[{args.spark_cores}]",
+        'CONTROLLER_PLANNER_CALIBRATION': os.path.abspath(args.calibration) if args.calibration else '',
+        'CONTROLLER_CHART_MAX_POINTS': str(args.chart_max_points),
+        'CONTROLLER_SENDER_EMAIL': 'benchmark@example.com',
+        'CONTROLLER_SENDER_PASSWORD': '',
+        'CONTROLLER_SENDER_SERVER': '127.0.0.1',
+        'CONTROLLER_SENDER_PORT': str(smtp_port),
+        'CONTROLLER_SENDER_SECURITY': 'none'
+    }
+    return env
+
+
+def code_version():
+    """Commit atual do repositório (com '+' se houver alterações locais), ou 'desconhecida'."""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=directory, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ['git', 'status', '--porcelain', '--', '.'], cwd=directory, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        return f"{commit}+" if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return 'desconhecida'
+
+
+def scenario_key(record):
+    config = record['config']
+    return (config['engine'], config['years'], config['concurrency'], config['requests'], config['range_days'], config['batch_size'])
+
+
+def load_baseline(path, run_id):
+    """Último resultado de cada cenário no arquivo de referência, ignorando os da execução atual."""
+    baseline = {}
+    if not os.path.exists(path):
+        return baseline
+    with open(path) as results_file:
+        for line in results_file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get('run_id') != run_id and 'metrics' in record:
+                baseline[scenario_key(record)] = record
+    return baseline
+
+
+def compare(records, baseline, threshold):
+    """
+    Compara os cenários da execução atual com os da referência e destaca as métricas que pioraram
+    mais do que o limite informado (ex: 1.2 = 20% mais lento).
+    """
+    print(f"\nComparação com a referência (regressão acima de {(threshold - 1) * 100:.0f}%):")
+    for record in records:
+        reference = baseline.get(scenario_key(record))
+        label = '/'.join(str(value) for value in scenario_key(record)[:3])
+        if reference is None:
+            print(f"  {label}: sem referência")
+            continue
+
+        metrics, reference_metrics = record['metrics'], reference['metrics']
+        pairs = [('tempo total', metrics['wall_seconds'], reference_metrics['wall_seconds']),
+                 ('latência p95', metrics['latency']['p95'], reference_metrics['latency']['p95'])]
+        for stage, stage_metrics in metrics['stages'].items():
+            reference_stage = reference_metrics['stages'].get(stage)
+            if reference_stage:
+                pairs.append((f"etapa {stage}", stage_metrics['avg'], reference_stage['avg']))
+        pairs.append(('pico de memória', metrics['memory']['peak_rss_mb'], reference_metrics['memory']['peak_rss_mb']))
+
+        for name, current, previous in pairs:
+            if current is None or not previous:
+                continue
+            ratio = current / previous
+            flag = '  <-- regressão' if ratio > threshold else ''
+            print(f"  {label} {name:<18} {previous:>10.3f} -> {current:>10.3f} ({ratio:>5.2f}x, versão {reference['version']}){flag}")
+
+
+def print_summary(records):
+    print(f"\n{'motor':<8} | {'anos':>4} | {'conc.':>5} | {'req.':>4} | {'falhas':>6} | {'tempo (s)':>9} | {'req/s':>6} | "
+          f"{'p50 (s)':>7} | {'p95 (s)':>7} | {'pico RSS (MB)':>13} | {'filhos (MB)':>11}")
+    for record in records:
+        config, metrics = record['config'], record['metrics']
+        print(
+            f"{config['engine']:<8} | {config['years']:>4} | {config['concurrency']:>5} | {metrics['requests']:>4} | "
+            f"{metrics['failed']:>6} | {metrics['wall_seconds']:>9.2f} | {metrics['throughput']:>6.2f} | "
+            f"{metrics['latency']['p50']:>7.2f} | {metrics['latency']['p95']:>7.2f} | "
+            f"{metrics['memory']['peak_rss_mb'] or 0:>13.1f} | {metrics['memory']['peak_children_rss_mb'] or 0:>11.1f}"
+        )
+
+    print("\nTempo médio por etapa (s) e pico de RSS do controller e filhos (MB):")
+    for record in records:
+        config = record['config']
+        stages = ', '.join(
+            f"{stage} {values['avg']:.3f}s/{values['peak_rss_mb'] or 0:.0f}MB" for stage, values in record['metrics']['stages'].items()
+        )
+        print(f"  {config['engine']}/{config['years']} anos/{config['concurrency']}: {stages}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de ponta a ponta do fluxo de relatórios, sem o cluster.")
+    parser.add_argument('--years', default='5,20', help="Tamanhos do dataset, em anos de pregões, separados por vírgula.")
+    parser.add_argument('--engines', default='local,session', help=f"Motores de cálculo: {', '.join(ENGINES)}.")
+    parser.add_argument('--concurrency', default='1,4', help="Quantidades de jobs simultâneos, separadas por vírgula.")
+    parser.add_argument('--requests', type=int, default=8, help="Requisições medidas por cenário.")
+    parser.add_argument('--range-days', type=int, default=365, help="Período de cada relatório, em dias.")
+    parser.add_argument('--batch-size', type=int, default=1, help="Tamanho máximo dos lotes da fila (1 = um job por requisição).")
+    parser.add_argument('--chart-max-points', type=int, default=1500)
+    parser.add_argument('--spark-cores', type=int, default=2, help="Núcleos do Spark local ('local[N]').")
+    parser.add_argument('--calibration', help="Calibração do planejador usada pelo motor 'auto' (ver benchmark_planner.py).")
+    parser.add_argument('--timeout', type=int, default=600, help="Tempo máximo de cada cenário, em segundos.")
+    parser.add_argument('--results', default='benchmark_results.jsonl', help="Arquivo JSON Lines onde os resultados são acrescentados.")
+    parser.add_argument('--baseline', help="Arquivo de resultados de referência para a comparação (pode ser o próprio --results).")
+    parser.add_argument('--regression-threshold', type=float, default=1.2)
+    parser.add_argument('--work-dir', help="Diretório de trabalho dos cenários (padrão: diretório temporário).")
+    parser.add_argument('--keep-work-dir', action='store_true')
+    parser.add_argument('--worker', nargs=2, metavar=('CONFIG', 'RESULT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        with open(args.worker[0]) as config_file:
+            config = json.load(config_file)
+        metrics = run_scenario(config)
+        with open(args.worker[1], 'w') as result_file:
+            json.dump(metrics, result_file)
+        # Encerra sem aguardar os workers da fila e do Spark, que não são mais necessários
+        os._exit(0)
+
+    engines = [engine.strip() for engine in args.engines.split(',') if engine.strip()]
+    for engine in engines:
+        if engine not in ENGINES:
+            parser.error(f"Motor inválido: '{engine}'. Valores aceitos: {', '.join(ENGINES)}.")
+
+    run_id = str(uuid.uuid4())
+    version = code_version()
+    root_dir = args.work_dir or tempfile.mkdtemp(prefix='benchmark_pipeline_')
+    smtp_sink = SmtpSink()
+    smtp_port = smtp_sink.start()
+    end_date = (date.today() - timedelta(days=1)).isoformat()
+
+    records = []
+    try:
+        for years in [int(value) for value in args.years.split(',')]:
+            for engine in engines:
+                for concurrency in [int(value) for value in args.concurrency.split(',')]:
+                    work_dir = os.path.join(root_dir, f"{engine}_{years}y_{concurrency}c")
+                    shutil.rmtree(work_dir, ignore_errors=True)
+                    os.makedirs(work_dir)
+
+                    config = {
+                        'engine': engine, 'years': years, 'concurrency': concurrency, 'requests': args.requests,
+                        'range_days': args.range_days, 'batch_size': args.batch_size, 'end_date': end_date,
+                        'chart_max_points': args.chart_max_points, 'spark_cores': args.spark_cores, 'timeout': args.timeout
+                    }
+                    config_path = os.path.join(work_dir, 'config.json')
+                    result_path = os.path.join(work_dir, 'result.json')
+                    with open(config_path, 'w') as config_file:
+                        json.dump(config, config_file)
+
+                    print(f"Cenário: motor '{engine}', {years} anos, {concurrency} job(s) simultâneo(s)...")
+                    mail_before = smtp_sink.stats()
+                    process = subprocess.run(
+                        [sys.executable, os.path.abspath(__file__), '--worker', config_path, result_path],
+                        cwd=os.path.dirname(os.path.abspath(__file__)),
+                        env=scenario_environment(work_dir, engine, concurrency, args, smtp_port),
+                        capture_output=True, text=True, timeout=args.timeout + 120
+                    )
+                    with open(os.path.join(work_dir, 'output.log'), 'w') as log_file:
+                        log_file.write(process.stdout + process.stderr)
+                    if process.returncode != 0 or not os.path.exists(result_path):
+                        print(f"  O cenário falhou (código {process.returncode}). Saída em {work_dir}/output.log:")
+                        print('\n'.join((process.stdout + process.stderr).strip().splitlines()[-10:]))
+                        continue
+
+                    with open(result_path) as result_file:
+                        metrics = json.load(result_file)
+                    mail_after = smtp_sink.stats()
+                    metrics['mail'] = {key: mail_after[key] - mail_before[key] for key in mail_after}
+
+                    record = {
+                        'run_id': run_id,
+                        'version': version,
+                        'timestamp': datetime.now().isoformat(timespec='seconds'),
+                        'host': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+                        'config': config,
+                        'metrics': metrics
+                    }
+                    records.append(record)
+                    with open(args.results, 'a') as results_file:
+                        results_file.write(json.dumps(record) + '\n')
+                    if metrics['failed']:
+                        print(f"  {metrics['failed']} requisição(ões) falharam: {metrics['errors']}")
+    finally:
+        smtp_sink.shutdown()
+        if not args.work_dir and not args.keep_work_dir:
+            shutil.rmtree(root_dir, ignore_errors=True)
+
+    if not records:
+        print("Nenhum cenário foi concluído.")
+        sys.exit(1)
+
+    print(f"\nVersão {version}, execução {run_id}; resultados acrescentados em {args.results}")
+    print_summary(records)
+    if args.baseline:
+        compare(records, load_baseline(args.baseline, run_id), args.regression_threshold)
+
+
+if __name__ == '__main__':
+    main()
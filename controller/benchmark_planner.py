@@ -0,0 +1,219 @@
+"""
+Benchmark de calibração do planejador de execução (planner.py).
+
+Calcula relatórios de períodos de tamanhos crescentes em cada motor de cálculo, sobre um dataset sintético e com os
+mesmos substitutos locais do benchmark_pipeline.py (arquivo CSV no lugar do Yahoo Finance e diretório local no lugar
+do HDFS), mede o tempo de cada cálculo (mediana das repetições) e ajusta, por mínimos quadrados, o tempo fixo e o
+tempo por linha de cada motor. Os coeficientes são gravados no arquivo de calibração lido pelo controller
+(CONTROLLER_PLANNER_CALIBRATION), mantendo os dos motores que não foram medidos, e as quantidades de linhas a partir
+das quais cada motor passa a ser mais barato são exibidas.
+
+Os resultados de todos os motores são comparados com os do primeiro motor da lista: a calibração falha se algum
+motor devolver retornos diferentes para o mesmo período.
+
+Motores: 'local' (backend pandas do controller), 'spark_local' (spark-submit com o master --spark-local-master),
+'submit' e 'session' (no master --master; por padrão, o Spark local no lugar do cluster).
+
+Uso (no controller):
+    python benchmark_planner.py --years 40 --engines local,spark_local,session
+    python benchmark_planner.py --years 40 --engines local --output /tmp/planner_calibration.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+ENGINES = ('local', 'spark_local', 'submit', 'session')
+
+
+def calibration_environment(work_dir, args):
+    """Variáveis de ambiente do controller durante a calibração, com os substitutos locais dos serviços externos."""
+    return {
+        'CONTROLLER_FILESYSTEM': 'local',
+        'CONTROLLER_LOCAL_FS_ROOT': os.path.join(work_dir, 'hdfs'),
+        'CONTROLLER_DATASET_DIR': os.path.join(work_dir, 'dataset'),
+        'CONTROLLER_CACHE_DIR': os.path.join(work_dir, 'cache'),
+        'CONTROLLER_JOB_STORE_PATH': os.path.join(work_dir, 'jobs.db'),
+        'CONTROLLER_MARKET_DATA_FIXTURE': os.path.join(work_dir, 'market_data.csv'),
+        'CONTROLLER_SPARK_POOL_SIZE': '1',
+        'CONTROLLER_SPARK_LOCAL_MASTER': args.spark_local_master,
+        'COORDINATOR_URL': args.master,
+        'CONTROLLER_METRICS_ENABLED': 'false'
+    }
+
+
+def compare_results(reference, result, engine, initial_date, final_date):
+    """
+    Compara os retornos diários e as médias de um motor com os do motor de referência.
+
+    Exceções:
+        ValueError: Lançada se os resultados forem diferentes.
+    """
+    import pandas as pd
+
+    def normalized(df):
+        df = df.copy()
+        df['Date'] = pd.to_datetime(df['Date']).dt.strftime('%Y-%m-%d')
+        return df.sort_values('Date').reset_index(drop=True)
+
+    reference_daily, result_daily = normalized(reference[0]), normalized(result[0])
+    if list(reference_daily.columns) != list(result_daily.columns) or len(reference_daily) != len(result_daily):
+        raise ValueError(
+            f"Motor '{engine}' devolveu {len(result_daily)} linha(s) e colunas {list(result_daily.columns)} de "
+            f"{initial_date} a {final_date}; esperado {len(reference_daily)} linha(s) e colunas {list(reference_daily.columns)}."
+        )
+    if not reference_daily['Date'].equals(result_daily['Date']):
+        raise ValueError(f"Motor '{engine}' devolveu pregões diferentes de {initial_date} a {final_date}.")
+
+    for frame_name, expected, actual in (
+        ('retornos diários', reference_daily.drop(columns=['Date']), result_daily.drop(columns=['Date'])),
+        ('médias', reference[1], result[1][reference[1].columns])
+    ):
+        expected = expected.to_numpy(dtype='float64')
+        actual = actual.to_numpy(dtype='float64')
+        if not np.allclose(expected, actual, rtol=1e-9, atol=1e-12, equal_nan=True):
+            difference = np.nanmax(np.abs(expected - actual))
+            raise ValueError(
+                f"Motor '{engine}' devolveu {frame_name} diferentes de {initial_date} a {final_date} "
+                f"(diferença máxima {difference:.3g})."
+            )
+
+
+def measure(app, engines, range_days_list, repeats, hdfs_dataset_path, statistics_data, end_date):
+    """
+    Mede o tempo de cálculo de cada período em cada motor e compara os resultados entre os motores.
+
+    Retorna:
+        list: Medições {'engine', 'range_days', 'trading_days', 'rows', 'seconds', 'samples'}.
+    """
+    from dataset_statistics import range_calendar
+
+    measurements = []
+    failed_engines = set()
+    for range_days in range_days_list:
+        initial_date = (end_date - timedelta(days=range_days)).isoformat()
+        calendar = range_calendar(statistics_data, initial_date, end_date.isoformat())
+        if not calendar['trading_days']:
+            print(f"Período de {range_days} dias sem pregões no dataset; ignorado.")
+            continue
+
+        rows = calendar['trading_days'] * len(app.PRICE_COLUMNS)
+        reference = None
+        for engine in engines:
+            if engine in failed_engines:
+                continue
+
+            samples = []
+            try:
+                # A primeira execução aquece o motor (importações, JVM e sessão Spark) e não entra na mediana
+                for attempt in range(repeats + 1):
+                    start_time = time.perf_counter()
+                    _, daily_returns_df, average_daily_return_df, _ = app.compute_report_data(
+                        engine, app.DEFAULT_SCRIPT_PATH, calendar['first_date'], calendar['last_date'],
+                        hdfs_dataset_path, partitions=calendar['partitions']
+                    )
+                    if attempt:
+                        samples.append(time.perf_counter() - start_time)
+            except Exception as e:
+                print(f"  Motor '{engine}' indisponível; será ignorado: {e}")
+                failed_engines.add(engine)
+                continue
+
+            result = (daily_returns_df, average_daily_return_df)
+            if reference is None:
+                reference = result
+            else:
+                compare_results(reference, result, engine, calendar['first_date'], calendar['last_date'])
+
+            seconds = statistics.median(samples)
+            measurements.append({
+                'engine': engine, 'range_days': range_days, 'trading_days': calendar['trading_days'],
+                'rows': rows, 'seconds': seconds, 'samples': samples
+            })
+            print(f"  {engine:<12} | {range_days:>6} dias | {rows:>9} linhas | {seconds:8.3f}s")
+    return measurements
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibração do planejador de execução, sem o cluster.")
+    parser.add_argument('--years', type=int, default=40, help="Tamanho do dataset sintético, em anos de pregões.")
+    parser.add_argument('--ranges', default='7,30,90,365,1825,3650,7300,14600', help="Períodos medidos, em dias, separados por vírgula.")
+    parser.add_argument('--engines', default='local,spark_local,session', help=f"Motores medidos: {', '.join(ENGINES)}.")
+    parser.add_argument('--repeats', type=int, default=3, help="Repetições de cada medição (é usada a mediana).")
+    parser.add_argument('--spark-local-master', default='local[*]', help="Master do motor 'spark_local'.")
+    parser.add_argument('--master', default='local[2]', help="Master Spark dos motores 'submit' e 'session'.")
+    parser.add_argument(
+        '--output', help="Arquivo de calibração gravado (padrão: o lido pelo controller, CONTROLLER_PLANNER_CALIBRATION)."
+    )
+    parser.add_argument('--work-dir', help="Diretório de trabalho (padrão: diretório temporário).")
+    args = parser.parse_args()
+
+    engines = [engine.strip() for engine in args.engines.split(',') if engine.strip()]
+    for engine in engines:
+        if engine not in ENGINES:
+            parser.error(f"Motor inválido: '{engine}'. Valores aceitos: {', '.join(ENGINES)}.")
+
+    # O arquivo de calibração padrão é o do controller, antes de o diretório do dataset apontar para o de trabalho
+    output_path = args.output or os.getenv('CONTROLLER_PLANNER_CALIBRATION') or os.path.join(
+        os.getenv('CONTROLLER_DATASET_DIR') or "/tmp/dataset", "planner_calibration.json"
+    )
+
+    # As variáveis de ambiente precisam ser definidas antes da importação do app
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='benchmark_planner_')
+    os.makedirs(work_dir, exist_ok=True)
+    os.environ.update(calibration_environment(work_dir, args))
+    os.environ.pop('CONTROLLER_PLANNER_CALIBRATION', None)
+
+    import app
+    from benchmark_pipeline import build_market_data_fixture
+    from dataset_statistics import load_statistics
+    from planner import crossover_rows, fit_costs
+
+    end_date = date.today() - timedelta(days=1)
+    build_market_data_fixture(os.environ['CONTROLLER_MARKET_DATA_FIXTURE'], app.TICKERS, args.years, end_date)
+    hdfs_dataset_path, _ = app.prepare_dataset()
+    statistics_data = load_statistics(app.LOCAL_DATASET_PATH)
+    end_date = date.fromisoformat(statistics_data['max_date'])
+
+    print(f"Dataset sintético de {args.years} anos e {len(app.PRICE_COLUMNS)} ativo(s) em {work_dir}.")
+    measurements = measure(
+        app, engines, [int(value) for value in args.ranges.split(',')], args.repeats, hdfs_dataset_path,
+        statistics_data, end_date
+    )
+    if not measurements:
+        print("Nenhum motor foi medido.")
+        sys.exit(1)
+
+    # Os coeficientes dos motores não medidos são mantidos do arquivo de calibração existente
+    calibration = {'costs': {}}
+    if os.path.exists(output_path):
+        with open(output_path, 'r', encoding='utf-8') as f:
+            calibration = json.load(f)
+    costs = fit_costs(measurements)
+    calibration['costs'] = {**calibration.get('costs', {}), **costs}
+    calibration['measurements'] = measurements
+    calibration['calibrated_at'] = date.today().isoformat()
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(calibration, f, indent=2)
+
+    print(f"\nCalibração gravada em {output_path}:")
+    for engine, values in costs.items():
+        print(f"  {engine:<12} | fixo {values['fixed_seconds']:.3f}s | {values['seconds_per_row'] * 1e6:.4f}s por milhão de linhas")
+    for first_engine in costs:
+        for second_engine in costs:
+            if first_engine < second_engine:
+                for cheaper, other in ((first_engine, second_engine), (second_engine, first_engine)):
+                    rows = crossover_rows(costs, cheaper, other)
+                    if rows is not None:
+                        print(f"  '{other}' passa a ser mais barato que '{cheaper}' acima de {rows} linha(s).")
+
+
+if __name__ == "__main__":
+    main()
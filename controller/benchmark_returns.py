@@ -0,0 +1,123 @@
+"""
+Benchmark do cálculo de retornos no Spark sobre um dataset sintético de várias décadas e muitos ativos.
+
+Compara a janela global legada (Window.orderBy("Date"), que leva todo o período para uma única partição) com a
+janela particionada por ativo e ano do motor de retornos, variando a quantidade de núcleos disponíveis no cluster.
+
+Uso (no controller):
+    spark-submit /tmp/data/benchmark_returns.py --tickers 500 --years 40 --cores 1,2,4
+"""
+
+import argparse
+import time
+from datetime import date
+
+from pyspark.sql import SparkSession
+from pyspark.sql import functions as F
+from pyspark.sql.window import Window
+
+from returns import DATE_COLUMN, calculate_returns_spark, simple_return_column
+
+
+def build_synthetic_prices(spark, tickers, years, partitions):
+    """
+    Gera preços diários sintéticos (sempre positivos) no layout largo do dataset: 'Date' e uma coluna por ativo.
+    """
+    days = years * 365
+    df = spark.range(0, days, numPartitions=partitions) \
+        .withColumn(DATE_COLUMN, F.date_add(F.lit(date(1980, 1, 1)), F.col("id").cast("int")))
+
+    price_columns = [f"T{index:04d}" for index in range(tickers)]
+    df = df.select(DATE_COLUMN, *[
+        (F.lit(100.0) + F.sin(F.col("id") / (index + 7)) * 10 + F.rand(index) * 5).alias(column)
+        for index, column in enumerate(price_columns)
+    ])
+    return df, price_columns
+
+
+def calculate_returns_global_window(df, price_columns):
+    """
+    Plano legado: uma coluna de lag por ativo sobre uma janela global ordenada por data.
+    """
+    window_spec = Window.orderBy(DATE_COLUMN)
+    return df.select(DATE_COLUMN, *price_columns, *[
+        ((F.col(f"`{column}`") / F.lag(F.col(f"`{column}`")).over(window_spec) - 1) * 100).alias(simple_return_column(column))
+        for column in price_columns
+    ])
+
+
+def timed_run(df):
+    """Executa o plano por completo, sem gravar o resultado, e retorna o tempo em segundos."""
+    start_time = time.perf_counter()
+    df.write.format("noop").mode("overwrite").save()
+    return time.perf_counter() - start_time
+
+
+def verify(global_df, partitioned_df, price_columns):
+    """Conta as diferenças entre os retornos simples dos dois planos."""
+    columns = [simple_return_column(column) for column in price_columns]
+    joined = global_df.select(DATE_COLUMN, *[F.col(f"`{c}`").alias(f"g{i}") for i, c in enumerate(columns)]) \
+        .join(partitioned_df.select(DATE_COLUMN, *[F.col(f"`{c}`").alias(f"p{i}") for i, c in enumerate(columns)]), DATE_COLUMN)
+
+    mismatch = None
+    for index in range(len(columns)):
+        condition = ~(
+            F.col(f"g{index}").eqNullSafe(F.col(f"p{index}")) |
+            F.coalesce(F.abs(F.col(f"g{index}") - F.col(f"p{index}")) < 1e-9, F.lit(False))
+        )
+        mismatch = condition if mismatch is None else mismatch | condition
+    return joined.filter(mismatch).count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do cálculo de retornos no Spark.")
+    parser.add_argument("--master", default="spark://coordinator:7077")
+    parser.add_argument("--tickers", type=int, default=200)
+    parser.add_argument("--years", type=int, default=40)
+    parser.add_argument("--cores", default="1,2,4", help="Quantidades de núcleos (spark.cores.max) a comparar.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--verify-tickers", type=int, default=5, help="Ativos comparados entre os dois planos.")
+    args = parser.parse_args()
+
+    results = []
+    for cores in [int(value) for value in args.cores.split(",")]:
+        spark = SparkSession.builder \
+            .appName(f"Benchmark Retornos ({cores} núcleos)") \
+            .master(args.master) \
+            .config("spark.cores.max", str(cores)) \
+            .config("spark.executor.cores", "1") \
+            .config("spark.sql.shuffle.partitions", str(cores * 4)) \
+            .getOrCreate()
+
+        try:
+            df, price_columns = build_synthetic_prices(spark, args.tickers, args.years, cores * 4)
+            df = df.cache()
+            rows = df.count()
+
+            if args.verify_tickers:
+                sample_columns = price_columns[:args.verify_tickers]
+                mismatches = verify(
+                    calculate_returns_global_window(df.select(DATE_COLUMN, *sample_columns), sample_columns),
+                    calculate_returns_spark(df.select(DATE_COLUMN, *sample_columns), sample_columns),
+                    sample_columns
+                )
+                print(f"[{cores} núcleos] Diferenças entre os planos: {mismatches}")
+
+            for plan_name, plan in [
+                ("janela global", calculate_returns_global_window),
+                ("particionado por ativo/ano", calculate_returns_spark)
+            ]:
+                timings = [timed_run(plan(df, price_columns)) for _ in range(args.repeat)]
+                results.append((cores, plan_name, rows, min(timings)))
+                print(f"[{cores} núcleos] {plan_name}: melhor de {args.repeat} = {min(timings):.2f}s")
+        finally:
+            spark.stop()
+
+    print(f"\n{args.tickers} ativos x {args.years} anos ({args.tickers * args.years * 365} preços)")
+    print(f"{'núcleos':>8} | {'plano':<28} | {'tempo (s)':>9}")
+    for cores, plan_name, _, seconds in results:
+        print(f"{cores:>8} | {plan_name:<28} | {seconds:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import pandas as pd
+
+DAILY_RETURNS_FILE_NAME = "daily_returns.parquet"
+AVERAGE_DAILY_RETURN_FILE_NAME = "average_daily_return.parquet"
+
+
+def file_version(path):
+    """
+    Calcula a versão de um arquivo a partir do hash do seu conteúdo.
+
+    Parâmetros:
+        path (str): Caminho do arquivo.
+
+    Retorna:
+        str: Os 16 primeiros caracteres do SHA-256 do conteúdo do arquivo.
+    """
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+class ResultCache:
+    """
+    Cache em disco dos resultados dos relatórios (retornos diários e médias), endereçado pelo conteúdo da requisição:
+    versão do dataset, intervalo de datas, conjunto de ativos e versão do script.
+
+    As entradas expiram após 'max_age_seconds' e, quando o tamanho total ultrapassa 'max_bytes',
+    as entradas menos usadas recentemente são removidas.
+    """
+
+    def __init__(self, cache_dir, max_bytes=256 * 1024 * 1024, max_age_seconds=24 * 60 * 60):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_entries()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    @staticmethod
+    def make_key(dataset_version, initial_date, final_date, tickers, script_version):
+        """
+        Gera a chave do cache para uma requisição de relatório.
+
+        Parâmetros:
+            dataset_version (int|str): Versão do dataset de mercado.
+            initial_date (str): Data inicial do relatório.
+            final_date (str): Data final do relatório.
+            tickers (list): Ativos do relatório (a ordem não importa).
+            script_version (str): Versão do script Spark.
+
+        Retorna:
+            str: Chave hexadecimal do cache.
+        """
+        payload = json.dumps({
+            'dataset_version': str(dataset_version),
+            'initial_date': initial_date,
+            'final_date': final_date,
+            'tickers': sorted(tickers),
+            'script_version': script_version
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _load_entries(self):
+        """Reconstrói o índice do cache a partir das entradas já existentes em disco."""
+        if not os.path.isdir(self.cache_dir):
+            return
+
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, key)
+            if key.startswith('.') or not os.path.isdir(entry_dir):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+            created_at = os.path.getmtime(entry_dir)
+            entries.append((created_at, key, size))
+
+        for created_at, key, size in sorted(entries):
+            self._entries[key] = {'created_at': created_at, 'size': size}
+
+    def _remove_entry(self, key):
+        """Remove uma entrada do índice e do disco. Deve ser chamado com o lock adquirido."""
+        self._entries.pop(key, None)
+        shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors=True)
+        self.evictions += 1
+
+    def _evict(self):
+        """Remove entradas expiradas e, em seguida, as menos usadas até respeitar o limite de tamanho."""
+        now = time.time()
+        for key in [key for key, entry in self._entries.items() if now - entry['created_at'] > self.max_age_seconds]:
+            self._remove_entry(key)
+
+        total_bytes = sum(entry['size'] for entry in self._entries.values())
+        while self._entries and total_bytes > self.max_bytes:
+            key, entry = next(iter(self._entries.items()))
+            total_bytes -= entry['size']
+            self._remove_entry(key)
+
+    def get(self, key):
+        """
+        Obtém o resultado armazenado para a chave.
+
+        Retorna:
+            tuple: DataFrame dos retornos diários e DataFrame das médias, ou None em caso de ausência.
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry['created_at'] > self.max_age_seconds:
+                self._remove_entry(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            entry_dir = os.path.join(self.cache_dir, key)
+            try:
+                daily_returns_df = pd.read_parquet(os.path.join(entry_dir, DAILY_RETURNS_FILE_NAME))
+                average_daily_return_df = pd.read_parquet(os.path.join(entry_dir, AVERAGE_DAILY_RETURN_FILE_NAME))
+            except Exception as e:
+                print(f"Entrada do cache {key} inválida, removendo: {e}")
+                self._remove_entry(key)
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return daily_returns_df, average_daily_return_df
+
+    def put(self, key, daily_returns_df, average_daily_return_df):
+        """
+        Armazena o resultado de um relatório. A entrada é gravada em um diretório temporário
+        e publicada de forma atômica.
+        """
+        if not self.enabled:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temporary_dir = os.path.join(self.cache_dir, f".{uuid.uuid4()}")
+        entry_dir = os.path.join(self.cache_dir, key)
+
+        try:
+            os.makedirs(temporary_dir)
+            daily_returns_df.to_parquet(os.path.join(temporary_dir, DAILY_RETURNS_FILE_NAME), index=False)
+            average_daily_return_df.to_parquet(os.path.join(temporary_dir, AVERAGE_DAILY_RETURN_FILE_NAME), index=False)
+            size = sum(entry.stat().st_size for entry in os.scandir(temporary_dir))
+
+            with self._lock:
+                if key in self._entries:
+                    shutil.rmtree(temporary_dir, ignore_errors=True)
+                    return
+                os.replace(temporary_dir, entry_dir)
+                self._entries[key] = {'created_at': time.time(), 'size': size}
+                self._evict()
+        except Exception as e:
+            shutil.rmtree(temporary_dir, ignore_errors=True)
+            print(f"Erro ao gravar o resultado no cache: {e}")
+
+    def stats(self):
+        """
+        Retorna os contadores do cache.
+
+        Retorna:
+            dict: Acertos, ausências, remoções, quantidade de entradas e tamanho total em bytes.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': sum(entry['size'] for entry in self._entries.values()),
+                'max_bytes': self.max_bytes,
+                'max_age_seconds': self.max_age_seconds
+            }
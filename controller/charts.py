@@ -0,0 +1,220 @@
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+
+CHART_FORMAT_HTML = 'html'
+CHART_FORMAT_HTML_INLINE = 'html-inline'
+CHART_FORMAT_SVG = 'svg'
+CHART_FORMAT_PNG = 'png'
+CHART_FORMATS = (CHART_FORMAT_HTML, CHART_FORMAT_HTML_INLINE, CHART_FORMAT_SVG, CHART_FORMAT_PNG)
+
+DEFAULT_MAX_POINTS = 1500
+
+# Dimensões de cada gráfico da figura, em pixels
+ROW_HEIGHT = 320
+FIGURE_WIDTH = 1000
+
+LINE_COLORS = ['#1f77b4', '#d62728', '#2ca02c', '#ff7f0e', '#9467bd', '#8c564b', '#e377c2', '#17becf']
+
+
+def lttb(x, y, threshold):
+    """
+    Reduz uma série ao número de pontos informado com o algoritmo Largest-Triangle-Three-Buckets, que preserva
+    os picos e a forma visual da série. O primeiro e o último ponto são sempre mantidos.
+
+    Parâmetros:
+        x (np.ndarray): Valores numéricos do eixo X, em ordem crescente.
+        y (np.ndarray): Valores do eixo Y.
+        threshold (int): Quantidade máxima de pontos do resultado.
+
+    Retorna:
+        np.ndarray: Índices dos pontos mantidos, em ordem crescente.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+
+    # Os pontos entre o primeiro e o último são divididos em (threshold - 2) grupos
+    edges = np.linspace(1, n - 1, threshold - 1).astype('int64')
+    selected = np.empty(threshold, dtype='int64')
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+
+        # Média do grupo seguinte (ou o último ponto), terceiro vértice do triângulo
+        if bucket + 2 < len(edges):
+            next_start, next_end = edges[bucket + 1], edges[bucket + 2]
+            next_x, next_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous]) -
+            (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+
+    return selected
+
+
+def downsample(x, y, max_points):
+    """
+    Remove os valores nulos de uma série e a reduz a no máximo 'max_points' pontos com LTTB.
+
+    Retorna:
+        tuple: Valores de X e de Y mantidos.
+    """
+    x = pd.to_datetime(pd.Series(x)).to_numpy()
+    y = pd.Series(y, dtype='float64').to_numpy()
+    valid = ~np.isnan(y)
+    x, y = x[valid], y[valid]
+
+    if max_points and len(x) > max_points:
+        indexes = lttb(x.astype('datetime64[ns]').astype('int64'), y, max_points)
+        x, y = x[indexes], y[indexes]
+    return x, y
+
+
+def _series_lines(y_col):
+    """Linhas de um gráfico: (coluna, None) para uma única coluna ou a lista de tuplas (coluna, nome da linha)."""
+    return [(y_col, None)] if isinstance(y_col, str) else list(y_col)
+
+
+def build_report_figure(df, x_col, series, title, max_points=DEFAULT_MAX_POINTS):
+    """
+    Monta uma única figura com um gráfico por série, empilhados e com o eixo X compartilhado.
+
+    A figura é montada diretamente como dicionário, sem a validação dos objetos do Plotly, que domina o tempo
+    de renderização de figuras pequenas.
+
+    Parâmetros:
+        df (pd.DataFrame): DataFrame com os dados a serem plotados.
+        x_col (str): Nome da coluna do eixo X.
+        series (list): Séries a serem plotadas, como tuplas (coluna, título do gráfico). No lugar da coluna pode ser
+            informada uma lista de tuplas (coluna, nome da linha), plotadas no mesmo gráfico com legenda.
+        title (str): Título da figura.
+        max_points (int): Quantidade máxima de pontos de cada série (0 desativa a redução).
+
+    Retorna:
+        dict: Figura do Plotly.
+    """
+    rows = len(series)
+    gap = 0.08 / rows if rows > 1 else 0
+    row_height = (1 - gap * (rows - 1)) / rows
+
+    data = []
+    layout = {
+        'title': {'text': title},
+        'height': ROW_HEIGHT * rows + 120,
+        'width': FIGURE_WIDTH,
+        'showlegend': any(not isinstance(y_col, str) for y_col, _ in series),
+        'annotations': [],
+        'margin': {'t': 100, 'b': 60}
+    }
+
+    legend_names = set()
+    for index, (y_col, subplot_title) in enumerate(series):
+        axis_suffix = '' if index == 0 else str(index + 1)
+        top = 1 - index * (row_height + gap)
+        for line_index, (line_col, line_name) in enumerate(_series_lines(y_col)):
+            x, y = downsample(df[x_col], df[line_col], max_points)
+            color_index = index if line_name is None else line_index
+            data.append({
+                'type': 'scatter',
+                'mode': 'lines',
+                'x': np.datetime_as_string(x, unit='D').tolist(),
+                'y': y.round(4).tolist(),
+                'name': line_name or line_col,
+                'legendgroup': line_name or line_col,
+                # Linhas com o mesmo nome têm a mesma cor em todos os gráficos e aparecem uma única vez na legenda
+                'showlegend': line_name is not None and line_name not in legend_names,
+                'line': {'color': LINE_COLORS[color_index % len(LINE_COLORS)], 'width': 1.5},
+                'xaxis': f'x{axis_suffix}',
+                'yaxis': f'y{axis_suffix}'
+            })
+            if line_name is not None:
+                legend_names.add(line_name)
+        layout[f'xaxis{axis_suffix}'] = {
+            'anchor': f'y{axis_suffix}', 'domain': [0, 1], 'type': 'date', 'tickangle': -45,
+            **({'matches': 'x'} if index > 0 else {})
+        }
+        layout[f'yaxis{axis_suffix}'] = {
+            'anchor': f'x{axis_suffix}', 'domain': [max(0.0, top - row_height), top], 'title': {'text': '%'}
+        }
+        layout['annotations'].append({
+            'text': subplot_title, 'showarrow': False, 'xref': 'paper', 'yref': 'paper',
+            'x': 0.5, 'xanchor': 'center', 'y': top, 'yanchor': 'bottom', 'font': {'size': 14}
+        })
+
+    return {'data': data, 'layout': layout}
+
+
+def render_report_chart(df, x_col, series, title, output_dir, file_name, chart_format=CHART_FORMAT_HTML,
+                        max_points=DEFAULT_MAX_POINTS):
+    """
+    Gera um único arquivo com os gráficos de todas as séries do relatório.
+
+    Formatos:
+        html: HTML interativo que carrega o plotly.js da CDN (alguns KB por relatório).
+        html-inline: HTML interativo com o plotly.js embutido uma única vez, para leitura sem internet.
+        svg, png: Imagem estática gerada no servidor (requer o pacote 'kaleido').
+
+    Parâmetros:
+        df (pd.DataFrame): DataFrame com os dados a serem plotados.
+        x_col (str): Nome da coluna do eixo X.
+        series (list): Séries a serem plotadas, como tuplas (coluna, título do gráfico).
+        title (str): Título da figura.
+        output_dir (str): Diretório onde o arquivo será salvo.
+        file_name (str): Nome do arquivo, sem a extensão.
+        chart_format (str): Formato do arquivo.
+        max_points (int): Quantidade máxima de pontos de cada série.
+
+    Retorna:
+        str: Caminho completo do arquivo gerado.
+
+    Exceções:
+        KeyError: Lançada se alguma das colunas não existir no DataFrame.
+        ValueError: Lançada se o DataFrame estiver vazio ou se o formato não for reconhecido.
+        RuntimeError: Lançada em caso de erro ao gravar o arquivo.
+    """
+    if chart_format not in CHART_FORMATS:
+        raise ValueError(f"Formato de gráfico inválido: '{chart_format}'. Valores aceitos: {', '.join(CHART_FORMATS)}.")
+    for column in [x_col] + [line_col for y_col, _ in series for line_col, _ in _series_lines(y_col)]:
+        if column not in df.columns:
+            raise KeyError(f"A coluna '{column}' não está presente no DataFrame. Colunas disponíveis: {df.columns.tolist()}")
+    if df.empty:
+        raise ValueError("O DataFrame está vazio. Verifique se os dados foram carregados corretamente.")
+
+    figure = build_report_figure(df, x_col, series, title, max_points)
+
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+    except OSError as e:
+        raise RuntimeError(f"Erro ao criar o diretório {output_dir}: {e}")
+
+    extension = 'html' if chart_format in (CHART_FORMAT_HTML, CHART_FORMAT_HTML_INLINE) else chart_format
+    output_path = os.path.join(output_dir, f"{file_name}.{extension}")
+
+    try:
+        if extension == 'html':
+            pio.write_html(
+                figure, output_path, validate=False, full_html=True,
+                include_plotlyjs='cdn' if chart_format == CHART_FORMAT_HTML else True,
+                config={'displaylogo': False}
+            )
+        else:
+            pio.write_image(figure, output_path, format=chart_format, validate=False)
+    except Exception as e:
+        raise RuntimeError(f"Erro ao salvar o gráfico em {output_path}: {e}")
+
+    print(f"Gráfico salvo em: {output_path}")
+    return output_path
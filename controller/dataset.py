@@ -0,0 +1,290 @@
+import argparse
+import glob
+import os
+import uuid
+from datetime import date, datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from schema import DATE_COLUMN, PARTITION_COLUMNS, arrow_schema, cast_market_data, quality_from_frame
+
+DATASET_NAME = "market_data"
+UPDATE_MARKER_PREFIX = "_UPDATED_"
+PARTITION_FILE_NAME = "part-00000.parquet"
+
+
+def build_arrow_schema(price_columns):
+    """
+    Monta o schema Arrow explícito do dataset de mercado.
+
+    Parâmetros:
+        price_columns (list): Nomes das colunas de preço (uma por ativo).
+
+    Retorna:
+        pa.Schema: Schema com a coluna 'Date' (date32) e as colunas de preço (float64), conforme o registro
+        de schema.market_data_fields.
+    """
+    return arrow_schema(price_columns)
+
+
+def to_date(value):
+    """
+    Converte uma data em string 'yyyy-mm-dd', datetime ou date para date.
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def partition_path(year, month):
+    """
+    Retorna o caminho relativo de uma partição no formato hive ('year=2024/month=9').
+    """
+    return f"year={int(year)}/month={int(month)}"
+
+
+def partition_paths_for_range(initial_date, final_date):
+    """
+    Lista os caminhos relativos das partições mensais que cobrem o intervalo informado.
+
+    Parâmetros:
+        initial_date (str|date): Data inicial do intervalo.
+        final_date (str|date): Data final do intervalo.
+
+    Retorna:
+        list: Caminhos relativos das partições, em ordem cronológica.
+    """
+    start, end = to_date(initial_date), to_date(final_date)
+    paths = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        paths.append(partition_path(year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return paths
+
+
+def normalize_market_data(df, price_columns=None, deduplicate=True):
+    """
+    Normaliza um DataFrame de preços para o layout do dataset: coluna 'Date' do tipo data,
+    colunas de preço float64 (valores não numéricos viram nulos), ordenado e sem datas duplicadas.
+    Cotações ausentes são mantidas como nulas.
+
+    Parâmetros:
+        df (pd.DataFrame): DataFrame com a coluna 'Date' (ou índice de datas) e as colunas de preço.
+        price_columns (list, opcional): Colunas de preço a manter. Padrão: todas exceto 'Date'.
+        deduplicate (bool): Se False, mantém as linhas na ordem recebida, com as datas repetidas
+            (usado na validação dos dados recebidos).
+
+    Retorna:
+        pd.DataFrame: DataFrame normalizado.
+    """
+    if DATE_COLUMN not in df.columns:
+        df = df.reset_index()
+        df = df.rename(columns={df.columns[0]: DATE_COLUMN})
+
+    if price_columns is None:
+        price_columns = [column for column in df.columns if column not in [DATE_COLUMN] + PARTITION_COLUMNS]
+
+    df = cast_market_data(df, price_columns)
+    if not deduplicate:
+        return df.reset_index(drop=True)
+    return df.drop_duplicates(subset=DATE_COLUMN, keep="last").sort_values(DATE_COLUMN).reset_index(drop=True)
+
+
+def calendar_from_frame(df):
+    """
+    Calendário de pregões de uma partição mensal: a quantidade de pregões e os dias do mês com pregão.
+
+    Parâmetros:
+        df (pd.DataFrame): Preços de uma partição, com a coluna 'Date'.
+
+    Retorna:
+        dict: {'rows': quantidade de pregões, 'days': dias do mês com pregão, em ordem}.
+    """
+    days = sorted(set(pd.to_datetime(df[DATE_COLUMN]).dt.day.tolist()))
+    return {'rows': len(days), 'days': days}
+
+
+def quality_by_partition(df, price_columns):
+    """
+    Resumo de qualidade (ver schema.quality_from_frame) das linhas de cada partição mensal de um DataFrame,
+    na ordem em que foram recebidas, de modo que as datas repetidas e fora de ordem sejam contadas.
+
+    Retorna:
+        dict: Resumo de qualidade por caminho relativo da partição.
+    """
+    dates = pd.to_datetime(df[DATE_COLUMN])
+    return {
+        partition_path(year, month): quality_from_frame(partition_df, price_columns)
+        for (year, month), partition_df in df.groupby([dates.dt.year, dates.dt.month], sort=False)
+    }
+
+
+def write_partitioned_dataset(df, dataset_dir, price_columns=None, quality=None, calendars=None):
+    """
+    Grava o DataFrame no dataset Parquet particionado por ano/mês, substituindo por completo
+    apenas as partições presentes no DataFrame. Cada partição é escrita de forma atômica.
+
+    Parâmetros:
+        df (pd.DataFrame): DataFrame de preços (com a coluna 'Date').
+        dataset_dir (str): Diretório raiz do dataset.
+        price_columns (list, opcional): Colunas de preço do schema. Padrão: todas exceto 'Date'.
+        quality (dict, opcional): Se informado, recebe o resumo de qualidade de cada partição gravada
+            (ver quality_by_partition), calculado sobre as linhas recebidas, antes da remoção das datas repetidas
+            e da ordenação.
+        calendars (dict, opcional): Se informado, recebe o calendário de pregões de cada partição gravada
+            (ver calendar_from_frame).
+
+    Retorna:
+        list: Caminhos relativos das partições gravadas.
+    """
+    received_df = normalize_market_data(df, price_columns, deduplicate=False)
+    price_columns = [column for column in received_df.columns if column != DATE_COLUMN]
+    schema = build_arrow_schema(price_columns)
+
+    if received_df.empty:
+        return []
+
+    if quality is not None:
+        quality.update(quality_by_partition(received_df, price_columns))
+    df = normalize_market_data(received_df, price_columns)
+
+    dates = pd.to_datetime(df[DATE_COLUMN])
+    written_partitions = []
+
+    for (year, month), partition_df in df.groupby([dates.dt.year, dates.dt.month]):
+        relative_path = partition_path(year, month)
+        partition_dir = os.path.join(dataset_dir, relative_path)
+        os.makedirs(partition_dir, exist_ok=True)
+
+        if calendars is not None:
+            calendars[relative_path] = calendar_from_frame(partition_df)
+
+        table = pa.Table.from_pandas(partition_df, schema=schema, preserve_index=False)
+        temporary_path = os.path.join(partition_dir, f".{uuid.uuid4()}.tmp")
+        pq.write_table(table, temporary_path)
+        os.replace(temporary_path, os.path.join(partition_dir, PARTITION_FILE_NAME))
+        written_partitions.append(relative_path)
+
+    print(f"{len(written_partitions)} partição(ões) gravada(s) em {dataset_dir}.")
+    return written_partitions
+
+
+def read_partitioned_dataset(dataset_dir, initial_date=None, final_date=None, columns=None):
+    """
+    Lê o dataset Parquet local, lendo apenas as partições e linhas do intervalo informado.
+
+    Parâmetros:
+        dataset_dir (str): Diretório raiz do dataset.
+        initial_date (str|date, opcional): Data inicial do filtro.
+        final_date (str|date, opcional): Data final do filtro.
+        columns (list, opcional): Colunas a serem lidas. Padrão: todas.
+
+    Retorna:
+        pd.DataFrame: Dados ordenados por data, sem as colunas de partição.
+    """
+    if not os.path.isdir(dataset_dir) or not glob.glob(os.path.join(dataset_dir, "year=*")):
+        return pd.DataFrame(columns=[DATE_COLUMN] + (columns or []))
+
+    dataset = ds.dataset(dataset_dir, format="parquet", partitioning="hive")
+
+    expression = None
+    if initial_date is not None:
+        start = to_date(initial_date)
+        expression = ((ds.field("year") * 100 + ds.field("month")) >= start.year * 100 + start.month) & \
+            (ds.field(DATE_COLUMN) >= pa.scalar(start, pa.date32()))
+    if final_date is not None:
+        end = to_date(final_date)
+        final_expression = ((ds.field("year") * 100 + ds.field("month")) <= end.year * 100 + end.month) & \
+            (ds.field(DATE_COLUMN) <= pa.scalar(end, pa.date32()))
+        expression = final_expression if expression is None else expression & final_expression
+
+    if columns is not None:
+        columns = [DATE_COLUMN] + [column for column in columns if column != DATE_COLUMN]
+    else:
+        columns = [name for name in dataset.schema.names if name not in PARTITION_COLUMNS]
+
+    table = dataset.to_table(columns=columns, filter=expression)
+    return table.to_pandas().sort_values(DATE_COLUMN).reset_index(drop=True)
+
+
+def mark_dataset_updated(dataset_dir, update_date=None):
+    """
+    Registra a data da última atualização do dataset em um arquivo marcador ('_UPDATED_yyyy-mm-dd'),
+    ignorado pelo Spark na leitura por começar com '_'.
+
+    Retorna:
+        str: Nome do arquivo marcador.
+    """
+    update_date = update_date or datetime.today().strftime('%Y-%m-%d')
+    for old_marker in glob.glob(os.path.join(dataset_dir, f"{UPDATE_MARKER_PREFIX}*")):
+        os.remove(old_marker)
+
+    marker_name = f"{UPDATE_MARKER_PREFIX}{update_date}"
+    open(os.path.join(dataset_dir, marker_name), "w").close()
+    return marker_name
+
+
+def get_update_marker(dataset_dir):
+    """
+    Retorna o nome do arquivo marcador da última atualização do dataset, ou None se não existir.
+    """
+    markers = sorted(glob.glob(os.path.join(dataset_dir, f"{UPDATE_MARKER_PREFIX}*")))
+    return os.path.basename(markers[-1]) if markers else None
+
+
+def migrate_csv_snapshots(csv_dir, dataset_dir, dataset_prefix=DATASET_NAME, remove_csv=False):
+    """
+    Migração única dos snapshots CSV diários ('market_data_yyyy-mm-dd.csv') para o dataset Parquet particionado.
+    Todos os snapshots são combinados; em caso de datas repetidas, prevalece o valor do snapshot mais recente.
+
+    Parâmetros:
+        csv_dir (str): Diretório onde estão os snapshots CSV.
+        dataset_dir (str): Diretório raiz do dataset Parquet de destino.
+        dataset_prefix (str): Prefixo dos arquivos CSV. Padrão é 'market_data'.
+        remove_csv (bool): Remove os snapshots CSV após a migração.
+
+    Retorna:
+        list: Caminhos relativos das partições gravadas.
+
+    Exceções:
+        FileNotFoundError: Lançada se nenhum snapshot CSV for encontrado.
+    """
+    csv_paths = sorted(glob.glob(os.path.join(csv_dir, f"{dataset_prefix}_*.csv")))
+    if not csv_paths:
+        raise FileNotFoundError(f"Nenhum snapshot CSV encontrado em {csv_dir}.")
+
+    print(f"Migrando {len(csv_paths)} snapshot(s) CSV para {dataset_dir}...")
+    # Os nomes dos arquivos contêm a data, então a ordenação lexicográfica é cronológica
+    snapshots = [pd.read_csv(path, parse_dates=[DATE_COLUMN]) for path in csv_paths]
+    combined_df = pd.concat(snapshots, ignore_index=True)
+
+    written_partitions = write_partitioned_dataset(combined_df, dataset_dir)
+    mark_dataset_updated(dataset_dir, os.path.basename(csv_paths[-1])[len(dataset_prefix) + 1:-len(".csv")])
+
+    if remove_csv:
+        for path in csv_paths:
+            os.remove(path)
+        print(f"{len(csv_paths)} snapshot(s) CSV removido(s).")
+
+    return written_partitions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Ferramentas do dataset de mercado em Parquet.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = subparsers.add_parser("migrate", help="Migra os snapshots CSV para o dataset Parquet particionado.")
+    migrate_parser.add_argument("--csv-dir", default="/tmp/dataset")
+    migrate_parser.add_argument("--dataset-dir", default=f"/tmp/dataset/{DATASET_NAME}")
+    migrate_parser.add_argument("--remove-csv", action="store_true")
+
+    args = parser.parse_args()
+    if args.command == "migrate":
+        partitions = migrate_csv_snapshots(args.csv_dir, args.dataset_dir, remove_csv=args.remove_csv)
+        print(f"Migração concluída: {len(partitions)} partição(ões).")
@@ -0,0 +1,146 @@
+import json
+import os
+import uuid
+
+import pandas as pd
+
+from dataset import (
+    DATE_COLUMN, calendar_from_frame, partition_path, partition_paths_for_range, read_partitioned_dataset, to_date
+)
+
+STATISTICS_FILE_NAME = "_statistics.json"
+
+
+def empty_statistics():
+    """Estatísticas de um dataset sem pregões."""
+    return {'version': None, 'last_checked': None, 'columns': [], 'min_date': None, 'max_date': None, 'months': {}}
+
+
+def _month_start(path):
+    values = dict(part.split("=") for part in path.split("/"))
+    return to_date(f"{int(values['year']):04d}-{int(values['month']):02d}-01")
+
+
+def update_statistics(statistics, partition_calendars, version, last_checked, columns):
+    """
+    Aplica às estatísticas os calendários das partições regravadas e recalcula as datas mínima e máxima.
+
+    Parâmetros:
+        statistics (dict): Estatísticas atuais (ver load_statistics).
+        partition_calendars (dict): Calendário de cada partição regravada (ver dataset.calendar_from_frame).
+        version (int): Versão do dataset após a atualização.
+        last_checked (str): Data da última verificação de novos pregões.
+        columns (list): Colunas de preço cobertas pelo dataset.
+
+    Retorna:
+        dict: Novas estatísticas.
+    """
+    months = {**statistics['months'], **partition_calendars}
+    months = {path: calendar for path, calendar in months.items() if calendar['rows']}
+    ordered = sorted(months, key=_month_start)
+
+    min_date = max_date = None
+    if ordered:
+        first_month, last_month = _month_start(ordered[0]), _month_start(ordered[-1])
+        min_date = first_month.replace(day=months[ordered[0]]['days'][0]).isoformat()
+        max_date = last_month.replace(day=months[ordered[-1]]['days'][-1]).isoformat()
+
+    return {
+        'version': version,
+        'last_checked': last_checked,
+        'columns': sorted(columns),
+        'min_date': min_date,
+        'max_date': max_date,
+        'months': {path: months[path] for path in ordered}
+    }
+
+
+def build_statistics(dataset_dir, version, last_checked, columns):
+    """
+    Reconstrói as estatísticas lendo apenas a coluna 'Date' do dataset (usada quando o arquivo não existe,
+    como em datasets gravados por versões anteriores, ou está defasado).
+    """
+    df = read_partitioned_dataset(dataset_dir, columns=[])
+    partition_calendars = {}
+    if not df.empty:
+        dates = pd.to_datetime(df[DATE_COLUMN])
+        for (year, month), partition_df in df.groupby([dates.dt.year, dates.dt.month]):
+            partition_calendars[partition_path(year, month)] = calendar_from_frame(partition_df)
+    return update_statistics(empty_statistics(), partition_calendars, version, last_checked, columns)
+
+
+def load_statistics(dataset_dir):
+    """
+    Carrega as estatísticas do dataset ('_statistics.json'), mantidas pela ingestão: versão do dataset, data da
+    última verificação, colunas cobertas, datas mínima e máxima e, para cada partição mensal, a quantidade de pregões
+    e os dias com pregão.
+
+    Retorna:
+        dict: Estatísticas do dataset (vazias se o arquivo não existe ou é inválido).
+    """
+    statistics_path = os.path.join(dataset_dir, STATISTICS_FILE_NAME)
+    if not os.path.exists(statistics_path):
+        return empty_statistics()
+
+    try:
+        with open(statistics_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Estatísticas do dataset inválidas em {statistics_path}, serão reconstruídas: {e}")
+        return empty_statistics()
+
+
+def save_statistics(dataset_dir, statistics):
+    """
+    Grava as estatísticas do dataset de forma atômica. O nome começa com '_' para ser ignorado pelo Spark.
+    """
+    os.makedirs(dataset_dir, exist_ok=True)
+    temporary_path = os.path.join(dataset_dir, f".{uuid.uuid4()}.tmp")
+    with open(temporary_path, 'w', encoding='utf-8') as f:
+        json.dump(statistics, f, sort_keys=True)
+    os.replace(temporary_path, os.path.join(dataset_dir, STATISTICS_FILE_NAME))
+
+
+def range_calendar(statistics, initial_date, final_date):
+    """
+    Consulta nas estatísticas os pregões de um intervalo, sem ler o dataset: a quantidade de pregões, o primeiro
+    e o último pregão e as partições mensais com pregões no intervalo. O custo é proporcional à quantidade de meses
+    do intervalo limitado às datas mínima e máxima do dataset.
+
+    Parâmetros:
+        statistics (dict): Estatísticas do dataset (ver load_statistics).
+        initial_date (str|date): Data inicial do intervalo.
+        final_date (str|date): Data final do intervalo.
+
+    Retorna:
+        dict: 'trading_days', 'first_date' e 'last_date' (None sem pregões) e 'partitions' (caminhos relativos,
+        em ordem cronológica).
+    """
+    calendar = {'trading_days': 0, 'first_date': None, 'last_date': None, 'partitions': []}
+    if not statistics['min_date']:
+        return calendar
+
+    start = max(to_date(initial_date), to_date(statistics['min_date']))
+    end = min(to_date(final_date), to_date(statistics['max_date']))
+    if start > end:
+        return calendar
+
+    for path in partition_paths_for_range(start, end):
+        month = statistics['months'].get(path)
+        if not month:
+            continue
+
+        month_start = _month_start(path)
+        days = month['days']
+        if (month_start.year, month_start.month) in ((start.year, start.month), (end.year, end.month)):
+            first_day = start.day if (month_start.year, month_start.month) == (start.year, start.month) else 1
+            last_day = end.day if (month_start.year, month_start.month) == (end.year, end.month) else 31
+            days = [day for day in days if first_day <= day <= last_day]
+        if not days:
+            continue
+
+        calendar['trading_days'] += len(days)
+        calendar['partitions'].append(path)
+        calendar['first_date'] = calendar['first_date'] or month_start.replace(day=days[0]).isoformat()
+        calendar['last_date'] = month_start.replace(day=days[-1]).isoformat()
+    return calendar
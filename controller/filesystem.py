@@ -0,0 +1,290 @@
+import os
+import posixpath
+import shutil
+import threading
+from urllib.parse import quote
+
+FILESYSTEM_WEBHDFS = 'webhdfs'
+FILESYSTEM_LOCAL = 'local'
+FILESYSTEMS = (FILESYSTEM_WEBHDFS, FILESYSTEM_LOCAL)
+
+DEFAULT_WEBHDFS_URL = 'http://coordinator:9870'
+DEFAULT_HDFS_URL = 'hdfs://coordinator:9000'
+DEFAULT_HDFS_USER = 'root'
+
+# Tamanho dos blocos lidos e enviados durante as transferências
+CHUNK_SIZE = 1024 * 1024
+
+
+class WebHdfsFileSystem:
+    """
+    Cliente HDFS em processo baseado na API REST WebHDFS do NameNode.
+
+    Substitui os comandos 'hdfs dfs', que iniciam uma JVM a cada operação. As requisições reutilizam as conexões
+    de uma única sessão HTTP e os arquivos são transferidos em blocos, sem serem carregados inteiros em memória.
+    """
+
+    def __init__(self, base_url=DEFAULT_WEBHDFS_URL, user=DEFAULT_HDFS_USER, timeout=60, pool_size=8):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.base_url = base_url.rstrip('/')
+        self.user = user
+        self.timeout = timeout
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def _url(self, path):
+        return f"{self.base_url}/webhdfs/v1{quote(posixpath.normpath('/' + path.lstrip('/')))}"
+
+    def _request(self, method, path, op, allowed_statuses=(200,), **kwargs):
+        """Executa uma operação WebHDFS e valida o status da resposta."""
+        params = {'op': op, 'user.name': self.user, **kwargs.pop('params', {})}
+        try:
+            response = self._session.request(method, self._url(path), params=params, timeout=self.timeout, **kwargs)
+        except Exception as e:
+            raise RuntimeError(f"Erro de comunicação com o WebHDFS ({op} {path}): {e}")
+
+        if response.status_code == 404 and 404 not in allowed_statuses:
+            raise FileNotFoundError(f"Caminho não encontrado no HDFS: {path}")
+        if response.status_code not in allowed_statuses:
+            raise RuntimeError(f"Erro na operação WebHDFS {op} em {path}: HTTP {response.status_code} {response.text[:500]}")
+        return response
+
+    def stat(self, path):
+        """
+        Retorna o status de um arquivo ou diretório.
+
+        Retorna:
+            dict: Status do caminho ('type', 'length', 'modification_time') ou None se ele não existir.
+        """
+        response = self._request('GET', path, 'GETFILESTATUS', allowed_statuses=(200, 404))
+        if response.status_code == 404:
+            return None
+        status = response.json()['FileStatus']
+        return {'type': status['type'].lower(), 'length': status['length'], 'modification_time': status['modificationTime']}
+
+    def list_status(self, path):
+        """
+        Lista o conteúdo de um diretório.
+
+        Retorna:
+            dict: Status de cada entrada do diretório, indexado pelo nome.
+
+        Exceções:
+            FileNotFoundError: Lançada se o diretório não existir.
+        """
+        response = self._request('GET', path, 'LISTSTATUS')
+        return {
+            status['pathSuffix']: {
+                'type': status['type'].lower(), 'length': status['length'], 'modification_time': status['modificationTime']
+            }
+            for status in response.json()['FileStatuses']['FileStatus']
+        }
+
+    def stat_many(self, paths):
+        """
+        Obtém o status de vários caminhos com uma única listagem por diretório pai.
+
+        Retorna:
+            dict: Status de cada caminho (None para os caminhos inexistentes).
+        """
+        return _stat_many(self, paths)
+
+    def exists(self, path):
+        return self.stat(path) is not None
+
+    def makedirs(self, path):
+        """Cria um diretório, incluindo os diretórios pai."""
+        self._request('PUT', path, 'MKDIRS')
+
+    def upload(self, local_path, remote_path, overwrite=True):
+        """
+        Envia um arquivo local ao HDFS em blocos. O NameNode redireciona a escrita para um DataNode,
+        que recebe o conteúdo diretamente.
+        """
+        response = self._request(
+            'PUT', remote_path, 'CREATE', allowed_statuses=(307,), allow_redirects=False,
+            params={'overwrite': str(overwrite).lower()}
+        )
+        try:
+            with open(local_path, 'rb') as f:
+                upload_response = self._session.put(response.headers['Location'], data=f, timeout=self.timeout)
+        except Exception as e:
+            raise RuntimeError(f"Erro ao enviar {local_path} para o HDFS em {remote_path}: {e}")
+        if upload_response.status_code != 201:
+            raise RuntimeError(
+                f"Erro ao enviar {local_path} para o HDFS em {remote_path}: "
+                f"HTTP {upload_response.status_code} {upload_response.text[:500]}"
+            )
+
+    def download(self, remote_path, local_path):
+        """Copia um arquivo do HDFS para o sistema de arquivos local em blocos."""
+        with self._request('GET', remote_path, 'OPEN', stream=True) as response:
+            with open(local_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+
+    def delete(self, path, recursive=False):
+        """Remove um arquivo ou diretório. Caminhos inexistentes são ignorados."""
+        self._request('DELETE', path, 'DELETE', params={'recursive': str(recursive).lower()})
+
+    def close(self):
+        self._session.close()
+
+
+class LocalFileSystem:
+    """
+    Sistema de arquivos local com a mesma interface do cliente WebHDFS. Os caminhos HDFS são mapeados
+    para dentro do diretório raiz informado. Usado em testes e benchmarks sem o cluster.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _local_path(self, path):
+        return os.path.join(self.root, posixpath.normpath('/' + path.lstrip('/')).lstrip('/'))
+
+    @staticmethod
+    def _status(local_path):
+        status = os.stat(local_path)
+        return {
+            'type': 'directory' if os.path.isdir(local_path) else 'file',
+            'length': 0 if os.path.isdir(local_path) else status.st_size,
+            'modification_time': int(status.st_mtime * 1000)
+        }
+
+    def stat(self, path):
+        local_path = self._local_path(path)
+        return self._status(local_path) if os.path.exists(local_path) else None
+
+    def list_status(self, path):
+        local_path = self._local_path(path)
+        if not os.path.isdir(local_path):
+            raise FileNotFoundError(f"Caminho não encontrado: {path}")
+        return {name: self._status(os.path.join(local_path, name)) for name in os.listdir(local_path)}
+
+    def stat_many(self, paths):
+        return _stat_many(self, paths)
+
+    def exists(self, path):
+        return self.stat(path) is not None
+
+    def makedirs(self, path):
+        os.makedirs(self._local_path(path), exist_ok=True)
+
+    def upload(self, local_path, remote_path, overwrite=True):
+        target_path = self._local_path(remote_path)
+        if not overwrite and os.path.exists(target_path):
+            raise RuntimeError(f"O arquivo {remote_path} já existe.")
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        shutil.copyfile(local_path, target_path)
+
+    def download(self, remote_path, local_path):
+        source_path = self._local_path(remote_path)
+        if not os.path.isfile(source_path):
+            raise FileNotFoundError(f"Caminho não encontrado: {remote_path}")
+        shutil.copyfile(source_path, local_path)
+
+    def delete(self, path, recursive=False):
+        local_path = self._local_path(path)
+        if os.path.isdir(local_path):
+            if recursive:
+                shutil.rmtree(local_path)
+            else:
+                os.rmdir(local_path)
+        elif os.path.exists(local_path):
+            os.remove(local_path)
+
+    def close(self):
+        pass
+
+
+def _stat_many(filesystem, paths):
+    """Agrupa os caminhos por diretório pai e obtém o status de todos com uma listagem por diretório."""
+    paths_by_parent = {}
+    for path in paths:
+        normalized_path = posixpath.normpath('/' + path.lstrip('/'))
+        paths_by_parent.setdefault(posixpath.dirname(normalized_path), []).append((path, posixpath.basename(normalized_path)))
+
+    statuses = {}
+    for parent, children in paths_by_parent.items():
+        try:
+            listing = filesystem.list_status(parent)
+        except FileNotFoundError:
+            listing = {}
+        for path, name in children:
+            statuses[path] = filesystem.stat(path) if name == '' else listing.get(name)
+    return statuses
+
+
+def download_directory(filesystem, remote_dir, local_dir):
+    """
+    Copia recursivamente um diretório do sistema de arquivos para o diretório local.
+
+    Retorna:
+        list: Caminhos locais dos arquivos copiados.
+    """
+    os.makedirs(local_dir, exist_ok=True)
+    downloaded_files = []
+    for name, status in filesystem.list_status(remote_dir).items():
+        remote_path = posixpath.join(remote_dir, name)
+        local_path = os.path.join(local_dir, name)
+        if status['type'] == 'directory':
+            downloaded_files += download_directory(filesystem, remote_path, local_path)
+        else:
+            filesystem.download(remote_path, local_path)
+            downloaded_files.append(local_path)
+    return downloaded_files
+
+
+_filesystem = None
+_filesystem_lock = threading.Lock()
+
+
+def get_filesystem():
+    """
+    Retorna o sistema de arquivos do processo, criando-o na primeira chamada.
+
+    Variáveis de ambiente:
+        CONTROLLER_FILESYSTEM: 'webhdfs' (padrão) para o HDFS do cluster ou 'local' para um diretório local.
+        CONTROLLER_WEBHDFS_URL: URL HTTP do NameNode (padrão 'http://coordinator:9870').
+        CONTROLLER_HDFS_USER: Usuário das operações no HDFS (padrão 'root').
+        CONTROLLER_LOCAL_FS_ROOT: Diretório raiz do sistema de arquivos local (padrão '/tmp/hdfs').
+
+    Exceções:
+        ValueError: Lançada se o sistema de arquivos configurado não for reconhecido.
+    """
+    global _filesystem
+    with _filesystem_lock:
+        if _filesystem is None:
+            kind = (os.getenv('CONTROLLER_FILESYSTEM') or FILESYSTEM_WEBHDFS).strip().lower()
+            if kind == FILESYSTEM_WEBHDFS:
+                _filesystem = WebHdfsFileSystem(
+                    base_url=os.getenv('CONTROLLER_WEBHDFS_URL') or DEFAULT_WEBHDFS_URL,
+                    user=os.getenv('CONTROLLER_HDFS_USER') or DEFAULT_HDFS_USER
+                )
+            elif kind == FILESYSTEM_LOCAL:
+                _filesystem = LocalFileSystem(os.getenv('CONTROLLER_LOCAL_FS_ROOT') or '/tmp/hdfs')
+            else:
+                raise ValueError(f"Sistema de arquivos inválido: '{kind}'. Valores aceitos: {', '.join(FILESYSTEMS)}.")
+        return _filesystem
+
+
+def get_spark_filesystem_url():
+    """
+    Retorna a URL base com que o Spark lê e grava os caminhos do sistema de arquivos configurado: o NameNode do HDFS
+    ou, no sistema de arquivos local, o diretório raiz como URL 'file://'.
+
+    Variáveis de ambiente:
+        CONTROLLER_FILESYSTEM: 'webhdfs' (padrão) ou 'local'.
+        CONTROLLER_HDFS_URL: URL do NameNode usada pelo Spark (padrão 'hdfs://coordinator:9000').
+        CONTROLLER_LOCAL_FS_ROOT: Diretório raiz do sistema de arquivos local (padrão '/tmp/hdfs').
+    """
+    kind = (os.getenv('CONTROLLER_FILESYSTEM') or FILESYSTEM_WEBHDFS).strip().lower()
+    if kind == FILESYSTEM_LOCAL:
+        return 'file://' + os.path.abspath(os.getenv('CONTROLLER_LOCAL_FS_ROOT') or '/tmp/hdfs')
+    return (os.getenv('CONTROLLER_HDFS_URL') or DEFAULT_HDFS_URL).rstrip('/')
@@ -0,0 +1,389 @@
+import glob
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from dataset import (
+    DATE_COLUMN, mark_dataset_updated, normalize_market_data, partition_path, partition_paths_for_range,
+    quality_by_partition, read_partitioned_dataset, to_date, write_partitioned_dataset
+)
+from dataset_statistics import build_statistics, load_statistics, save_statistics, update_statistics
+from schema import empty_quality, format_quality, merge_quality, quality_from_frame
+
+MANIFEST_FILE_NAME = "_manifest.json"
+
+# Serializa ingestões e envios concorrentes do mesmo dataset
+dataset_lock = threading.Lock()
+
+
+class YahooFinanceFetcher:
+    """
+    Fonte de dados de mercado baseada no Yahoo Finance (yfinance).
+    """
+
+    def fetch(self, tickers, start_date, end_date):
+        """
+        Baixa os preços ajustados de fechamento dos tickers no intervalo [start_date, end_date].
+
+        Parâmetros:
+            tickers (list): Tickers a serem baixados (ex: ['^GSPC', 'BRL=X']).
+            start_date (date): Data inicial (inclusiva).
+            end_date (date): Data final (inclusiva).
+
+        Retorna:
+            pd.DataFrame: Preços indexados pela data, com uma coluna por ticker.
+        """
+        import yfinance as yf
+
+        # O parâmetro 'end' do yfinance é exclusivo
+        data = yf.download(
+            tickers,
+            start=start_date.strftime('%Y-%m-%d'),
+            end=(end_date + timedelta(days=1)).strftime('%Y-%m-%d')
+        )["Adj Close"]
+
+        if isinstance(data, pd.Series):
+            data = data.to_frame(name=tickers[0])
+        return data
+
+
+class LocalFixtureFetcher:
+    """
+    Fonte de dados de mercado local, lida de um arquivo CSV com a coluna 'Date' e uma coluna por ticker.
+    Substitui o Yahoo Finance em testes e benchmarks.
+    """
+
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        self._data = None
+        self.calls = []
+
+    def fetch(self, tickers, start_date, end_date):
+        """
+        Retorna os preços dos tickers no intervalo [start_date, end_date] a partir do arquivo local.
+        """
+        if self._data is None:
+            self._data = pd.read_csv(self.csv_path, parse_dates=[DATE_COLUMN]).set_index(DATE_COLUMN).sort_index()
+
+        self.calls.append((tuple(tickers), start_date, end_date))
+        available_tickers = [ticker for ticker in tickers if ticker in self._data.columns]
+        return self._data.loc[pd.Timestamp(start_date):pd.Timestamp(end_date), available_tickers]
+
+
+def get_market_data_fetcher():
+    """
+    Retorna a fonte de dados de mercado configurada: o Yahoo Finance ou, se 'CONTROLLER_MARKET_DATA_FIXTURE'
+    estiver definida, o arquivo CSV local informado (usado em benchmarks sem acesso à internet).
+    """
+    fixture_path = os.getenv('CONTROLLER_MARKET_DATA_FIXTURE')
+    if fixture_path:
+        return LocalFixtureFetcher(fixture_path)
+    return YahooFinanceFetcher()
+
+
+def load_manifest(dataset_dir):
+    """
+    Carrega o manifesto de cobertura do dataset ('_manifest.json').
+
+    Retorna:
+        dict: Manifesto com a cobertura por ticker ('tickers'), a versão do dataset ('version'),
+        a data da última verificação ('last_checked'), as partições pendentes de envio ao HDFS ('pending_partitions')
+        e o resumo de qualidade de cada partição ('quality').
+    """
+    manifest_path = os.path.join(dataset_dir, MANIFEST_FILE_NAME)
+    if not os.path.exists(manifest_path):
+        return {'version': 0, 'last_checked': None, 'tickers': {}, 'pending_partitions': [], 'quality': {}}
+
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_manifest(dataset_dir, manifest):
+    """
+    Grava o manifesto de cobertura do dataset de forma atômica.
+    """
+    os.makedirs(dataset_dir, exist_ok=True)
+    manifest_path = os.path.join(dataset_dir, MANIFEST_FILE_NAME)
+    temporary_path = os.path.join(dataset_dir, f".{uuid.uuid4()}.tmp")
+    with open(temporary_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(temporary_path, manifest_path)
+
+
+def find_stored_date_range(dataset_dir, column):
+    """
+    Procura a primeira e a última data com valor armazenado para uma coluna do dataset, quando o manifesto não a
+    conhece (ex: dataset migrado dos snapshots CSV).
+
+    Retorna:
+        tuple: Primeira e última datas armazenadas, ou (None, None) se a coluna não tiver dados.
+    """
+    try:
+        df = read_partitioned_dataset(dataset_dir, columns=[column])
+    except Exception:
+        return None, None
+
+    if column not in df.columns:
+        return None, None
+    stored = df.loc[df[column].notna(), DATE_COLUMN]
+    return (to_date(stored.min()), to_date(stored.max())) if not stored.empty else (None, None)
+
+
+def changed_months(merged, existing):
+    """
+    Indica as linhas dos meses cujos preços mesclados diferem dos armazenados (datas, colunas ou valores),
+    de modo que a busca repetida dos últimos pregões não regrave partições nem altere a versão do dataset.
+
+    Parâmetros:
+        merged (pd.DataFrame): Preços mesclados, indexados por data.
+        existing (pd.DataFrame): Preços armazenados nos mesmos meses, indexados por data.
+
+    Retorna:
+        pd.Series: Máscara booleana das linhas de 'merged' nos meses alterados.
+    """
+    months = merged.index.to_period("M")
+    existing_months = existing.index.to_period("M")
+    columns = sorted(merged.columns)
+
+    changed = pd.Series(True, index=merged.index)
+    for month in months.unique():
+        stored = existing.loc[existing_months == month]
+        if sorted(stored.columns) != columns:
+            continue
+        current = merged.loc[months == month, columns].astype("float64").sort_index()
+        if current.equals(stored[columns].astype("float64").sort_index()):
+            changed[months == month] = False
+    return changed
+
+
+def merge_partitions(dataset_dir, new_data, quality=None, calendars=None):
+    """
+    Mescla de forma idempotente os novos dados nas partições mensais afetadas e regrava apenas as partições
+    cujos valores mudaram.
+    Para uma mesma data e coluna, o valor novo prevalece sobre o armazenado. Cotações ausentes permanecem nulas
+    (o cálculo dos retornos usa a última cotação válida de cada ativo).
+
+    Parâmetros:
+        dataset_dir (str): Diretório raiz do dataset.
+        new_data (pd.DataFrame): Novos preços, com a coluna 'Date' e uma coluna por ativo.
+        quality (dict, opcional): Se informado, recebe o resumo de qualidade de cada partição regravada: as cotações
+            da partição mesclada e as datas repetidas e fora de ordem dos novos dados, na ordem em que foram recebidos.
+        calendars (dict, opcional): Se informado, recebe o calendário de pregões de cada partição regravada.
+
+    Retorna:
+        list: Caminhos relativos das partições regravadas.
+    """
+    received = normalize_market_data(new_data, deduplicate=False)
+    received_quality = quality_by_partition(received, [column for column in received.columns if column != DATE_COLUMN])
+    new_data = normalize_market_data(received)
+
+    dates = pd.to_datetime(new_data[DATE_COLUMN])
+    first_month = dates.min().replace(day=1).date()
+    last_month_end = (dates.max() + pd.offsets.MonthEnd(0)).date()
+
+    existing = read_partitioned_dataset(dataset_dir, first_month, last_month_end)
+    if existing.empty:
+        merged = new_data
+    else:
+        existing = existing.set_index(pd.to_datetime(existing[DATE_COLUMN])).drop(columns=[DATE_COLUMN])
+        incoming = new_data.set_index(dates).drop(columns=[DATE_COLUMN])
+        merged = incoming.combine_first(existing)
+        merged = merged.loc[changed_months(merged, existing)].rename_axis(DATE_COLUMN).reset_index()
+        if merged.empty:
+            print("Os dados recebidos já estão armazenados; nenhuma partição regravada.")
+            return []
+
+    written_partitions = write_partitioned_dataset(merged, dataset_dir, quality=quality, calendars=calendars)
+    if quality is not None:
+        for path in written_partitions:
+            if path in received_quality:
+                quality[path].update({
+                    'duplicate_dates': received_quality[path]['duplicate_dates'],
+                    'unordered_dates': received_quality[path]['unordered_dates']
+                })
+    return written_partitions
+
+
+def refresh_statistics(dataset_dir, manifest, partition_calendars=None, previous_version=None):
+    """
+    Mantém as estatísticas do dataset (ver dataset_statistics.load_statistics) na versão do manifesto. Quando as
+    estatísticas estão na versão anterior à ingestão, apenas os calendários das partições regravadas são aplicados;
+    quando estão ausentes ou defasadas, são reconstruídas a partir da coluna 'Date' do dataset.
+
+    Parâmetros:
+        dataset_dir (str): Diretório raiz do dataset.
+        manifest (dict): Manifesto do dataset, já atualizado.
+        partition_calendars (dict, opcional): Calendário de cada partição regravada pela ingestão.
+        previous_version (int, opcional): Versão do dataset antes da ingestão.
+
+    Retorna:
+        dict: Estatísticas atualizadas.
+    """
+    statistics = load_statistics(dataset_dir)
+    version, last_checked, columns = manifest.get('version', 0), manifest.get('last_checked'), list(manifest['tickers'])
+    if statistics['version'] == version and statistics['last_checked'] == last_checked and statistics['columns'] == sorted(columns):
+        return statistics
+
+    if statistics['version'] in (version, previous_version):
+        statistics = update_statistics(statistics, partition_calendars or {}, version, last_checked, columns)
+    else:
+        print(f"Reconstruindo as estatísticas do dataset em {dataset_dir}...")
+        statistics = build_statistics(dataset_dir, version, last_checked, columns)
+    save_statistics(dataset_dir, statistics)
+    return statistics
+
+
+def range_quality(manifest, initial_date, final_date):
+    """
+    Combina os resumos de qualidade, registrados no manifesto durante a ingestão, das partições mensais que cobrem
+    o intervalo informado, sem ler o dataset. Partições gravadas antes do registro da qualidade são ignoradas.
+
+    Parâmetros:
+        manifest (dict): Manifesto do dataset (ver load_manifest).
+        initial_date (str|date): Data inicial do intervalo.
+        final_date (str|date): Data final do intervalo.
+
+    Retorna:
+        dict: Resumo de qualidade das partições do intervalo (ver schema.quality_from_frame),
+        ou None se nenhuma partição do intervalo tiver resumo.
+    """
+    partition_quality = manifest.get('quality', {})
+    summaries = [partition_quality[path] for path in partition_paths_for_range(initial_date, final_date) if path in partition_quality]
+    if not summaries:
+        return None
+
+    quality = empty_quality([])
+    for summary in summaries:
+        quality = merge_quality(quality, summary)
+    return quality
+
+
+def ingest_market_data(fetcher, tickers, column_mapping, dataset_dir, start_date="2000-01-01", end_date=None, overlap_days=1):
+    """
+    Atualiza o dataset de forma incremental: para cada ticker, busca apenas o intervalo ainda não armazenado
+    (a partir da última data conhecida, com uma pequena sobreposição para corrigir o último pregão), mescla os dados
+    nas partições afetadas e atualiza o manifesto de cobertura e as estatísticas do dataset (calendário de pregões).
+
+    Parâmetros:
+        fetcher: Fonte de dados com o método 'fetch(tickers, start_date, end_date)' (ex: YahooFinanceFetcher).
+        tickers (list): Tickers a serem mantidos no dataset.
+        column_mapping (dict): Nome da coluna do dataset para cada ticker (ex: {'BRL=X': 'DOLAR'}).
+        dataset_dir (str): Diretório raiz do dataset Parquet.
+        start_date (str): Data inicial do histórico para tickers ainda não armazenados. Padrão é '2000-01-01'.
+        end_date (str, opcional): Data final da busca. Padrão é a data atual.
+        overlap_days (int): Quantidade de dias já armazenados que são buscados novamente. Padrão é 1.
+
+    Retorna:
+        list: Caminhos relativos das partições regravadas (vazia se não houve dados novos).
+
+    Exceções:
+        KeyError: Lançada se a fonte não retornar algum dos tickers solicitados.
+    """
+    column_mapping = column_mapping or {ticker: ticker.replace('^', '') for ticker in tickers}
+    end = to_date(end_date) if end_date else datetime.today().date()
+
+    manifest = load_manifest(dataset_dir)
+    if manifest.get('last_checked') == end.isoformat() and all(
+        column_mapping[ticker] in manifest['tickers'] for ticker in tickers
+    ):
+        print(f"Dataset já verificado hoje em: {dataset_dir}")
+        return []
+
+    # Agrupa os tickers pela data a partir da qual precisam ser buscados
+    fetch_groups = {}
+    for ticker in tickers:
+        column = column_mapping[ticker]
+        coverage = manifest['tickers'].get(column)
+        if coverage is None:
+            # A cobertura de colunas já armazenadas sem manifesto parte do histórico completo, não da sobreposição
+            first_stored, last_stored = find_stored_date_range(dataset_dir, column)
+            if first_stored is not None:
+                coverage = manifest['tickers'][column] = {
+                    'ticker': ticker, 'first_date': first_stored.isoformat(), 'last_date': last_stored.isoformat()
+                }
+        last_date = to_date(coverage['last_date']) if coverage else None
+
+        fetch_start = to_date(start_date) if last_date is None else last_date - timedelta(days=overlap_days - 1)
+        if fetch_start <= end:
+            fetch_groups.setdefault(fetch_start, []).append(ticker)
+
+    previous_version = manifest.get('version', 0)
+    written_partitions = set()
+    partition_calendars = {}
+    for fetch_start, group_tickers in sorted(fetch_groups.items()):
+        print(f"Buscando dados de mercado de {group_tickers} para o período de {fetch_start} a {end}...")
+        data = fetcher.fetch(group_tickers, fetch_start, end)
+
+        missing_columns = [ticker for ticker in group_tickers if ticker not in data.columns]
+        if missing_columns:
+            raise KeyError(f"As seguintes colunas para renomeação estão ausentes no DataFrame: {missing_columns}")
+
+        data = data[group_tickers].dropna(how='all')
+        if data.empty:
+            print(f"Nenhum dado novo para {group_tickers}.")
+            continue
+
+        data = data.rename(columns=column_mapping).rename_axis(DATE_COLUMN).reset_index()
+        group_columns = [column_mapping[ticker] for ticker in group_tickers]
+        print(f"Qualidade dos dados recebidos: {format_quality(quality_from_frame(data, group_columns))}")
+
+        partition_quality = {}
+        written_partitions.update(merge_partitions(dataset_dir, data, quality=partition_quality, calendars=partition_calendars))
+        manifest.setdefault('quality', {}).update(partition_quality)
+
+        for ticker in group_tickers:
+            column = column_mapping[ticker]
+            stored_dates = pd.to_datetime(data.loc[data[column].notna(), DATE_COLUMN])
+            if stored_dates.empty:
+                continue
+            coverage = manifest['tickers'].get(column)
+            first_date = stored_dates.min().date().isoformat()
+            manifest['tickers'][column] = {
+                'ticker': ticker,
+                'first_date': min(coverage['first_date'], first_date) if coverage else first_date,
+                'last_date': stored_dates.max().date().isoformat()
+            }
+
+    manifest['last_checked'] = end.isoformat()
+    if written_partitions:
+        manifest['version'] = manifest.get('version', 0) + 1
+        manifest['pending_partitions'] = sorted(set(manifest.get('pending_partitions', [])) | written_partitions)
+        mark_dataset_updated(dataset_dir, end.isoformat())
+        print(f"Dataset atualizado (versão {manifest['version']}): {len(written_partitions)} partição(ões) regravada(s).")
+    save_manifest(dataset_dir, manifest)
+    refresh_statistics(dataset_dir, manifest, partition_calendars, previous_version)
+
+    return sorted(written_partitions)
+
+
+def clear_pending_partitions(dataset_dir, partitions):
+    """
+    Remove do manifesto as partições que já foram enviadas ao HDFS.
+    """
+    manifest = load_manifest(dataset_dir)
+    manifest['pending_partitions'] = [p for p in manifest.get('pending_partitions', []) if p not in set(partitions)]
+    save_manifest(dataset_dir, manifest)
+
+
+def list_local_partitions(dataset_dir):
+    """
+    Lista todas as partições existentes no dataset local, a partir dos diretórios 'year=*/month=*'.
+
+    Retorna:
+        list: Caminhos relativos das partições ('year=yyyy/month=m'), em ordem cronológica.
+    """
+    partitions = []
+    for partition_dir in glob.glob(os.path.join(dataset_dir, "year=*", "month=*")):
+        if not os.path.isdir(partition_dir):
+            continue
+        month_name = os.path.basename(partition_dir)
+        year_name = os.path.basename(os.path.dirname(partition_dir))
+        try:
+            partitions.append((int(year_name[len("year="):]), int(month_name[len("month="):])))
+        except ValueError:
+            continue
+    return [partition_path(year, month) for year, month in sorted(partitions)]
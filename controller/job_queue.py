@@ -0,0 +1,214 @@
+import itertools
+import threading
+import time
+from collections import deque
+
+from metrics import observe_queue_wait
+
+PRIORITIES = {
+    'high': 0,
+    'normal': 1,
+    'low': 2
+}
+
+
+class QueueFullError(Exception):
+    """
+    Lançada quando a fila de relatórios não pode aceitar novas requisições.
+
+    Atributos:
+        retry_after (int): Tempo sugerido, em segundos, antes de uma nova tentativa.
+    """
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ReportQueue:
+    """
+    Fila de execução dos relatórios com prioridades, justiça entre solicitantes e limite de concorrência.
+
+    Um número fixo de workers (ajustado à quantidade de executores do cluster) retira da fila a requisição elegível
+    de maior prioridade e, junto com ela, as demais requisições na ordem da fila, formando um lote processado por um
+    único job Spark. Dentro de uma mesma prioridade, os solicitantes são atendidos em rodízio, de modo que um
+    solicitante com muitas requisições não bloqueie os demais.
+
+    Quando a fila está cheia, novas requisições são recusadas imediatamente com QueueFullError.
+    """
+
+    def __init__(self, process_batch, max_concurrency=2, max_depth=100, max_per_requester=10, max_batch_size=50):
+        self.process_batch = process_batch
+        self.max_concurrency = max_concurrency
+        self.max_depth = max_depth
+        self.max_per_requester = max_per_requester
+        self.max_batch_size = max_batch_size
+
+        self._entries = []
+        self._sequence = itertools.count()
+        self._requester_rounds = {}
+        self._current_round = 0
+        self._running = 0
+        self._stopped = False
+        self._workers = []
+        self._condition = threading.Condition()
+
+        self._wait_times = deque(maxlen=500)
+        self._run_times = deque(maxlen=500)
+        self._completed = 0
+        self._rejected = 0
+
+    def start(self):
+        """
+        Inicia os workers da fila.
+        """
+        for index in range(self.max_concurrency):
+            worker = threading.Thread(target=self._worker_loop, name=f"report-worker-{index + 1}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self):
+        """
+        Sinaliza aos workers que devem encerrar após o lote em execução.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def _retry_after(self):
+        """Estima o tempo até haver espaço na fila, com base no tempo médio de execução dos lotes."""
+        average_run_time = sum(self._run_times) / len(self._run_times) if self._run_times else 30
+        return max(5, int(average_run_time * max(1, len(self._entries)) / self.max_concurrency / self.max_batch_size + 1))
+
+    def _check_admission(self, report_request):
+        """Recusa a requisição se a fila ou a cota do solicitante estiverem esgotadas. Deve ser chamado com a condição adquirida."""
+        if len(self._entries) >= self.max_depth:
+            self._rejected += 1
+            raise QueueFullError(
+                f"A fila de relatórios está cheia ({self.max_depth} requisições). Tente novamente mais tarde.",
+                self._retry_after()
+            )
+
+        requester_pending = sum(1 for entry in self._entries if entry[3].requester == report_request.requester)
+        if requester_pending >= self.max_per_requester:
+            self._rejected += 1
+            raise QueueFullError(
+                f"Limite de {self.max_per_requester} requisições pendentes por solicitante atingido.",
+                self._retry_after()
+            )
+
+    def submit(self, report_request, enforce_limits=True):
+        """
+        Adiciona uma requisição à fila.
+
+        Parâmetros:
+            report_request (ReportRequest): Requisição a ser processada. Os atributos 'priority', 'requester'
+                e 'not_before' definem a ordem e o momento a partir do qual a requisição pode ser processada.
+            enforce_limits (bool): Aplica os limites de admissão. Desativado ao reenfileirar jobs já aceitos.
+
+        Exceções:
+            QueueFullError: Lançada se a fila ou a cota do solicitante estiverem esgotadas.
+        """
+        with self._condition:
+            if self._stopped:
+                raise QueueFullError("A fila de relatórios está encerrada.", self._retry_after())
+
+            if enforce_limits:
+                self._check_admission(report_request)
+
+            # Descarta as rodadas de solicitantes que já foram totalmente atendidos
+            if len(self._requester_rounds) > 1000:
+                self._requester_rounds = {
+                    requester: requester_round for requester, requester_round in self._requester_rounds.items()
+                    if requester_round >= self._current_round
+                }
+
+            # Rodízio entre solicitantes: cada nova requisição de um mesmo solicitante entra na rodada seguinte
+            requester_round = max(self._requester_rounds.get(report_request.requester, -1) + 1, self._current_round)
+            self._requester_rounds[report_request.requester] = requester_round
+
+            priority = PRIORITIES.get(report_request.priority, PRIORITIES['normal'])
+            self._entries.append((priority, requester_round, next(self._sequence), report_request))
+            self._entries.sort(key=lambda entry: entry[:3])
+            self._condition.notify()
+
+    def _next_batch(self):
+        """
+        Aguarda até existir uma requisição elegível e retira da fila o lote a ser processado.
+        Deve ser chamado com a condição adquirida.
+        """
+        while not self._stopped:
+            now = time.time()
+            eligible_index = next(
+                (index for index, entry in enumerate(self._entries) if entry[3].not_before <= now), None
+            )
+
+            if eligible_index is None:
+                next_eligible = min((entry[3].not_before for entry in self._entries), default=None)
+                self._condition.wait(timeout=None if next_eligible is None else max(0.01, next_eligible - now))
+                continue
+
+            # A requisição elegível de maior prioridade lidera o lote, seguida das demais na ordem da fila
+            head = self._entries.pop(eligible_index)
+            batch_entries = [head] + self._entries[:self.max_batch_size - 1]
+            del self._entries[:self.max_batch_size - 1]
+
+            self._current_round = max(self._current_round, head[1])
+            for entry in batch_entries:
+                self._wait_times.append(now - entry[3].submitted_at)
+                observe_queue_wait(now - entry[3].submitted_at)
+            return [entry[3] for entry in batch_entries]
+
+        return None
+
+    def _worker_loop(self):
+        """Laço de execução de cada worker."""
+        while True:
+            with self._condition:
+                batch = self._next_batch()
+                if batch is None:
+                    return
+                self._running += 1
+
+            start_time = time.perf_counter()
+            try:
+                self.process_batch(batch)
+            except Exception as e:
+                print(f"Erro inesperado ao processar o lote de relatórios: {e}")
+            finally:
+                run_time = time.perf_counter() - start_time
+                with self._condition:
+                    self._running -= 1
+                    self._run_times.append(run_time)
+                    self._completed += len(batch)
+                for report_request in batch:
+                    report_request.completed.set()
+
+    def stats(self):
+        """
+        Retorna as métricas da fila: profundidade, execuções em andamento, tempos de espera e de execução.
+
+        Retorna:
+            dict: Métricas da fila.
+        """
+        def summarize(values):
+            if not values:
+                return {'avg': None, 'p95': None, 'max': None}
+            ordered = sorted(values)
+            return {
+                'avg': round(sum(ordered) / len(ordered), 3),
+                'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+                'max': round(ordered[-1], 3)
+            }
+
+        with self._condition:
+            return {
+                'depth': len(self._entries),
+                'max_depth': self.max_depth,
+                'running': self._running,
+                'max_concurrency': self.max_concurrency,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'wait_seconds': summarize(self._wait_times),
+                'run_seconds': summarize(self._run_times)
+            }
@@ -0,0 +1,282 @@
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+
+JOB_STATES = ('queued', 'fetching', 'spark', 'collecting', 'charting', 'emailing', 'done', 'failed')
+TERMINAL_STATES = ('done', 'failed')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    script_path TEXT NOT NULL,
+    initial_date TEXT NOT NULL,
+    final_date TEXT NOT NULL,
+    email TEXT NOT NULL,
+    requester TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    state TEXT NOT NULL,
+    error TEXT,
+    not_before REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_state_updated_at ON jobs (state, updated_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_requester_created_at ON jobs (requester, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_state_created_at ON jobs (state, created_at);
+
+CREATE TABLE IF NOT EXISTS job_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    message TEXT,
+    at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_job_events_job_id_at ON job_events (job_id, at);
+"""
+
+
+def encode_cursor(job):
+    """
+    Codifica a posição de um job na listagem (data de criação e ID) em um cursor opaco de paginação.
+    """
+    return base64.urlsafe_b64encode(json.dumps([job['created_at'], job['id']]).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Decodifica um cursor de paginação gerado por encode_cursor.
+
+    Retorna:
+        tuple: Data de criação e ID do último job da página anterior.
+
+    Exceções:
+        ValueError: Lançada se o cursor for inválido.
+    """
+    try:
+        created_at, job_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return float(created_at), str(job_id)
+    except Exception:
+        raise ValueError(f"Cursor de paginação inválido: '{cursor}'.")
+
+
+class JobStore:
+    """
+    Armazenamento persistente dos jobs de relatório em um arquivo SQLite local.
+
+    Cada job registra o estado atual e o histórico de transições (queued, fetching, spark, collecting, charting,
+    emailing, done/failed) com o horário de cada uma. As consultas por estado e por data usam índices, mantendo
+    o armazenamento rápido mesmo com centenas de milhares de jobs no histórico.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._changed = threading.Condition()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connection() as connection:
+            connection.executescript(SCHEMA)
+
+    def _connection(self):
+        """Retorna a conexão SQLite da thread atual, criando-a na primeira utilização."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def create_job(self, report_request):
+        """
+        Registra uma nova requisição de relatório no estado 'queued'.
+
+        Parâmetros:
+            report_request (ReportRequest): Requisição a ser registrada.
+        """
+        now = time.time()
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT INTO jobs (id, script_path, initial_date, final_date, email, requester, priority, state, "
+                "not_before, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+                (
+                    report_request.request_id, report_request.script_path, report_request.initial_date,
+                    report_request.final_date, report_request.email, report_request.requester,
+                    report_request.priority, report_request.not_before, now, now
+                )
+            )
+            connection.execute(
+                "INSERT INTO job_events (job_id, state, at) VALUES (?, 'queued', ?)",
+                (report_request.request_id, now)
+            )
+
+    def delete_job(self, job_id):
+        """
+        Remove um job e seu histórico (usado quando a requisição é recusada pela fila).
+        """
+        with self._connection() as connection:
+            connection.execute("DELETE FROM job_events WHERE job_id = ?", (job_id,))
+            connection.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def transition(self, job_ids, state, message=None):
+        """
+        Registra a transição de um ou mais jobs para um novo estado.
+
+        Parâmetros:
+            job_ids (str|list): ID do job ou lista de IDs.
+            state (str): Novo estado.
+            message (str, opcional): Mensagem associada à transição (ex: o erro em caso de falha).
+
+        Exceções:
+            ValueError: Lançada se o estado não for reconhecido.
+        """
+        if state not in JOB_STATES:
+            raise ValueError(f"Estado de job inválido: '{state}'.")
+
+        if isinstance(job_ids, str):
+            job_ids = [job_ids]
+        if not job_ids:
+            return
+
+        now = time.time()
+        error = message if state == 'failed' else None
+        with self._connection() as connection:
+            connection.executemany(
+                "UPDATE jobs SET state = ?, error = ?, updated_at = ? WHERE id = ?",
+                [(state, error, now, job_id) for job_id in job_ids]
+            )
+            connection.executemany(
+                "INSERT INTO job_events (job_id, state, message, at) VALUES (?, ?, ?, ?)",
+                [(job_id, state, message, now) for job_id in job_ids]
+            )
+
+        with self._changed:
+            self._changed.notify_all()
+
+    def get_job(self, job_id):
+        """
+        Retorna um job com o histórico de transições.
+
+        Retorna:
+            dict: Dados do job e lista de eventos ('events'), ou None se o job não existir.
+        """
+        connection = self._connection()
+        row = connection.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        job = dict(row)
+        job['events'] = [
+            dict(event) for event in connection.execute(
+                "SELECT state, message, at FROM job_events WHERE job_id = ? ORDER BY at, id", (job_id,)
+            )
+        ]
+        return job
+
+    def wait_for_events(self, job_id, seen_events=0, timeout=30):
+        """
+        Aguarda até que o job tenha mais eventos do que os já vistos, que esteja em um estado final ou que o tempo
+        limite se esgote (long polling).
+
+        Parâmetros:
+            job_id (str): ID do job.
+            seen_events (int): Quantidade de eventos do histórico já conhecida pelo cliente.
+            timeout (float): Tempo máximo de espera, em segundos.
+
+        Retorna:
+            dict: Job no formato de get_job, ou None se o job não existir.
+        """
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                job = self.get_job(job_id)
+                if job is None or len(job['events']) > seen_events or job['state'] in TERMINAL_STATES:
+                    return job
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return job
+                self._changed.wait(timeout=remaining)
+
+    def list_jobs(self, states=None, requester=None, created_from=None, created_to=None, after=None, limit=100):
+        """
+        Lista os jobs mais recentes, opcionalmente filtrados, com paginação por cursor (keyset): cada página continua
+        a partir do último job da anterior, sem OFFSET, de modo que o custo de uma página não depende da sua posição.
+
+        Parâmetros:
+            states (list, opcional): Estados a serem incluídos.
+            requester (str, opcional): E-mail do solicitante.
+            created_from (float, opcional): Timestamp mínimo de criação (inclusive).
+            created_to (float, opcional): Timestamp máximo de criação (exclusive).
+            after (tuple, opcional): Data de criação e ID do último job da página anterior (ver decode_cursor).
+            limit (int): Quantidade máxima de jobs retornados.
+
+        Retorna:
+            list: Jobs ordenados do mais recente para o mais antigo.
+        """
+        conditions = []
+        parameters = []
+        if states:
+            conditions.append(f"state IN ({', '.join('?' for _ in states)})")
+            parameters += list(states)
+        if requester:
+            conditions.append("requester = ?")
+            parameters.append(requester.lower())
+        if created_from is not None:
+            conditions.append("created_at >= ?")
+            parameters.append(created_from)
+        if created_to is not None:
+            conditions.append("created_at < ?")
+            parameters.append(created_to)
+        if after is not None:
+            conditions.append("(created_at < ? OR (created_at = ? AND id < ?))")
+            parameters += [after[0], after[0], after[1]]
+
+        query = "SELECT * FROM jobs"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        parameters.append(limit)
+
+        return [dict(row) for row in self._connection().execute(query, parameters)]
+
+    def last_event_id(self):
+        """
+        Retorna o ID do evento mais recente. Toda criação ou transição de job registra um evento, de modo que
+        o valor identifica a versão atual do armazenamento (usado como ETag das listagens).
+        """
+        row = self._connection().execute("SELECT MAX(id) AS last_id FROM job_events").fetchone()
+        return row['last_id'] or 0
+
+    def unfinished_jobs(self):
+        """
+        Lista os jobs que não chegaram a um estado final, na ordem de criação.
+
+        Retorna:
+            list: Jobs ainda não concluídos.
+        """
+        non_terminal_states = [state for state in JOB_STATES if state not in TERMINAL_STATES]
+        return [
+            dict(row) for row in self._connection().execute(
+                f"SELECT * FROM jobs WHERE state IN ({', '.join('?' for _ in non_terminal_states)}) ORDER BY created_at",
+                non_terminal_states
+            )
+        ]
+
+    def count_by_state(self):
+        """
+        Retorna a quantidade de jobs em cada estado.
+
+        Retorna:
+            dict: Quantidade de jobs por estado.
+        """
+        rows = self._connection().execute("SELECT state, COUNT(*) AS total FROM jobs GROUP BY state")
+        return {row['state']: row['total'] for row in rows}
@@ -0,0 +1,414 @@
+import heapq
+import itertools
+import os
+import queue
+import smtplib
+import threading
+import time
+import uuid
+from collections import deque
+from email.message import EmailMessage
+
+from metrics import current_job_ids, job_context, span
+
+SMTP_SECURITY_SSL = 'ssl'
+SMTP_SECURITY_STARTTLS = 'starttls'
+SMTP_SECURITY_NONE = 'none'
+SMTP_SECURITIES = (SMTP_SECURITY_SSL, SMTP_SECURITY_STARTTLS, SMTP_SECURITY_NONE)
+
+# Tipos MIME dos anexos, pela extensão do arquivo
+ATTACHMENT_TYPES = {
+    '.pdf': ('application', 'pdf'),
+    '.html': ('text', 'html'),
+    '.csv': ('text', 'csv'),
+    '.txt': ('text', 'plain'),
+    '.png': ('image', 'png'),
+    '.jpg': ('image', 'jpeg'),
+    '.jpeg': ('image', 'jpeg')
+}
+
+
+class MailQueueFullError(Exception):
+    """
+    Lançada quando a fila de envio de e-mails não pode aceitar novas mensagens.
+    """
+
+
+def build_message(subject, body, from_email, to_email, attachment_paths=None):
+    """
+    Monta a mensagem com o corpo em HTML e os anexos. Os anexos são lidos neste momento, de modo que os arquivos
+    locais podem ser removidos antes do envio.
+
+    Parâmetros:
+        subject (str): Assunto do e-mail.
+        body (str): Corpo do e-mail em HTML.
+        from_email (str): Endereço do remetente.
+        to_email (str): Endereço do destinatário.
+        attachment_paths (list, opcional): Caminhos dos arquivos a serem anexados. Arquivos inexistentes são ignorados.
+
+    Retorna:
+        EmailMessage: Mensagem pronta para o envio.
+    """
+    message = EmailMessage()
+    message['Subject'] = subject
+    message['From'] = from_email
+    message['To'] = to_email
+    message.add_alternative(body, subtype='html')
+
+    for attachment_path in attachment_paths or []:
+        try:
+            with open(attachment_path, 'rb') as f:
+                file_data = f.read()
+        except FileNotFoundError:
+            print(f"Arquivo {attachment_path} não encontrado.")
+            continue
+
+        file_name = os.path.basename(attachment_path)
+        maintype, subtype = ATTACHMENT_TYPES.get(os.path.splitext(file_name)[1].lower(), ('application', 'octet-stream'))
+        message.add_attachment(file_data, maintype=maintype, subtype=subtype, filename=file_name)
+
+    return message
+
+
+class SmtpConnectionPool:
+    """
+    Pool de conexões SMTP autenticadas e persistentes, reutilizadas entre as mensagens.
+
+    O handshake TLS e o login são feitos apenas na criação da conexão. Conexões ociosas há mais de 'idle_check_seconds'
+    são verificadas com NOOP antes do uso, e conexões com erro são descartadas.
+    """
+
+    def __init__(self, host, port, user=None, password=None, security=SMTP_SECURITY_SSL, size=2, timeout=30,
+                 idle_check_seconds=30):
+        if security not in SMTP_SECURITIES:
+            raise ValueError(f"Segurança SMTP inválida: '{security}'. Valores aceitos: {', '.join(SMTP_SECURITIES)}.")
+
+        self.host = host
+        self.port = int(port)
+        self.user = user
+        self.password = password
+        self.security = security
+        self.size = size
+        self.timeout = timeout
+        self.idle_check_seconds = idle_check_seconds
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+
+    def _connect(self):
+        """Abre uma nova conexão e faz o login, se houver credenciais."""
+        if self.security == SMTP_SECURITY_SSL:
+            connection = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.security == SMTP_SECURITY_STARTTLS:
+                connection.starttls()
+
+        if self.user and self.password:
+            connection.login(self.user, self.password)
+        self.connections_opened += 1
+        return connection
+
+    def acquire(self):
+        """
+        Obtém uma conexão do pool, bloqueando enquanto todas estiverem em uso.
+
+        Retorna:
+            smtplib.SMTP: Conexão autenticada.
+        """
+        with self._lock:
+            can_create = self._idle.empty() and self._created < self.size
+            if can_create:
+                self._created += 1
+
+        if can_create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        connection, released_at = self._idle.get()
+        if time.monotonic() - released_at > self.idle_check_seconds:
+            try:
+                status, _ = connection.noop()
+                if status != 250:
+                    raise smtplib.SMTPServerDisconnected(f"NOOP retornou {status}")
+            except Exception:
+                self.discard(connection)
+                return self.acquire()
+        return connection
+
+    def release(self, connection):
+        """Devolve uma conexão saudável ao pool."""
+        self._idle.put((connection, time.monotonic()))
+
+    def discard(self, connection):
+        """Fecha uma conexão com erro e libera a sua vaga no pool."""
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
+
+    def close(self):
+        """Encerra as conexões ociosas."""
+        while True:
+            try:
+                connection, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                connection.quit()
+            except Exception:
+                pass
+            with self._lock:
+                self._created -= 1
+
+
+class MailQueue:
+    """
+    Fila limitada de envio de e-mails, processada em segundo plano por workers que compartilham o pool de conexões SMTP.
+
+    Falhas temporárias (conexão perdida, respostas 4xx) são repetidas com espera exponencial; falhas permanentes
+    (respostas 5xx, destinatário recusado) encerram as tentativas. A latência de entrega e as falhas de cada mensagem
+    são registradas.
+    """
+
+    def __init__(self, pool, max_size=1000, workers=2, max_attempts=5, base_delay=1.0, max_delay=60.0):
+        self.pool = pool
+        self.max_size = max_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._pending = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._workers = [
+            threading.Thread(target=self._worker_loop, name=f"mail-worker-{index + 1}", daemon=True)
+            for index in range(workers)
+        ]
+
+        self._latencies = deque(maxlen=500)
+        self._failures = deque(maxlen=100)
+        self._sent = 0
+        self._failed = 0
+        self._retries = 0
+
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, message, on_result=None):
+        """
+        Adiciona uma mensagem à fila de envio.
+
+        Parâmetros:
+            message (EmailMessage): Mensagem a ser enviada.
+            on_result (callable, opcional): Chamada ao final com (sucesso, mensagem de erro ou None).
+
+        Retorna:
+            str: ID da mensagem.
+
+        Exceções:
+            MailQueueFullError: Lançada se a fila estiver cheia.
+        """
+        message_id = str(uuid.uuid4())
+        item = {
+            'id': message_id,
+            'message': message,
+            'on_result': on_result,
+            'attempts': 0,
+            'submitted_at': time.monotonic(),
+            'job_ids': current_job_ids()
+        }
+
+        with self._condition:
+            if self._stopped:
+                raise MailQueueFullError("A fila de e-mails está encerrada.")
+            if len(self._pending) >= self.max_size:
+                raise MailQueueFullError(f"A fila de e-mails está cheia ({self.max_size} mensagens).")
+            heapq.heappush(self._pending, (time.monotonic(), next(self._sequence), item))
+            self._condition.notify()
+        return message_id
+
+    def stop(self):
+        """Sinaliza aos workers que devem encerrar e fecha as conexões ociosas."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self.pool.close()
+
+    def _next_item(self):
+        """Aguarda até existir uma mensagem pronta para envio. Deve ser chamado com a condição adquirida."""
+        while not self._stopped:
+            if not self._pending:
+                self._condition.wait()
+                continue
+
+            ready_at = self._pending[0][0]
+            now = time.monotonic()
+            if ready_at > now:
+                self._condition.wait(timeout=ready_at - now)
+                continue
+            return heapq.heappop(self._pending)[2]
+        return None
+
+    @staticmethod
+    def _is_permanent(error):
+        """Respostas 5xx e destinatários recusados não são repetidas."""
+        if isinstance(error, smtplib.SMTPRecipientsRefused):
+            return True
+        code = getattr(error, 'smtp_code', None)
+        return code is not None and 500 <= code < 600
+
+    def _deliver(self, item):
+        """Envia uma mensagem usando uma conexão do pool."""
+        connection = self.pool.acquire()
+        try:
+            connection.send_message(item['message'])
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            # O servidor respondeu com erro, mas a conexão continua utilizável após o RSET
+            try:
+                connection.rset()
+            except Exception:
+                self.pool.discard(connection)
+                raise
+            self.pool.release(connection)
+            raise
+        except Exception:
+            self.pool.discard(connection)
+            raise
+        self.pool.release(connection)
+
+    def _worker_loop(self):
+        """Laço de execução de cada worker."""
+        while True:
+            with self._condition:
+                item = self._next_item()
+                if item is None:
+                    return
+
+            item['attempts'] += 1
+            try:
+                with job_context(item['job_ids']), span('smtp_send', attempt=item['attempts']):
+                    self._deliver(item)
+            except Exception as e:
+                error_message = f"Erro ao enviar o e-mail para {item['message']['To']} (tentativa {item['attempts']}): {e}"
+                print(error_message)
+
+                if not self._is_permanent(e) and item['attempts'] < self.max_attempts:
+                    delay = min(self.max_delay, self.base_delay * 2 ** (item['attempts'] - 1))
+                    with self._condition:
+                        self._retries += 1
+                        heapq.heappush(self._pending, (time.monotonic() + delay, next(self._sequence), item))
+                        self._condition.notify()
+                    continue
+
+                with self._condition:
+                    self._failed += 1
+                    self._failures.append({
+                        'id': item['id'],
+                        'to': item['message']['To'],
+                        'attempts': item['attempts'],
+                        'error': str(e),
+                        'at': time.time()
+                    })
+                self._notify(item, False, error_message)
+                continue
+
+            latency = time.monotonic() - item['submitted_at']
+            with self._condition:
+                self._sent += 1
+                self._latencies.append(latency)
+            print(f"E-mail enviado para {item['message']['To']} em {latency:.2f}s ({item['attempts']} tentativa(s)).")
+            self._notify(item, True, None)
+
+    @staticmethod
+    def _notify(item, success, error):
+        if item['on_result'] is None:
+            return
+        try:
+            item['on_result'](success, error)
+        except Exception as e:
+            print(f"Erro ao registrar o resultado do envio do e-mail {item['id']}: {e}")
+
+    def stats(self):
+        """
+        Retorna as métricas de envio: profundidade da fila, mensagens enviadas, falhas, novas tentativas,
+        latência de entrega e as falhas mais recentes.
+
+        Retorna:
+            dict: Métricas da fila de e-mails.
+        """
+        with self._condition:
+            latencies = sorted(self._latencies)
+            return {
+                'depth': len(self._pending),
+                'max_size': self.max_size,
+                'sent': self._sent,
+                'failed': self._failed,
+                'retries': self._retries,
+                'connections_opened': self.pool.connections_opened,
+                'latency_seconds': {
+                    'avg': round(sum(latencies) / len(latencies), 3) if latencies else None,
+                    'p95': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3) if latencies else None,
+                    'max': round(latencies[-1], 3) if latencies else None
+                },
+                'recent_failures': list(self._failures)
+            }
+
+
+_mail_queue = None
+_mail_queue_lock = threading.Lock()
+
+
+def get_mail_queue():
+    """
+    Retorna a fila de e-mails do processo, criando-a na primeira chamada.
+
+    Variáveis de ambiente:
+        CONTROLLER_SENDER_SERVER: Servidor SMTP.
+        CONTROLLER_SENDER_PORT: Porta do servidor SMTP.
+        CONTROLLER_SENDER_EMAIL: Endereço do remetente (usuário SMTP).
+        CONTROLLER_SENDER_PASSWORD: Senha do remetente. Sem senha, o login não é feito.
+        CONTROLLER_SENDER_SECURITY: 'ssl' (padrão), 'starttls' ou 'none'.
+        CONTROLLER_SMTP_POOL_SIZE: Quantidade máxima de conexões SMTP simultâneas (padrão 2).
+        CONTROLLER_MAIL_QUEUE_SIZE: Tamanho máximo da fila de e-mails (padrão 1000).
+        CONTROLLER_MAIL_MAX_ATTEMPTS: Quantidade máxima de tentativas por mensagem (padrão 5).
+    """
+    global _mail_queue
+    with _mail_queue_lock:
+        if _mail_queue is None:
+            pool_size = int(os.getenv('CONTROLLER_SMTP_POOL_SIZE') or 2)
+            pool = SmtpConnectionPool(
+                host=os.getenv('CONTROLLER_SENDER_SERVER'),
+                port=os.getenv('CONTROLLER_SENDER_PORT') or 465,
+                user=os.getenv('CONTROLLER_SENDER_EMAIL'),
+                password=os.getenv('CONTROLLER_SENDER_PASSWORD'),
+                security=(os.getenv('CONTROLLER_SENDER_SECURITY') or SMTP_SECURITY_SSL).strip().lower(),
+                size=pool_size
+            )
+            _mail_queue = MailQueue(
+                pool,
+                max_size=int(os.getenv('CONTROLLER_MAIL_QUEUE_SIZE') or 1000),
+                workers=pool_size,
+                max_attempts=int(os.getenv('CONTROLLER_MAIL_MAX_ATTEMPTS') or 5)
+            )
+        return _mail_queue
+
+
+def get_mail_queue_if_started():
+    """Retorna a fila de e-mails do processo, ou None se ela ainda não tiver sido criada."""
+    return _mail_queue
+
+
+def stop_mail_queue():
+    """Encerra a fila de e-mails, se tiver sido iniciada."""
+    with _mail_queue_lock:
+        if _mail_queue is not None:
+            _mail_queue.stop()
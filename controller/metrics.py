@@ -0,0 +1,312 @@
+import bisect
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Métricas e spans podem ser desativados; nesse caso span() devolve um objeto vazio compartilhado e as funções
+# de registro retornam imediatamente
+METRICS_ENABLED = (os.getenv('CONTROLLER_METRICS_ENABLED') or 'true').strip().lower() not in ('0', 'false', 'no')
+TRACE_LOG_ENABLED = (os.getenv('CONTROLLER_TRACE_LOG') or 'false').strip().lower() in ('1', 'true', 'yes')
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Limites dos buckets dos histogramas
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BYTES_BUCKETS = tuple(1024 * 4 ** exponent for exponent in range(11))
+ROWS_BUCKETS = (10, 100, 1000, 10000, 100000, 1000000, 10000000)
+
+# Spans mais recentes, consultados por job
+RECENT_SPANS_SIZE = 2000
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Histograma no formato do Prometheus, com uma série por combinação de rótulos.
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'buckets': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            series['buckets'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series_items = sorted((key, dict(series, buckets=list(series['buckets']))) for key, series in self._series.items())
+
+        for key, series in series_items:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series['buckets']):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(float(bound)))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {series['count']}")
+        return lines
+
+
+class Counter:
+    """
+    Contador no formato do Prometheus, com uma série por combinação de rótulos.
+    """
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(list(zip(self.labelnames, key)))} {_format_value(value)}")
+        return lines
+
+
+class CallbackGauge:
+    """
+    Medidor calculado no momento da coleta. A função retorna um número ou um dicionário {valor do rótulo: número}.
+    """
+
+    def __init__(self, name, documentation, callback, labelname=None):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelname = labelname
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.callback()
+        except Exception as e:
+            print(f"Erro ao coletar a métrica {self.name}: {e}")
+            return lines
+
+        if isinstance(values, dict):
+            for label, value in sorted(values.items()):
+                lines.append(f"{self.name}{_format_labels([(self.labelname, label)])} {_format_value(value)}")
+        elif values is not None:
+            lines.append(f"{self.name} {_format_value(values)}")
+        return lines
+
+
+class Registry:
+    """Conjunto das métricas expostas em /metrics."""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines += metric.render()
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'report_stage_duration_seconds', 'Duração de cada etapa do fluxo de relatórios, em segundos.', ['stage', 'status']
+))
+QUEUE_WAIT_SECONDS = REGISTRY.register(Histogram(
+    'report_queue_wait_seconds', 'Tempo de espera das requisições na fila de relatórios, em segundos.'
+))
+STAGE_BYTES = REGISTRY.register(Histogram(
+    'report_stage_bytes', 'Bytes transferidos ou gerados por etapa (HDFS, resultados, gráficos e e-mails).', ['stage'],
+    buckets=BYTES_BUCKETS
+))
+STAGE_ROWS = REGISTRY.register(Histogram(
+    'report_stage_rows', 'Linhas processadas por etapa.', ['stage'], buckets=ROWS_BUCKETS
+))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    'report_cache_requests_total', 'Consultas ao cache de resultados, por resultado (hit, miss, rollup ou statistics).', ['result']
+))
+JOBS_FINISHED = REGISTRY.register(Counter(
+    'report_jobs_finished_total', 'Jobs de relatório concluídos, por estado final e modo de execução.', ['state', 'mode']
+))
+
+_job_ids = contextvars.ContextVar('report_job_ids', default=())
+_recent_spans = deque(maxlen=RECENT_SPANS_SIZE)
+
+
+def register_gauge(name, documentation, callback, labelname=None):
+    """Registra um medidor calculado no momento da coleta (ex: profundidade da fila)."""
+    if METRICS_ENABLED:
+        REGISTRY.register(CallbackGauge(name, documentation, callback, labelname))
+
+
+@contextmanager
+def job_context(job_ids):
+    """
+    Associa os spans registrados dentro do bloco (na mesma thread) aos jobs informados.
+
+    Parâmetros:
+        job_ids (str|list): ID do job ou IDs dos jobs de um lote.
+    """
+    token = _job_ids.set((job_ids,) if isinstance(job_ids, str) else tuple(job_ids))
+    try:
+        yield
+    finally:
+        _job_ids.reset(token)
+
+
+class _Span:
+    """Mede uma etapa e registra a duração, os bytes e as linhas informados em set()."""
+
+    __slots__ = ('stage', 'attributes', 'job_ids', 'started_at', 'start_time')
+
+    def __init__(self, stage, attributes, job_ids):
+        self.stage = stage
+        self.attributes = attributes
+        self.job_ids = job_ids
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        return self
+
+    def __enter__(self):
+        self.started_at = time.time()
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = time.perf_counter() - self.start_time
+        status = 'ok' if exc_type is None else 'error'
+        STAGE_SECONDS.observe(duration, stage=self.stage, status=status)
+        if self.attributes.get('bytes') is not None:
+            STAGE_BYTES.observe(self.attributes['bytes'], stage=self.stage)
+        if self.attributes.get('rows') is not None:
+            STAGE_ROWS.observe(self.attributes['rows'], stage=self.stage)
+
+        record = {
+            'stage': self.stage,
+            'job_ids': list(self.job_ids),
+            'started_at': self.started_at,
+            'duration_seconds': round(duration, 6),
+            'status': status,
+            **self.attributes
+        }
+        if exc_type is not None:
+            record['error'] = str(exc_value)
+        _recent_spans.append(record)
+        if TRACE_LOG_ENABLED:
+            print(json.dumps({'span': record}, default=str, ensure_ascii=False))
+        return False
+
+
+class _NoopSpan:
+    """Span usado com as métricas desativadas."""
+
+    __slots__ = ()
+
+    def set(self, **attributes):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(stage, **attributes):
+    """
+    Cria um span para uma etapa do fluxo de relatórios, associado aos jobs do job_context atual.
+    Os atributos 'bytes' e 'rows', informados na criação ou em set(), alimentam os histogramas correspondentes.
+
+    Uso:
+        with span('hdfs_upload') as current_span:
+            ...
+            current_span.set(bytes=total_bytes)
+    """
+    if not METRICS_ENABLED:
+        return _NOOP_SPAN
+    return _Span(stage, attributes, _job_ids.get())
+
+
+def current_job_ids():
+    """IDs dos jobs do job_context atual, para propagar a correlação a outras threads."""
+    return _job_ids.get()
+
+
+def observe_queue_wait(seconds):
+    if METRICS_ENABLED:
+        QUEUE_WAIT_SECONDS.observe(seconds)
+
+
+def count_cache_request(result):
+    if METRICS_ENABLED:
+        CACHE_REQUESTS.inc(result=result)
+
+
+def count_job_finished(state, mode):
+    if METRICS_ENABLED:
+        JOBS_FINISHED.inc(state=state, mode=mode or 'unknown')
+
+
+def recent_spans(job_id=None):
+    """
+    Retorna os spans mais recentes, opcionalmente apenas os de um job, em ordem cronológica.
+    """
+    spans = list(_recent_spans)
+    if job_id is None:
+        return spans
+    return [record for record in spans if job_id in record['job_ids']]
+
+
+def render_metrics():
+    """Retorna todas as métricas no formato de texto do Prometheus."""
+    return REGISTRY.render()
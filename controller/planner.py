@@ -0,0 +1,141 @@
+import json
+import os
+
+# Motores de cálculo: backend pandas no controller, Spark em modo local ('local[N]') via spark-submit no controller
+# e o cluster, no modo Spark configurado ('submit' ou 'session')
+ENGINE_LOCAL = 'local'
+ENGINE_SPARK_LOCAL = 'spark_local'
+ENGINE_SUBMIT = 'submit'
+ENGINE_SESSION = 'session'
+CLUSTER_ENGINES = (ENGINE_SUBMIT, ENGINE_SESSION)
+
+# Custo estimado de cada motor: tempo fixo (inicialização, agendamento e coleta) e tempo por linha do layout longo
+# (um pregão de um ativo). Valores padrão usados enquanto não há calibração (ver benchmark_planner.py)
+DEFAULT_COSTS = {
+    ENGINE_LOCAL: {'fixed_seconds': 0.05, 'seconds_per_row': 1e-5},
+    ENGINE_SPARK_LOCAL: {'fixed_seconds': 12.0, 'seconds_per_row': 5e-7},
+    ENGINE_SUBMIT: {'fixed_seconds': 25.0, 'seconds_per_row': 5e-8},
+    ENGINE_SESSION: {'fixed_seconds': 2.0, 'seconds_per_row': 5e-8},
+}
+
+# Pregões por ano, usados para estimar os pregões de um intervalo sem as estatísticas do dataset
+TRADING_DAYS_PER_YEAR = 252
+
+
+def load_costs(calibration_path=None):
+    """
+    Carrega os custos dos motores calibrados pelo benchmark do planejador, completando com os valores padrão
+    os motores e coeficientes ausentes.
+
+    Parâmetros:
+        calibration_path (str, opcional): Arquivo JSON gravado pelo benchmark_planner.py.
+
+    Retorna:
+        dict: Para cada motor, 'fixed_seconds' e 'seconds_per_row'.
+    """
+    costs = {engine: dict(values) for engine, values in DEFAULT_COSTS.items()}
+    if not calibration_path or not os.path.exists(calibration_path):
+        return costs
+
+    try:
+        with open(calibration_path, 'r', encoding='utf-8') as f:
+            calibrated = json.load(f).get('costs', {})
+    except Exception as e:
+        print(f"Calibração do planejador inválida em {calibration_path}; serão usados os custos padrão: {e}")
+        return costs
+
+    for engine, values in calibrated.items():
+        costs.setdefault(engine, {}).update({
+            name: float(value) for name, value in values.items() if name in ('fixed_seconds', 'seconds_per_row')
+        })
+    return costs
+
+
+def estimate_trading_days(calendar_days):
+    """Estima os pregões de um intervalo de datas sem as estatísticas do dataset."""
+    return int(round((calendar_days + 1) * TRADING_DAYS_PER_YEAR / 365))
+
+
+def plan_execution(trading_days, asset_count, candidates, costs, local_max_rows=None):
+    """
+    Escolhe o motor de menor custo estimado para calcular um intervalo. As linhas processadas são estimadas
+    a partir dos pregões do intervalo (obtidos dos metadados do dataset) e da quantidade de ativos, e o custo de cada
+    motor é o seu tempo fixo somado ao tempo por linha. O motor local é descartado acima de 'local_max_rows' linhas,
+    para limitar a memória do controller.
+
+    Parâmetros:
+        trading_days (int): Pregões do intervalo.
+        asset_count (int): Quantidade de ativos.
+        candidates (list): Motores disponíveis, em ordem de preferência em caso de empate.
+        costs (dict): Custos dos motores (ver load_costs).
+        local_max_rows (int, opcional): Máximo de linhas calculadas no controller.
+
+    Retorna:
+        dict: Plano com o motor escolhido ('engine'), as linhas estimadas ('rows'), os pregões ('trading_days'),
+        o custo estimado de cada candidato, em segundos ('estimates'), e a descrição do plano ('description').
+
+    Exceções:
+        ValueError: Lançada se nenhum motor for candidato.
+    """
+    rows = int(trading_days) * int(asset_count)
+    if local_max_rows is not None and rows > local_max_rows:
+        candidates = [engine for engine in candidates if engine != ENGINE_LOCAL]
+    if not candidates:
+        raise ValueError(
+            f"Nenhum motor de cálculo disponível para {rows} linha(s) (o motor local aceita até {local_max_rows})."
+        )
+
+    estimates = {}
+    for engine in candidates:
+        engine_costs = costs.get(engine) or DEFAULT_COSTS.get(engine) or DEFAULT_COSTS[ENGINE_SUBMIT]
+        estimates[engine] = engine_costs['fixed_seconds'] + engine_costs['seconds_per_row'] * rows
+    engine = min(candidates, key=lambda candidate: estimates[candidate])
+
+    alternatives = ', '.join(f"{candidate} {estimates[candidate]:.3f}s" for candidate in candidates)
+    return {
+        'engine': engine,
+        'rows': rows,
+        'trading_days': int(trading_days),
+        'estimates': {candidate: round(value, 6) for candidate, value in estimates.items()},
+        'description': f"motor '{engine}' para {trading_days} pregão(ões) x {asset_count} ativo(s) = {rows} linha(s) "
+                       f"(custo estimado: {alternatives})"
+    }
+
+
+def fit_costs(measurements):
+    """
+    Ajusta, por mínimos quadrados, o tempo fixo e o tempo por linha de cada motor a partir das medições
+    do benchmark de calibração. Coeficientes negativos são limitados a zero.
+
+    Parâmetros:
+        measurements (list): Medições {'engine', 'rows', 'seconds'}.
+
+    Retorna:
+        dict: Para cada motor medido, 'fixed_seconds' e 'seconds_per_row'.
+    """
+    import numpy as np
+
+    costs = {}
+    for engine in sorted({measurement['engine'] for measurement in measurements}):
+        rows = np.array([m['rows'] for m in measurements if m['engine'] == engine], dtype="float64")
+        seconds = np.array([m['seconds'] for m in measurements if m['engine'] == engine], dtype="float64")
+        if len(np.unique(rows)) > 1:
+            seconds_per_row, fixed_seconds = np.polyfit(rows, seconds, 1)
+        else:
+            seconds_per_row, fixed_seconds = 0.0, float(seconds.mean())
+        if seconds_per_row < 0:
+            seconds_per_row, fixed_seconds = 0.0, float(seconds.mean())
+        costs[engine] = {'fixed_seconds': max(0.0, float(fixed_seconds)), 'seconds_per_row': float(seconds_per_row)}
+    return costs
+
+
+def crossover_rows(costs, first_engine, second_engine):
+    """
+    Quantidade de linhas a partir da qual o segundo motor passa a ser mais barato que o primeiro
+    (None se isso nunca ocorre).
+    """
+    first, second = costs[first_engine], costs[second_engine]
+    slope = first['seconds_per_row'] - second['seconds_per_row']
+    if slope <= 0:
+        return None
+    return max(0, int((second['fixed_seconds'] - first['fixed_seconds']) / slope))
@@ -0,0 +1,226 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from schema import valid_price_mask
+
+DATE_COLUMN = "Date"
+TICKER_COLUMN = "ticker"
+PRICE_COLUMN = "price"
+SIMPLE_RETURN_SUFFIX = "_Retorno"
+LOG_RETURN_SUFFIX = "_LogRetorno"
+RETURN_SUFFIXES = (LOG_RETURN_SUFFIX, SIMPLE_RETURN_SUFFIX)
+
+# Colunas intermediárias do layout longo (ticker, data, preço)
+_SIMPLE_RETURN = "simple_return"
+_LOG_RETURN = "log_return"
+
+# Colunas auxiliares do backend Spark: ano do pregão e fechamentos por ano, usados para particionar a janela
+_BUCKET = "bucket"
+_BUCKET_CLOSE = "bucket_close"
+_PREVIOUS_BUCKET_CLOSE = "previous_bucket_close"
+
+
+def simple_return_column(price_column):
+    """Nome da coluna de retorno simples (em %) de um ativo (ex: 'DOLAR' -> 'DOLAR_Retorno')."""
+    return f"{price_column}{SIMPLE_RETURN_SUFFIX}"
+
+
+def log_return_column(price_column):
+    """Nome da coluna de retorno logarítmico (em %) de um ativo (ex: 'DOLAR' -> 'DOLAR_LogRetorno')."""
+    return f"{price_column}{LOG_RETURN_SUFFIX}"
+
+
+def return_columns(columns):
+    """Filtra as colunas de retorno (simples e logarítmico) de uma lista de colunas."""
+    return [column for column in columns if column.endswith(RETURN_SUFFIXES)]
+
+
+def average_column(return_column):
+    """
+    Nome da coluna de média de uma coluna de retorno, sem caracteres especiais
+    (ex: 'S&P500_Retorno' -> 'Media_SP500_Retorno').
+    """
+    suffix = next(suffix for suffix in RETURN_SUFFIXES if return_column.endswith(suffix))
+    price_column = return_column[:-len(suffix)]
+    return f"Media_{re.sub(r'[^0-9A-Za-z]', '', price_column)}{suffix}"
+
+
+def output_columns(price_columns):
+    """
+    Ordem das colunas do resultado: data, preços e, para cada ativo, os retornos simples e logarítmico.
+    """
+    columns = [DATE_COLUMN] + list(price_columns)
+    for price_column in price_columns:
+        columns += [simple_return_column(price_column), log_return_column(price_column)]
+    return columns
+
+
+def first_valid_positions(df, price_columns):
+    """
+    Posição, nas linhas do DataFrame, da primeira cotação válida de cada ativo (len(df) se não houver).
+    """
+    positions = {}
+    for price_column in price_columns:
+        valid_rows = np.flatnonzero(valid_price_mask(df[price_column].to_numpy(dtype="float64")))
+        positions[price_column] = int(valid_rows[0]) if len(valid_rows) else len(df)
+    return positions
+
+
+def null_leading_returns(df, first_positions):
+    """
+    Anula os retornos de cada ativo até a sua primeira cotação válida no intervalo, inclusive, como no cálculo
+    isolado do intervalo: sem uma cotação anterior no intervalo, o retorno não é calculado. Usada nos trechos de
+    resultados calculados sobre intervalos maiores (lotes de requisições e tabela de retornos).
+
+    Parâmetros:
+        df (pd.DataFrame): Retornos diários em ordem cronológica, com índice 0..n-1 (alterado no lugar).
+        first_positions (dict): Posição, nas linhas do DataFrame, da primeira cotação válida de cada ativo no
+            intervalo (ver first_valid_positions). Posições negativas indicam cotações anteriores ao trecho,
+            cujos retornos são mantidos.
+
+    Retorna:
+        pd.DataFrame: O próprio DataFrame.
+    """
+    for price_column, position in first_positions.items():
+        columns = [column for column in (simple_return_column(price_column), log_return_column(price_column)) if column in df.columns]
+        if position >= 0 and columns and len(df):
+            df.loc[:position, columns] = np.nan
+    return df
+
+
+def to_long(df, price_columns):
+    """
+    Converte o layout largo do dataset (uma coluna de preço por ativo) para o layout longo (ticker, Date, price).
+    """
+    return df.melt(
+        id_vars=[DATE_COLUMN], value_vars=list(price_columns), var_name=TICKER_COLUMN, value_name=PRICE_COLUMN
+    )
+
+
+def calculate_returns(df, price_columns):
+    """
+    Calcula os retornos diários simples e logarítmicos, em %, de todos os ativos em uma única passada vetorizada
+    sobre o layout longo. O primeiro pregão de cada ativo não tem retorno.
+
+    Cotações ausentes ou inválidas (ver schema.valid_price_mask) são excluídas: o preço e o retorno do pregão
+    ficam nulos e o retorno do pregão seguinte é calculado em relação à última cotação válida do ativo, de modo que
+    os retornos logarítmicos somam a variação total do período. Os resultados são idênticos aos do backend Spark
+    (calculate_returns_spark).
+
+    Parâmetros:
+        df (pd.DataFrame): Preços no layout largo (coluna 'Date' e uma coluna por ativo), já filtrados pelo período.
+        price_columns (list): Colunas de preço dos ativos.
+
+    Retorna:
+        pd.DataFrame: Preços e retornos no layout largo, ordenados por data.
+    """
+    long_df = to_long(df, price_columns).sort_values([TICKER_COLUMN, DATE_COLUMN], kind="stable")
+    prices = long_df[PRICE_COLUMN].astype("float64")
+    prices = prices.where(valid_price_mask(prices))
+    tickers = long_df[TICKER_COLUMN]
+    # Última cotação válida anterior a cada pregão, do mesmo ativo
+    previous_prices = prices.groupby(tickers, sort=False).ffill().groupby(tickers, sort=False).shift(1)
+
+    ratio = prices / previous_prices
+    long_df[PRICE_COLUMN] = prices
+    long_df[_SIMPLE_RETURN] = (ratio - 1) * 100
+    long_df[_LOG_RETURN] = np.log(ratio) * 100
+
+    wide_df = long_df.pivot(index=DATE_COLUMN, columns=TICKER_COLUMN, values=[PRICE_COLUMN, _SIMPLE_RETURN, _LOG_RETURN])
+    result = pd.DataFrame({DATE_COLUMN: wide_df.index})
+    for price_column in price_columns:
+        result[price_column] = wide_df[(PRICE_COLUMN, price_column)].to_numpy()
+        result[simple_return_column(price_column)] = wide_df[(_SIMPLE_RETURN, price_column)].to_numpy()
+        result[log_return_column(price_column)] = wide_df[(_LOG_RETURN, price_column)].to_numpy()
+
+    return result[output_columns(price_columns)].sort_values(DATE_COLUMN).reset_index(drop=True)
+
+
+def calculate_average_returns(daily_returns_df):
+    """
+    Calcula a média de cada coluna de retorno, ignorando os valores nulos.
+
+    Retorna:
+        pd.DataFrame: Uma linha com as colunas 'Media_<ativo>_Retorno' e 'Media_<ativo>_LogRetorno'.
+    """
+    return pd.DataFrame([{
+        average_column(column): daily_returns_df[column].astype("float64").mean()
+        for column in return_columns(daily_returns_df.columns)
+    }])
+
+
+def calculate_returns_spark(df, price_columns):
+    """
+    Backend Spark de calculate_returns: converte o DataFrame para o layout longo, calcula os retornos e retorna
+    ao layout largo.
+
+    A janela é particionada por ativo e por ano (em vez de uma janela global ordenada por data, que levaria todo
+    o período para uma única partição de um único executor). O primeiro pregão de cada ano usa como preço anterior
+    o último fechamento do ano anterior do mesmo ativo, obtido de uma pequena tabela de fechamentos por ano,
+    de modo que o resultado é idêntico ao da janela global. Assim como no backend pandas, cotações ausentes ou
+    inválidas são excluídas e o preço anterior é a última cotação válida do ativo.
+
+    Parâmetros:
+        df (pyspark.sql.DataFrame): Preços no layout largo, já filtrados pelo período.
+        price_columns (list): Colunas de preço dos ativos.
+
+    Retorna:
+        pyspark.sql.DataFrame: Preços e retornos no layout largo, ordenados por data.
+    """
+    from pyspark.sql import functions as F
+    from pyspark.sql.window import Window
+
+    # Mesma regra de schema.valid_price_mask: presentes, finitos e positivos (o -inf já é excluído por price > 0)
+    price = F.col(PRICE_COLUMN)
+    long_df = df.unpivot(DATE_COLUMN, list(price_columns), TICKER_COLUMN, PRICE_COLUMN) \
+        .withColumn(PRICE_COLUMN, F.when(~F.isnan(price) & (price > 0) & (price != float('inf')), price)) \
+        .withColumn(_BUCKET, F.year(DATE_COLUMN))
+
+    # Último fechamento válido de cada ativo em cada ano e o do ano anterior com cotações (uma linha por ativo e ano)
+    bucket_window = Window.partitionBy(TICKER_COLUMN).orderBy(_BUCKET)
+    previous_bucket_closes = long_df \
+        .where(price.isNotNull()) \
+        .groupBy(TICKER_COLUMN, _BUCKET) \
+        .agg(F.max_by(PRICE_COLUMN, DATE_COLUMN).alias(_BUCKET_CLOSE)) \
+        .withColumn(_PREVIOUS_BUCKET_CLOSE, F.lag(_BUCKET_CLOSE).over(bucket_window)) \
+        .drop(_BUCKET_CLOSE)
+
+    # Dentro de cada ativo e ano, o preço anterior é a última cotação válida da própria janela; antes da primeira
+    # cotação válida do ano, o fechamento do ano anterior
+    window_spec = Window.partitionBy(TICKER_COLUMN, _BUCKET).orderBy(DATE_COLUMN) \
+        .rowsBetween(Window.unboundedPreceding, -1)
+    previous_price = F.coalesce(F.last(PRICE_COLUMN, ignorenulls=True).over(window_spec), F.col(_PREVIOUS_BUCKET_CLOSE))
+    ratio = price / previous_price
+
+    long_df = long_df \
+        .join(F.broadcast(previous_bucket_closes), [TICKER_COLUMN, _BUCKET], "left") \
+        .withColumn(_SIMPLE_RETURN, (ratio - 1) * 100) \
+        .withColumn(_LOG_RETURN, F.log(ratio) * 100)
+
+    wide_df = long_df.groupBy(DATE_COLUMN).pivot(TICKER_COLUMN, list(price_columns)).agg(
+        F.first(PRICE_COLUMN).alias(PRICE_COLUMN),
+        F.first(_SIMPLE_RETURN).alias(_SIMPLE_RETURN),
+        F.first(_LOG_RETURN).alias(_LOG_RETURN)
+    )
+
+    selected_columns = [F.col(DATE_COLUMN)]
+    for price_column in price_columns:
+        selected_columns += [
+            F.col(f"`{price_column}_{PRICE_COLUMN}`").alias(price_column),
+            F.col(f"`{price_column}_{_SIMPLE_RETURN}`").alias(simple_return_column(price_column)),
+            F.col(f"`{price_column}_{_LOG_RETURN}`").alias(log_return_column(price_column))
+        ]
+    return wide_df.select(*selected_columns).orderBy(DATE_COLUMN)
+
+
+def calculate_average_returns_spark(daily_returns):
+    """
+    Backend Spark de calculate_average_returns.
+    """
+    from pyspark.sql import functions as F
+
+    return daily_returns.agg(*[
+        F.avg(F.col(f"`{column}`")).alias(average_column(column)) for column in return_columns(daily_returns.columns)
+    ])
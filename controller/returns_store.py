@@ -0,0 +1,465 @@
+import json
+import os
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from analytics import DEFAULT_ROLLING_WINDOW, empty_partial, merge_all, partial_from_frame
+from dataset import DATE_COLUMN, read_partitioned_dataset, to_date
+from returns import (
+    average_column, calculate_returns, log_return_column, null_leading_returns, return_columns, simple_return_column
+)
+from rolling import DEFAULT_WINDOWS, calculate_rolling_statistics, halo_rows
+from rollups import RESOLUTION_DAILY, RESOLUTION_MONTHLY, ROLLUP_RESOLUTIONS, aggregate_rollup, period_keys
+from schema import valid_price_mask
+
+RETURNS_FILE_NAME = "returns.parquet"
+DATASET_VERSION_METADATA_KEY = b"dataset_version"
+PRICE_COLUMNS_METADATA_KEY = b"price_columns"
+FORMAT_VERSION_METADATA_KEY = b"format_version"
+
+# Versão do cálculo gravado na tabela; tabelas de versões anteriores (ex: com cotações ausentes preenchidas com 0)
+# são descartadas e reconstruídas
+FORMAT_VERSION = 2
+
+# Sufixos das colunas de somas acumuladas gravadas junto com cada coluna de retorno
+SUM_SUFFIX = "__sum"
+SUM_OF_SQUARES_SUFFIX = "__sumsq"
+COUNT_SUFFIX = "__count"
+
+
+def partitions_start_date(partitions):
+    """
+    Retorna o primeiro dia da partição mais antiga de uma lista de partições ('year=yyyy/month=m').
+
+    Retorna:
+        date: Primeiro dia da partição mais antiga, ou None se a lista estiver vazia.
+    """
+    months = []
+    for partition in partitions:
+        values = dict(part.split("=") for part in partition.strip("/").split("/"))
+        months.append((int(values["year"]), int(values["month"])))
+    if not months:
+        return None
+    year, month = min(months)
+    return to_date(f"{year:04d}-{month:02d}-01")
+
+
+class ReturnsStore:
+    """
+    Tabela materializada dos retornos diários de todos os ativos, com as somas acumuladas (soma, soma dos quadrados
+    e quantidade de retornos válidos) de cada coluna de retorno.
+
+    Com as somas acumuladas, a média, a variância e a quantidade de retornos de qualquer intervalo de datas são obtidas
+    com duas buscas binárias na lista de datas (O(log n)) e uma subtração, sem recalcular os retornos.
+    A tabela é atualizada de forma incremental a partir das partições regravadas pela ingestão.
+
+    A cada atualização, os preços e retornos são também agregados por semana, mês e ano (rollups), permitindo que
+    relatórios de períodos longos sejam montados com uma quantidade de pontos limitada, sem carregar os dados diários.
+    Os acumuladores das análises (volatilidade, drawdown, correlações) de cada mês são guardados junto com os rollups
+    e combinados para responder a qualquer intervalo.
+    """
+
+    def __init__(self, store_dir, analytics_window=DEFAULT_ROLLING_WINDOW):
+        self.store_dir = store_dir
+        self.analytics_window = analytics_window
+        self.dataset_version = None
+        self._dates = np.array([], dtype="datetime64[D]")
+        self._prices = {}
+        self._values = {}
+        self._prefix_sums = {}
+        self._prefix_squares = {}
+        self._prefix_counts = {}
+        self._valid_price_counts = {}
+        self._rollups = {}
+        self._period_indexes = {}
+        self._monthly_partials = []
+        self._lock = threading.Lock()
+        self._load()
+        self._build_rollups()
+
+    @property
+    def _path(self):
+        return os.path.join(self.store_dir, RETURNS_FILE_NAME)
+
+    @property
+    def columns(self):
+        return list(self._values)
+
+    @property
+    def price_columns(self):
+        return list(self._prices)
+
+    def _load(self):
+        """Carrega a tabela gravada em disco, se existir."""
+        if not os.path.exists(self._path):
+            return
+
+        try:
+            table = pq.read_table(self._path)
+        except Exception as e:
+            print(f"Tabela de retornos inválida em {self._path}, será reconstruída: {e}")
+            return
+
+        metadata = table.schema.metadata or {}
+        if int(metadata.get(FORMAT_VERSION_METADATA_KEY, b"1")) != FORMAT_VERSION:
+            print(f"Tabela de retornos em {self._path} gravada em outro formato, será reconstruída.")
+            return
+
+        df = table.to_pandas()
+        self._dates = pd.to_datetime(df[DATE_COLUMN]).to_numpy(dtype="datetime64[D]")
+        for column in json.loads(metadata.get(PRICE_COLUMNS_METADATA_KEY, b"[]")):
+            self._prices[column] = df[column].to_numpy(dtype="float64")
+        for column in return_columns(df.columns):
+            self._values[column] = df[column].to_numpy(dtype="float64")
+            self._prefix_sums[column] = np.concatenate([[0.0], df[f"{column}{SUM_SUFFIX}"].to_numpy(dtype="float64")])
+            self._prefix_squares[column] = np.concatenate([[0.0], df[f"{column}{SUM_OF_SQUARES_SUFFIX}"].to_numpy(dtype="float64")])
+            self._prefix_counts[column] = np.concatenate([[0], df[f"{column}{COUNT_SUFFIX}"].to_numpy(dtype="int64")])
+
+        if DATASET_VERSION_METADATA_KEY in metadata:
+            self.dataset_version = int(metadata[DATASET_VERSION_METADATA_KEY])
+
+    def _save(self):
+        """Grava a tabela em disco de forma atômica. Deve ser chamado com o lock adquirido."""
+        df = pd.DataFrame({DATE_COLUMN: pd.to_datetime(self._dates).date})
+        for column, values in self._prices.items():
+            df[column] = values
+        for column, values in self._values.items():
+            df[column] = values
+            df[f"{column}{SUM_SUFFIX}"] = self._prefix_sums[column][1:]
+            df[f"{column}{SUM_OF_SQUARES_SUFFIX}"] = self._prefix_squares[column][1:]
+            df[f"{column}{COUNT_SUFFIX}"] = self._prefix_counts[column][1:]
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            DATASET_VERSION_METADATA_KEY: str(self.dataset_version),
+            PRICE_COLUMNS_METADATA_KEY: json.dumps(list(self._prices)),
+            FORMAT_VERSION_METADATA_KEY: str(FORMAT_VERSION)
+        })
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        temporary_path = os.path.join(self.store_dir, f".{uuid.uuid4()}.tmp")
+        pq.write_table(table, temporary_path)
+        os.replace(temporary_path, self._path)
+
+    def update(self, dataset_dir, price_columns, dataset_version, since_date=None):
+        """
+        Atualiza a tabela com os retornos a partir de 'since_date' (inclusive), mantendo os retornos e as somas
+        acumuladas das datas anteriores. A tabela é reconstruída por completo quando está vazia, quando 'since_date'
+        não é informado ou quando os ativos mudaram.
+
+        Parâmetros:
+            dataset_dir (str): Diretório raiz do dataset Parquet de preços.
+            price_columns (list): Colunas de preço dos ativos.
+            dataset_version (int): Versão do dataset após a atualização.
+            since_date (str|date, opcional): Primeira data cujos preços podem ter mudado.
+        """
+        expected_columns = [
+            column for price_column in price_columns
+            for column in (simple_return_column(price_column), log_return_column(price_column))
+        ]
+
+        with self._lock:
+            rebuild = (
+                since_date is None or len(self._dates) == 0 or
+                sorted(self.columns) != sorted(expected_columns) or sorted(self.price_columns) != sorted(price_columns)
+            )
+            if rebuild:
+                keep_rows = 0
+                self._prices, self._values, self._prefix_sums, self._prefix_squares, self._prefix_counts = {}, {}, {}, {}, {}
+                df = read_partitioned_dataset(dataset_dir, columns=price_columns)
+            else:
+                since = np.datetime64(to_date(since_date), "D")
+                keep_rows = int(np.searchsorted(self._dates, since, side="left"))
+                # A última cotação válida de cada ativo entre os pregões mantidos fornece o preço anterior
+                # ao primeiro pregão recalculado
+                read_from_row = keep_rows - 1
+                for counts in self._valid_price_counts.values():
+                    if keep_rows > 0 and counts[keep_rows] > 0:
+                        read_from_row = min(read_from_row, int(np.searchsorted(counts, counts[keep_rows], side="left")) - 1)
+                read_from = self._dates[read_from_row] if keep_rows > 0 else None
+                df = read_partitioned_dataset(
+                    dataset_dir, initial_date=str(read_from) if read_from is not None else None, columns=price_columns
+                )
+
+            daily_returns_df = calculate_returns(df, price_columns)
+            new_dates = pd.to_datetime(daily_returns_df[DATE_COLUMN]).to_numpy(dtype="datetime64[D]")
+            first_new_row = int(np.searchsorted(new_dates, self._dates[keep_rows - 1], side="right")) if keep_rows > 0 else 0
+
+            self._dates = np.concatenate([self._dates[:keep_rows], new_dates[first_new_row:]])
+
+            # Os preços guardados são os usados no cálculo dos retornos (cotações inválidas como nulas)
+            for column in price_columns:
+                kept_prices = self._prices.get(column, np.array([], dtype="float64"))[:keep_rows]
+                self._prices[column] = np.concatenate([
+                    kept_prices, daily_returns_df[column].to_numpy(dtype="float64")[first_new_row:]
+                ])
+
+            for column in expected_columns:
+                new_values = daily_returns_df[column].to_numpy(dtype="float64")[first_new_row:]
+                valid = ~np.isnan(new_values)
+                filled = np.where(valid, new_values, 0.0)
+
+                kept_values = self._values.get(column, np.array([], dtype="float64"))[:keep_rows]
+                kept_sums = self._prefix_sums.get(column, np.array([0.0]))[:keep_rows + 1]
+                kept_squares = self._prefix_squares.get(column, np.array([0.0]))[:keep_rows + 1]
+                kept_counts = self._prefix_counts.get(column, np.array([0], dtype="int64"))[:keep_rows + 1]
+
+                self._values[column] = np.concatenate([kept_values, new_values])
+                self._prefix_sums[column] = np.concatenate([kept_sums, kept_sums[-1] + np.cumsum(filled)])
+                self._prefix_squares[column] = np.concatenate([kept_squares, kept_squares[-1] + np.cumsum(filled * filled)])
+                self._prefix_counts[column] = np.concatenate([kept_counts, kept_counts[-1] + np.cumsum(valid)])
+
+            self.dataset_version = dataset_version
+            self._save()
+            self._build_rollups()
+
+        print(
+            f"Tabela de retornos atualizada (versão {dataset_version}): "
+            f"{len(new_dates) - first_new_row} pregão(ões) recalculado(s), {len(self._dates)} no total."
+        )
+
+    def range_statistics(self, initial_date, final_date):
+        """
+        Calcula a média, a variância amostral e a quantidade de retornos de cada coluna no intervalo informado.
+        Assim como no relatório, a primeira cotação válida de cada ativo no intervalo não tem retorno.
+
+        Parâmetros:
+            initial_date (str|date): Data inicial do intervalo.
+            final_date (str|date): Data final do intervalo.
+
+        Retorna:
+            dict: Para cada coluna de retorno, um dicionário com 'mean', 'variance' e 'count'.
+        """
+        with self._lock:
+            start, end = self._range_rows(initial_date, final_date)
+            first_rows = self._first_valid_rows(start, end)
+            price_column_of = {
+                return_column: price_column for price_column in self._prices
+                for return_column in (simple_return_column(price_column), log_return_column(price_column))
+            }
+
+            statistics = {}
+            for column in self._values:
+                column_start = min(first_rows.get(price_column_of.get(column), start) + 1, end)
+                count = int(self._prefix_counts[column][end] - self._prefix_counts[column][column_start])
+                total = float(self._prefix_sums[column][end] - self._prefix_sums[column][column_start])
+                squares = float(self._prefix_squares[column][end] - self._prefix_squares[column][column_start])
+
+                mean = total / count if count else None
+                variance = max(0.0, (squares - total * total / count) / (count - 1)) if count > 1 else None
+                statistics[column] = {'mean': mean, 'variance': variance, 'count': count}
+            return statistics
+
+    def average_returns(self, initial_date, final_date):
+        """
+        Retorna as médias dos retornos do intervalo no mesmo formato do cálculo do relatório.
+
+        Retorna:
+            pd.DataFrame: Uma linha com as colunas 'Media_<ativo>_Retorno' e 'Media_<ativo>_LogRetorno'.
+        """
+        statistics = self.range_statistics(initial_date, final_date)
+        return pd.DataFrame([{
+            average_column(column): np.nan if values['mean'] is None else values['mean']
+            for column, values in statistics.items()
+        }])
+
+    def _daily_frame(self, start, end):
+        """Monta o DataFrame diário (preços e retornos) das linhas [start, end). Deve ser chamado com o lock adquirido."""
+        df = pd.DataFrame({DATE_COLUMN: pd.to_datetime(self._dates[start:end]).date})
+        for column in self._prices:
+            df[column] = self._prices[column][start:end]
+            df[simple_return_column(column)] = self._values[simple_return_column(column)][start:end]
+            df[log_return_column(column)] = self._values[log_return_column(column)][start:end]
+        return df
+
+    def _build_rollups(self):
+        """Recalcula as agregações por semana, mês e ano. Deve ser chamado com o lock adquirido ou na inicialização."""
+        self._rollups, self._period_indexes, self._monthly_partials = {}, {}, []
+        # Quantidade acumulada de cotações válidas de cada ativo, para localizar a primeira cotação de um intervalo
+        self._valid_price_counts = {
+            column: np.concatenate([[0], np.cumsum(valid_price_mask(prices))]) for column, prices in self._prices.items()
+        }
+        if len(self._dates) == 0 or not self._prices:
+            return
+
+        daily_df = self._daily_frame(0, len(self._dates))
+        for resolution in ROLLUP_RESOLUTIONS:
+            self._rollups[resolution] = aggregate_rollup(daily_df, self.price_columns, resolution)
+            # Índice do período (0, 1, 2, ...) de cada pregão, alinhado às linhas das agregações
+            keys = period_keys(self._dates, resolution).asi8
+            self._period_indexes[resolution] = np.concatenate([[0], np.cumsum(keys[1:] != keys[:-1])])
+
+        # Acumuladores das análises de cada mês, alinhados ao índice dos períodos mensais
+        month_starts = np.flatnonzero(np.diff(self._period_indexes[RESOLUTION_MONTHLY], prepend=-1))
+        month_ends = np.append(month_starts[1:], len(self._dates))
+        self._monthly_partials = [
+            partial_from_frame(daily_df.iloc[start:end], self.price_columns, self.analytics_window)
+            for start, end in zip(month_starts, month_ends)
+        ]
+
+    def _range_rows(self, initial_date, final_date):
+        """Linhas [start, end) dos pregões do intervalo. Deve ser chamado com o lock adquirido."""
+        start = int(np.searchsorted(self._dates, np.datetime64(to_date(initial_date), "D"), side="left"))
+        end = int(np.searchsorted(self._dates, np.datetime64(to_date(final_date), "D"), side="right"))
+        return start, end
+
+    def _first_valid_rows(self, start, end):
+        """
+        Linha da primeira cotação válida de cada ativo nas linhas [start, end), em O(log n) (end se não houver).
+        Deve ser chamado com o lock adquirido.
+        """
+        first_rows = {}
+        for column, counts in self._valid_price_counts.items():
+            if end <= start or counts[end] == counts[start]:
+                first_rows[column] = end
+            else:
+                first_rows[column] = int(np.searchsorted(counts, counts[start] + 1, side="left")) - 1
+        return first_rows
+
+    def _range_frame(self, edge_start, edge_end, first_rows):
+        """
+        Monta o DataFrame diário das linhas [edge_start, edge_end) de um intervalo, sem os retornos dos pregões
+        até a primeira cotação válida de cada ativo no intervalo, como no cálculo do relatório.
+        Deve ser chamado com o lock adquirido.
+        """
+        return null_leading_returns(
+            self._daily_frame(edge_start, edge_end),
+            {column: first_row - edge_start for column, first_row in first_rows.items()}
+        )
+
+    def _head_end(self, period_index, start, end, first_rows):
+        """
+        Fim (exclusivo) do trecho inicial de um intervalo que não pode usar as agregações pré-calculadas: vai até o fim
+        do período que contém a primeira cotação válida de todos os ativos. Deve ser chamado com o lock adquirido.
+        """
+        last_first_row = max(start, min(max(first_rows.values(), default=start), end - 1))
+        return int(np.searchsorted(period_index, period_index[last_first_row], side="right"))
+
+    def points_by_resolution(self, initial_date, final_date):
+        """
+        Conta os pontos do intervalo em cada resolução, em O(log n).
+
+        Retorna:
+            dict: Quantidade de pregões ('D') e de semanas, meses e anos ('W', 'M', 'Y') do intervalo.
+        """
+        with self._lock:
+            start, end = self._range_rows(initial_date, final_date)
+            points = {RESOLUTION_DAILY: end - start}
+            for resolution in ROLLUP_RESOLUTIONS:
+                period_index = self._period_indexes.get(resolution)
+                points[resolution] = int(period_index[end - 1] - period_index[start] + 1) if end > start else 0
+            return points
+
+    def rollup(self, initial_date, final_date, resolution):
+        """
+        Retorna os preços e retornos do intervalo agregados na resolução informada.
+
+        Os períodos inteiramente contidos no intervalo vêm das agregações pré-calculadas; o primeiro e o último
+        período são recalculados apenas com os pregões do intervalo. Assim como no relatório, a primeira cotação
+        válida de cada ativo no intervalo não tem retorno (o trecho inicial recalculado se estende até ela).
+
+        Parâmetros:
+            initial_date (str|date): Data inicial do intervalo.
+            final_date (str|date): Data final do intervalo.
+            resolution (str): 'D', 'W', 'M' ou 'Y'.
+
+        Retorna:
+            pd.DataFrame: Uma linha por período, no formato de rollups.aggregate_rollup
+            (ou os dados diários, na resolução 'D').
+        """
+        with self._lock:
+            start, end = self._range_rows(initial_date, final_date)
+            first_rows = self._first_valid_rows(start, end)
+
+            def edge_frame(edge_start, edge_end):
+                return self._range_frame(edge_start, edge_end, first_rows)
+
+            if resolution == RESOLUTION_DAILY or end <= start:
+                return edge_frame(start, end)
+
+            period_index = self._period_indexes[resolution]
+            head_end = self._head_end(period_index, start, end, first_rows)
+            last_period = int(period_index[end - 1])
+            last_period_start = int(np.searchsorted(period_index, last_period, side="left"))
+            if head_end > last_period_start:
+                return aggregate_rollup(edge_frame(start, end), self.price_columns, resolution)
+
+            return pd.concat([
+                aggregate_rollup(edge_frame(start, head_end), self.price_columns, resolution),
+                self._rollups[resolution].iloc[int(period_index[head_end]):last_period],
+                aggregate_rollup(edge_frame(last_period_start, end), self.price_columns, resolution)
+            ], ignore_index=True)
+
+    def analytics_partial(self, initial_date, final_date):
+        """
+        Retorna o acumulador das análises do intervalo (ver analytics.partial_from_frame).
+
+        Os meses inteiramente contidos no intervalo usam os acumuladores pré-calculados; o primeiro e o último mês
+        são calculados apenas com os pregões do intervalo. Assim como no relatório, a primeira cotação válida de cada
+        ativo no intervalo não tem retorno.
+
+        Parâmetros:
+            initial_date (str|date): Data inicial do intervalo.
+            final_date (str|date): Data final do intervalo.
+
+        Retorna:
+            dict: Acumulador do intervalo.
+        """
+        with self._lock:
+            start, end = self._range_rows(initial_date, final_date)
+            if end <= start:
+                return empty_partial(self.price_columns, self.analytics_window)
+
+            first_rows = self._first_valid_rows(start, end)
+
+            def edge_partial(edge_start, edge_end):
+                df = self._range_frame(edge_start, edge_end, first_rows)
+                return partial_from_frame(df, self.price_columns, self.analytics_window)
+
+            period_index = self._period_indexes[RESOLUTION_MONTHLY]
+            head_end = self._head_end(period_index, start, end, first_rows)
+            last_period = int(period_index[end - 1])
+            last_period_start = int(np.searchsorted(period_index, last_period, side="left"))
+            if head_end > last_period_start:
+                return edge_partial(start, end)
+
+            return merge_all(
+                [edge_partial(start, head_end)] +
+                self._monthly_partials[int(period_index[head_end]):last_period] +
+                [edge_partial(last_period_start, end)],
+                self.price_columns, self.analytics_window
+            )
+
+    def rolling_statistics(self, initial_date, final_date, resolution=RESOLUTION_DAILY, windows=DEFAULT_WINDOWS):
+        """
+        Calcula as estatísticas móveis dos retornos diários do intervalo (ver rolling.calculate_rolling_statistics).
+        Nas resoluções agregadas, retorna os valores do último pregão de cada período, alinhados às linhas de rollup.
+
+        Parâmetros:
+            initial_date (str|date): Data inicial do intervalo.
+            final_date (str|date): Data final do intervalo.
+            resolution (str): 'D', 'W', 'M' ou 'Y'.
+            windows (tuple): Tamanhos das janelas, em pregões.
+
+        Retorna:
+            pd.DataFrame: Coluna 'Date' e as estatísticas móveis, uma linha por pregão ou por período.
+        """
+        with self._lock:
+            start, end = self._range_rows(initial_date, final_date)
+            # As janelas incluem os pregões anteriores ao intervalo (halo), recortados após o cálculo
+            halo_start = max(0, start - halo_rows(windows))
+            rolling_df = calculate_rolling_statistics(self._daily_frame(halo_start, end), self.price_columns, windows)
+            rolling_df = rolling_df.iloc[start - halo_start:].reset_index(drop=True)
+
+            if resolution == RESOLUTION_DAILY or end <= start:
+                return rolling_df
+
+            period_index = self._period_indexes[resolution][start:end]
+            last_rows = np.flatnonzero(np.diff(period_index, append=period_index[-1] + 1))
+            return rolling_df.iloc[last_rows].reset_index(drop=True)
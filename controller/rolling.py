@@ -0,0 +1,190 @@
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from returns import DATE_COLUMN, simple_return_column
+
+# Janelas móveis dos relatórios, em pregões (cerca de um mês, um trimestre e um ano)
+DEFAULT_WINDOWS = (20, 60, 252)
+
+def halo_rows(windows=DEFAULT_WINDOWS):
+    """
+    Pregões anteriores a um período que completam a maior janela já no primeiro pregão do período. As estatísticas
+    são calculadas sobre esses pregões e o período, e depois recortadas ao período.
+    """
+    return max(windows) - 1
+
+
+def rolling_mean_column(price_column, window):
+    """Nome da coluna da média móvel dos retornos simples de um ativo (ex: 'DOLAR', 20 -> 'DOLAR_MediaMovel20')."""
+    return f"{price_column}_MediaMovel{window}"
+
+
+def rolling_std_column(price_column, window):
+    """Nome da coluna do desvio padrão móvel dos retornos simples de um ativo (ex: 'DOLAR_DesvioMovel20')."""
+    return f"{price_column}_DesvioMovel{window}"
+
+
+def rolling_correlation_column(first_column, second_column, window):
+    """Nome da coluna da correlação móvel dos retornos de dois ativos (ex: 'CorrelacaoMovel20_S&P500_DOLAR')."""
+    return f"CorrelacaoMovel{window}_{first_column}_{second_column}"
+
+
+def distance_from_high_column(price_column, window):
+    """Nome da coluna da distância do preço à máxima móvel de um ativo (ex: 'DOLAR_DistanciaMaxima20')."""
+    return f"{price_column}_DistanciaMaxima{window}"
+
+
+def _pairs(price_columns):
+    return [(first, second) for index, first in enumerate(price_columns) for second in price_columns[index + 1:]]
+
+
+def rolling_columns(price_columns, windows=DEFAULT_WINDOWS):
+    """
+    Ordem das colunas das estatísticas móveis: para cada janela, a média e o desvio padrão de cada ativo,
+    a correlação de cada par de ativos e a distância de cada ativo à máxima móvel.
+    """
+    columns = []
+    for window in windows:
+        for price_column in price_columns:
+            columns += [rolling_mean_column(price_column, window), rolling_std_column(price_column, window)]
+        columns += [rolling_correlation_column(first, second, window) for first, second in _pairs(price_columns)]
+        columns += [distance_from_high_column(price_column, window) for price_column in price_columns]
+    return columns
+
+
+def window_sums(values, window):
+    """
+    Soma móvel de 'window' linhas em O(n), independentemente do tamanho da janela: cada soma é a diferença entre
+    duas somas acumuladas (a linha que entra é somada e a que sai é subtraída).
+
+    Parâmetros:
+        values (np.ndarray): Valores, sem nulos.
+        window (int): Quantidade de linhas da janela.
+
+    Retorna:
+        np.ndarray: Soma das 'window' linhas terminadas em cada linha; nulo enquanto a janela não está completa.
+    """
+    sums = np.full(len(values), np.nan)
+    if window <= 0 or len(values) < window:
+        return sums
+    prefix = np.concatenate([[0.0], np.cumsum(values, dtype="float64")])
+    sums[window - 1:] = prefix[window:] - prefix[:-window]
+    return sums
+
+
+def _centered(values, valid):
+    """
+    Centraliza os valores válidos na média e zera os nulos. As estatísticas móveis não dependem da translação e as
+    somas acumuladas de valores centralizados não perdem precisão em séries longas.
+    """
+    shift = values[valid].mean() if valid.any() else 0.0
+    return np.where(valid, values - shift, 0.0), shift
+
+
+def rolling_mean_std(values, window):
+    """
+    Média e desvio padrão amostral móveis em O(n), ignorando os valores nulos dentro da janela.
+    A média exige ao menos um valor válido e o desvio padrão, dois.
+
+    Retorna:
+        tuple: Arrays da média e do desvio padrão de cada linha (nulos enquanto a janela não está completa).
+    """
+    values = np.asarray(values, dtype="float64")
+    valid = ~np.isnan(values)
+    centered, shift = _centered(values, valid)
+
+    count = window_sums(valid.astype("float64"), window)
+    total = window_sums(centered, window)
+    squares = window_sums(centered * centered, window)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.where(count >= 1, total / count + shift, np.nan)
+        variance = np.where(count >= 2, (squares - total * total / count) / (count - 1), np.nan)
+    return mean, np.sqrt(np.maximum(variance, 0.0))
+
+
+def rolling_correlation(x, y, window):
+    """
+    Correlação móvel em O(n) entre duas séries, sobre as linhas da janela em que ambas têm valor.
+
+    Retorna:
+        np.ndarray: Correlação de cada linha (nula com menos de dois pares válidos ou variância nula).
+    """
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    valid = ~np.isnan(x) & ~np.isnan(y)
+    x, _ = _centered(x, valid)
+    y, _ = _centered(y, valid)
+
+    count = window_sums(valid.astype("float64"), window)
+    sum_x, sum_y = window_sums(x, window), window_sums(y, window)
+    sum_xx, sum_yy, sum_xy = window_sums(x * x, window), window_sums(y * y, window), window_sums(x * y, window)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        covariance = sum_xy - sum_x * sum_y / count
+        variance_x = sum_xx - sum_x * sum_x / count
+        variance_y = sum_yy - sum_y * sum_y / count
+        denominator = np.sqrt(np.maximum(variance_x, 0.0) * np.maximum(variance_y, 0.0))
+        correlation = np.where((count >= 2) & (denominator > 0), covariance / denominator, np.nan)
+    return np.clip(correlation, -1.0, 1.0)
+
+
+def rolling_max(values, window):
+    """
+    Máximo móvel de 'window' linhas em O(n) com uma fila monotônica (nulo enquanto a janela não está completa):
+    a fila guarda os índices dos candidatos em ordem decrescente de valor, e cada índice entra e sai da fila uma única
+    vez. Valores nulos (NaN) são ignorados.
+    """
+    values = np.asarray(values, dtype="float64").tolist()
+    result = [float("nan")] * len(values)
+    candidates = deque()
+    for index, value in enumerate(values):
+        if value == value:
+            while candidates and values[candidates[-1]] <= value:
+                candidates.pop()
+            candidates.append(index)
+        if candidates and candidates[0] <= index - window:
+            candidates.popleft()
+        if index >= window - 1 and candidates:
+            result[index] = values[candidates[0]]
+    return np.array(result, dtype="float64")
+
+
+def calculate_rolling_statistics(daily_returns_df, price_columns, windows=DEFAULT_WINDOWS):
+    """
+    Calcula as estatísticas móveis dos retornos diários simples: média e desvio padrão de cada ativo, correlação de
+    cada par de ativos e a distância do preço à máxima móvel, em %. Todas as estatísticas são calculadas em O(n),
+    qualquer que seja o tamanho da janela.
+
+    As janelas contam os pregões do DataFrame e só têm valor quando estão completas; para que as janelas longas tenham
+    valor em períodos curtos, o DataFrame deve incluir os halo_rows(windows) pregões anteriores ao período.
+
+    Parâmetros:
+        daily_returns_df (pd.DataFrame): Preços e retornos diários no layout largo, ordenados por data.
+        price_columns (list): Colunas de preço dos ativos; ativos sem retorno no DataFrame são ignorados.
+        windows (tuple): Tamanhos das janelas, em pregões.
+
+    Retorna:
+        pd.DataFrame: Coluna 'Date' e as colunas de rolling_columns, uma linha por pregão.
+    """
+    price_columns = [column for column in price_columns if simple_return_column(column) in daily_returns_df.columns]
+    simple_returns = {
+        column: daily_returns_df[simple_return_column(column)].to_numpy(dtype="float64") for column in price_columns
+    }
+
+    result = {DATE_COLUMN: daily_returns_df[DATE_COLUMN].to_numpy()}
+    for window in windows:
+        for column in price_columns:
+            result[rolling_mean_column(column, window)], result[rolling_std_column(column, window)] = \
+                rolling_mean_std(simple_returns[column], window)
+        for first, second in _pairs(price_columns):
+            result[rolling_correlation_column(first, second, window)] = \
+                rolling_correlation(simple_returns[first], simple_returns[second], window)
+        for column in price_columns:
+            if column in daily_returns_df.columns:
+                prices = daily_returns_df[column].to_numpy(dtype="float64")
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    result[distance_from_high_column(column, window)] = (prices / rolling_max(prices, window) - 1) * 100
+    return pd.DataFrame(result)
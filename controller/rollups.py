@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+from returns import DATE_COLUMN, log_return_column, simple_return_column
+
+RESOLUTION_DAILY = 'D'
+RESOLUTION_WEEKLY = 'W'
+RESOLUTION_MONTHLY = 'M'
+RESOLUTION_YEARLY = 'Y'
+
+# Resoluções em ordem crescente de agregação
+RESOLUTIONS = (RESOLUTION_DAILY, RESOLUTION_WEEKLY, RESOLUTION_MONTHLY, RESOLUTION_YEARLY)
+ROLLUP_RESOLUTIONS = RESOLUTIONS[1:]
+
+RESOLUTION_LABELS = {
+    RESOLUTION_DAILY: 'Diários',
+    RESOLUTION_WEEKLY: 'Semanais',
+    RESOLUTION_MONTHLY: 'Mensais',
+    RESOLUTION_YEARLY: 'Anuais'
+}
+
+# Colunas de abertura, máxima e mínima de cada ativo no período (o fechamento mantém o nome da coluna de preço)
+OPEN_SUFFIX = "_Abertura"
+HIGH_SUFFIX = "_Maxima"
+LOW_SUFFIX = "_Minima"
+
+# Quantidade de pregões de cada período
+TRADING_DAYS_COLUMN = "Pregoes"
+
+# Colunas auxiliares da agregação
+_PERIOD = "period"
+_LOG_GROWTH = "__log_growth"
+
+
+def period_keys(dates, resolution):
+    """
+    Retorna o período (semana, mês ou ano) de cada data.
+
+    Parâmetros:
+        dates (array-like): Datas dos pregões.
+        resolution (str): 'W', 'M' ou 'Y'.
+
+    Retorna:
+        pd.PeriodIndex: Período de cada data.
+    """
+    return pd.PeriodIndex(pd.to_datetime(pd.Series(dates)), freq=resolution)
+
+
+def rollup_columns(price_columns):
+    """
+    Ordem das colunas do resultado agregado: data do último pregão, quantidade de pregões e, para cada ativo,
+    abertura, máxima, mínima, fechamento e os retornos simples e logarítmico do período.
+    """
+    columns = [DATE_COLUMN, TRADING_DAYS_COLUMN]
+    for price_column in price_columns:
+        columns += [
+            f"{price_column}{OPEN_SUFFIX}", f"{price_column}{HIGH_SUFFIX}", f"{price_column}{LOW_SUFFIX}", price_column,
+            simple_return_column(price_column), log_return_column(price_column)
+        ]
+    return columns
+
+
+def aggregate_rollup(daily_returns_df, price_columns, resolution):
+    """
+    Agrega os preços e retornos diários por semana, mês ou ano.
+
+    Os preços são resumidos em abertura, máxima, mínima e fechamento (o primeiro e o último fechamento válidos do
+    período). O retorno simples do período é o retorno composto dos retornos diários e o retorno logarítmico é a soma
+    dos retornos logarítmicos diários, ambos em %. Períodos sem retornos válidos resultam em nulo.
+
+    Parâmetros:
+        daily_returns_df (pd.DataFrame): Preços e retornos diários no layout largo, ordenados por data.
+        price_columns (list): Colunas de preço dos ativos.
+        resolution (str): 'W', 'M' ou 'Y'.
+
+    Retorna:
+        pd.DataFrame: Uma linha por período, datada pelo último pregão do período.
+    """
+    if daily_returns_df.empty:
+        return pd.DataFrame(columns=rollup_columns(price_columns))
+
+    df = daily_returns_df.copy()
+    df[_PERIOD] = period_keys(df[DATE_COLUMN], resolution).asi8
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for price_column in price_columns:
+            df[f"{price_column}{_LOG_GROWTH}"] = np.log1p(df[simple_return_column(price_column)].astype("float64") / 100)
+    grouped = df.groupby(_PERIOD, sort=True)
+
+    result = pd.DataFrame({
+        DATE_COLUMN: grouped[DATE_COLUMN].max(),
+        TRADING_DAYS_COLUMN: grouped[DATE_COLUMN].size()
+    })
+    for price_column in price_columns:
+        prices = grouped[price_column]
+        result[f"{price_column}{OPEN_SUFFIX}"] = prices.first()
+        result[f"{price_column}{HIGH_SUFFIX}"] = prices.max()
+        result[f"{price_column}{LOW_SUFFIX}"] = prices.min()
+        result[price_column] = prices.last()
+        result[simple_return_column(price_column)] = np.expm1(grouped[f"{price_column}{_LOG_GROWTH}"].sum(min_count=1)) * 100
+        result[log_return_column(price_column)] = grouped[log_return_column(price_column)].sum(min_count=1)
+
+    return result[rollup_columns(price_columns)].reset_index(drop=True)
+
+
+def choose_resolution(points_by_resolution, max_points):
+    """
+    Escolhe a resolução mais detalhada cuja quantidade de pontos cabe no limite informado.
+    Se nenhuma couber, retorna a resolução mais agregada.
+
+    Parâmetros:
+        points_by_resolution (dict): Quantidade de pontos do período em cada resolução.
+        max_points (int): Quantidade máxima de pontos por série (0 sempre escolhe a resolução diária).
+
+    Retorna:
+        str: Resolução escolhida ('D', 'W', 'M' ou 'Y').
+    """
+    if not max_points:
+        return RESOLUTION_DAILY
+    for resolution in RESOLUTIONS:
+        if points_by_resolution[resolution] <= max_points:
+            return resolution
+    return RESOLUTIONS[-1]
@@ -0,0 +1,221 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+DATE_COLUMN = "Date"
+PARTITION_COLUMNS = ["year", "month"]
+
+# Tipos lógicos do dataset de mercado e a sua representação em cada backend
+DATE_TYPE = "date"
+PRICE_TYPE = "float64"
+PARTITION_TYPE = "int32"
+
+_ARROW_TYPES = {DATE_TYPE: pa.date32(), PRICE_TYPE: pa.float64(), PARTITION_TYPE: pa.int32()}
+_SPARK_TYPES = {DATE_TYPE: "DateType", PRICE_TYPE: "DoubleType", PARTITION_TYPE: "IntegerType"}
+_PANDAS_TYPES = {DATE_TYPE: "object", PRICE_TYPE: "float64", PARTITION_TYPE: "int32"}
+
+
+def market_data_fields(price_columns, partitioned=False):
+    """
+    Registro dos campos do dataset de mercado: a data do pregão e uma coluna de preço float64 por ativo
+    (e, no dataset particionado lido pelo Spark, as colunas de partição ano/mês).
+    É a única definição do schema, usada tanto pela ingestão quanto pelo job Spark.
+
+    Parâmetros:
+        price_columns (list): Nomes das colunas de preço (uma por ativo).
+        partitioned (bool): Se True, inclui as colunas de partição 'year' e 'month'.
+
+    Retorna:
+        list: Pares (nome da coluna, tipo lógico).
+    """
+    fields = [(DATE_COLUMN, DATE_TYPE)] + [(column, PRICE_TYPE) for column in price_columns]
+    if partitioned:
+        fields += [(column, PARTITION_TYPE) for column in PARTITION_COLUMNS]
+    return fields
+
+
+def arrow_schema(price_columns):
+    """
+    Schema Arrow do dataset de mercado (arquivos Parquet de cada partição).
+    """
+    return pa.schema([pa.field(name, _ARROW_TYPES[field_type]) for name, field_type in market_data_fields(price_columns)])
+
+
+def spark_schema(price_columns):
+    """
+    Schema Spark do dataset Parquet particionado por ano/mês, usado na leitura sem inferência de tipos.
+    """
+    from pyspark.sql import types as T
+
+    return T.StructType([
+        T.StructField(name, getattr(T, _SPARK_TYPES[field_type])(), True)
+        for name, field_type in market_data_fields(price_columns, partitioned=True)
+    ])
+
+
+def cast_market_data(df, price_columns):
+    """
+    Converte as colunas de um DataFrame pandas para os tipos do schema: 'Date' como date e os preços como float64.
+    Valores de preço que não são numéricos resultam em nulo.
+
+    Retorna:
+        pd.DataFrame: Cópia do DataFrame apenas com as colunas do schema.
+    """
+    df = df[[name for name, _ in market_data_fields(price_columns)]].copy()
+    df[DATE_COLUMN] = pd.to_datetime(df[DATE_COLUMN]).dt.date
+    for column in price_columns:
+        df[column] = pd.to_numeric(df[column], errors="coerce").astype(_PANDAS_TYPES[PRICE_TYPE])
+    return df
+
+
+def valid_price_mask(values):
+    """
+    Indica os preços válidos: presentes, finitos e positivos. Cotações ausentes, NaN e preços menores ou iguais
+    a zero (como os zeros gravados por versões antigas da ingestão) são tratados como ausentes no cálculo dos retornos.
+    """
+    values = np.asarray(values, dtype="float64")
+    return np.isfinite(values) & (values > 0)
+
+
+def _empty_column_quality():
+    return {'valid': 0, 'missing': 0, 'invalid': 0, 'leading_gap': 0, 'trailing_gap': 0, 'longest_gap': 0}
+
+
+def _merge_column_quality(first, second, first_rows, second_rows):
+    """Combina a qualidade de uma coluna em dois trechos consecutivos (o primeiro anterior ao segundo)."""
+    return {
+        'valid': first['valid'] + second['valid'],
+        'missing': first['missing'] + second['missing'],
+        'invalid': first['invalid'] + second['invalid'],
+        'leading_gap': first['leading_gap'] + (second['leading_gap'] if first['leading_gap'] == first_rows else 0),
+        'trailing_gap': second['trailing_gap'] + (first['trailing_gap'] if second['trailing_gap'] == second_rows else 0),
+        'longest_gap': max(first['longest_gap'], second['longest_gap'], first['trailing_gap'] + second['leading_gap'])
+    }
+
+
+def empty_quality(price_columns):
+    """
+    Resumo de qualidade vazio (ver quality_from_frame).
+    """
+    return {
+        'rows': 0, 'first_date': None, 'last_date': None, 'duplicate_dates': 0, 'unordered_dates': 0,
+        'columns': {column: _empty_column_quality() for column in price_columns}
+    }
+
+
+def quality_from_frame(df, price_columns):
+    """
+    Valida um trecho do dataset (ex: uma partição mensal) e resume a sua qualidade em uma única passada vetorizada.
+
+    Para cada coluna de preço são contados os preços válidos, ausentes (nulos ou NaN) e inválidos (infinitos ou
+    menores ou iguais a zero), além das sequências de pregões sem preço válido no início, no fim e a mais longa
+    do trecho. Os resumos de trechos consecutivos são combinados por merge_quality, de modo que a validação
+    acompanha a escrita das partições sem uma leitura adicional do dataset.
+
+    Parâmetros:
+        df (pd.DataFrame): Preços com a coluna 'Date', na ordem em que foram gravados.
+        price_columns (list): Colunas de preço dos ativos.
+
+    Retorna:
+        dict: Quantidade de linhas, primeira e última data, datas repetidas e fora de ordem e,
+        em 'columns', a qualidade de cada coluna de preço.
+    """
+    quality = empty_quality(price_columns)
+    rows = len(df)
+    if rows == 0:
+        return quality
+
+    dates = pd.to_datetime(df[DATE_COLUMN]).to_numpy(dtype="datetime64[D]")
+    steps = np.diff(dates).astype("int64")
+    quality.update({
+        'rows': rows,
+        'first_date': str(dates.min()),
+        'last_date': str(dates.max()),
+        'duplicate_dates': int(rows - len(np.unique(dates))),
+        'unordered_dates': int(np.count_nonzero(steps < 0))
+    })
+
+    positions = np.arange(rows)
+    for column in price_columns:
+        if column not in df.columns:
+            quality['columns'][column] = dict(_empty_column_quality(), missing=rows, leading_gap=rows, trailing_gap=rows, longest_gap=rows)
+            continue
+
+        values = df[column].to_numpy(dtype="float64")
+        valid = valid_price_mask(values)
+        missing = np.isnan(values)
+        valid_rows = positions[valid]
+
+        if len(valid_rows):
+            # Maior intervalo entre dois preços válidos consecutivos, além das bordas do trecho
+            inner_gap = int(np.diff(valid_rows).max()) - 1 if len(valid_rows) > 1 else 0
+            leading_gap, trailing_gap = int(valid_rows[0]), int(rows - 1 - valid_rows[-1])
+        else:
+            inner_gap, leading_gap, trailing_gap = rows, rows, rows
+
+        quality['columns'][column] = {
+            'valid': len(valid_rows),
+            'missing': int(np.count_nonzero(missing)),
+            'invalid': int(rows - len(valid_rows) - np.count_nonzero(missing)),
+            'leading_gap': leading_gap,
+            'trailing_gap': trailing_gap,
+            'longest_gap': max(inner_gap, leading_gap, trailing_gap)
+        }
+    return quality
+
+
+def merge_quality(first, second):
+    """
+    Combina os resumos de qualidade de dois trechos consecutivos do dataset (o primeiro anterior ao segundo).
+    Colunas ausentes em um dos trechos são tratadas como sem dados nele.
+
+    Retorna:
+        dict: Resumo de qualidade dos dois trechos.
+    """
+    if not first['rows']:
+        return second
+    if not second['rows']:
+        return first
+
+    columns = {}
+    for column in list(first['columns']) + [column for column in second['columns'] if column not in first['columns']]:
+        first_column = first['columns'].get(column) or dict(
+            _empty_column_quality(), missing=first['rows'], leading_gap=first['rows'],
+            trailing_gap=first['rows'], longest_gap=first['rows']
+        )
+        second_column = second['columns'].get(column) or dict(
+            _empty_column_quality(), missing=second['rows'], leading_gap=second['rows'],
+            trailing_gap=second['rows'], longest_gap=second['rows']
+        )
+        columns[column] = _merge_column_quality(first_column, second_column, first['rows'], second['rows'])
+
+    return {
+        'rows': first['rows'] + second['rows'],
+        'first_date': min(first['first_date'], second['first_date']),
+        'last_date': max(first['last_date'], second['last_date']),
+        'duplicate_dates': first['duplicate_dates'] + second['duplicate_dates'] + int(first['last_date'] == second['first_date']),
+        'unordered_dates': first['unordered_dates'] + second['unordered_dates'] + int(first['last_date'] > second['first_date']),
+        'columns': columns
+    }
+
+
+def format_quality(quality):
+    """
+    Resume a qualidade dos dados em uma linha de texto para os logs e o e-mail do relatório.
+    """
+    if not quality or not quality['rows']:
+        return "sem pregões no período"
+
+    parts = [f"{quality['rows']} pregão(ões) de {quality['first_date']} a {quality['last_date']}"]
+    for column, values in quality['columns'].items():
+        unusable = values['missing'] + values['invalid']
+        if unusable:
+            parts.append(
+                f"{column}: {values['missing']} cotação(ões) ausente(s), {values['invalid']} inválida(s), "
+                f"maior sequência sem cotação de {values['longest_gap']} pregão(ões)"
+            )
+    if quality['duplicate_dates'] or quality['unordered_dates']:
+        parts.append(f"{quality['duplicate_dates']} data(s) repetida(s), {quality['unordered_dates']} fora de ordem")
+    if len(parts) == 1:
+        parts.append("nenhuma cotação ausente ou inválida")
+    return "; ".join(parts)
@@ -1,8 +1,40 @@
+import argparse
+import json
+import os
 import sys
+import pyarrow as pa
 from pyspark.sql import SparkSession
-from pyspark.sql.functions import col, lag, avg
-from pyspark.sql.window import Window
+from pyspark.sql.functions import col, lit, to_date
 from datetime import datetime
+from analytics import DEFAULT_ROLLING_WINDOW, partial_from_spark
+from returns import calculate_average_returns_spark, calculate_returns_spark
+from schema import spark_schema
+
+# Colunas de preço usadas quando o job é executado sem a lista de ativos
+DEFAULT_PRICE_COLUMNS = ["DOLAR", "S&P500"]
+
+# Resultados com até esta quantidade de linhas são devolvidos diretamente ao controller em um arquivo Arrow;
+# acima dela, são gravados no HDFS
+DEFAULT_MAX_RESULT_ROWS = 500000
+
+# Chave dos metadados do arquivo Arrow que guarda as médias dos retornos
+AVERAGE_RETURNS_METADATA_KEY = b"average_returns"
+
+# Chave dos metadados do arquivo Arrow que guarda o acumulador das análises (volatilidade, drawdown, correlações)
+ANALYTICS_METADATA_KEY = b"analytics"
+
+# Sistema de arquivos e master Spark do cluster, usados quando o controller não informa outros
+DEFAULT_FILESYSTEM_URL = "hdfs://coordinator:9000"
+DEFAULT_MASTER = "spark://coordinator:7077"
+
+def build_market_data_schema(price_columns):
+    """
+    Monta o schema explícito do dataset Parquet particionado por ano/mês (dispensa a inferência de tipos),
+    a partir do mesmo registro de schema usado pela ingestão (schema.market_data_fields).
+    """
+    return spark_schema(price_columns)
+
+MARKET_DATA_SCHEMA = build_market_data_schema(DEFAULT_PRICE_COLUMNS)
 
 def validate_date_format(date_string):
     """
@@ -14,40 +46,115 @@ def validate_date_format(date_string):
     except ValueError:
         return False
 
-def read_data(spark, hdfs_input_dataset_path):
+def read_data(spark, hdfs_input_dataset_path, price_columns=DEFAULT_PRICE_COLUMNS, partitions=None):
     """
-    Lê o dataset do HDFS e retorna um DataFrame do Spark.
+    Lê o dataset Parquet particionado do HDFS com schema explícito e retorna um DataFrame do Spark.
+    Se 'partitions' for informado (caminhos relativos 'year=yyyy/month=m' com pregões no período, obtidos das
+    estatísticas do dataset pelo controller), apenas essas partições são listadas e lidas.
     """
     try:
-        df = spark.read \
-            .format("csv") \
-            .option("header", "true") \
-            .option("inferSchema", "true") \
-            .option("sep", ",") \
-            .load(hdfs_input_dataset_path)
+        reader = spark.read.schema(build_market_data_schema(price_columns))
+        if partitions:
+            base_path = hdfs_input_dataset_path.rstrip("/")
+            return reader.option("basePath", base_path).parquet(*[f"{base_path}/{partition}" for partition in partitions])
+        df = reader.parquet(hdfs_input_dataset_path)
         return df
     except Exception as e:
-        print(f"Erro ao ler o dataset do HDFS: {e}")
-        sys.exit(-1)
+        error_message = f"Erro ao ler o dataset do HDFS: {e}"
+        print(error_message)
+        raise RuntimeError(error_message)
 
-def calculate_daily_returns(df, initial_date, final_date):
+def filter_date_range(df, initial_date, final_date):
     """
-    Filtra os dados entre as datas especificadas e calcula os retornos diários.
+    Filtra o dataset pelo intervalo de datas. O filtro sobre as colunas de partição (ano/mês) permite ao Spark
+    ler apenas as partições do intervalo, e o filtro sobre 'Date' é repassado ao leitor Parquet.
+    """
+    initial = datetime.strptime(initial_date, "%Y-%m-%d")
+    final = datetime.strptime(final_date, "%Y-%m-%d")
+    partition_key = col("year") * 100 + col("month")
+
+    return df.filter(
+        (partition_key >= initial.year * 100 + initial.month) & (partition_key <= final.year * 100 + final.month)
+    ).filter(
+        (col("Date") >= to_date(lit(initial_date))) & (col("Date") <= to_date(lit(final_date)))
+    ).drop("year", "month")
+
+def calculate_daily_returns(df, initial_date, final_date, price_columns=DEFAULT_PRICE_COLUMNS):
+    """
+    Filtra os dados entre as datas especificadas e calcula os retornos diários simples e logarítmicos de todos os ativos.
     """
     try:
-        filtered_df = df.filter((col("Date") >= initial_date) & (col("Date") <= final_date))
-        window_spec = Window.orderBy("Date")
-        
-        daily_returns = filtered_df.withColumn(
-            "DOLAR_Retorno", (col("DOLAR") / lag("DOLAR").over(window_spec) - 1) * 100
-        ).withColumn(
-            "S&P500_Retorno", (col("S&P500") / lag("S&P500").over(window_spec) - 1) * 100
-        )
-        
-        return daily_returns
+        filtered_df = filter_date_range(df, initial_date, final_date)
+        return calculate_returns_spark(filtered_df, price_columns)
     except Exception as e:
-        print(f"Erro ao calcular os retornos diários: {e}")
-        sys.exit(-1)
+        error_message = f"Erro ao calcular os retornos diários: {e}"
+        print(error_message)
+        raise RuntimeError(error_message)
+
+def calculate_average_returns(daily_returns):
+    """
+    Calcula as médias dos retornos diários.
+    """
+    return calculate_average_returns_spark(daily_returns)
+
+def run_report(spark, hdfs_input_dataset_path, initial_date, final_date, price_columns=DEFAULT_PRICE_COLUMNS,
+               partitions=None):
+    """
+    Executa o cálculo do relatório sobre uma SparkSession existente e retorna os DataFrames
+    dos retornos diários e das médias. Utilizada tanto pelo spark-submit quanto pela sessão persistente do controller.
+    """
+    # Ler os dados do HDFS. Cotações ausentes permanecem nulas e são excluídas no cálculo dos retornos
+    df = read_data(spark, hdfs_input_dataset_path, price_columns, partitions)
+
+    # Calcular os retornos diários e as médias
+    daily_returns = calculate_daily_returns(df, initial_date, final_date, price_columns)
+    average_returns = calculate_average_returns(daily_returns)
+
+    return daily_returns, average_returns
+
+def run_analytics(daily_returns, price_columns=DEFAULT_PRICE_COLUMNS, window=DEFAULT_ROLLING_WINDOW):
+    """
+    Calcula o acumulador das análises do período (volatilidade, drawdown, Sharpe, retorno acumulado, janela móvel,
+    correlações e covariâncias) em uma única agregação sobre os retornos diários. O resumo é feito pelo controller.
+    """
+    try:
+        return partial_from_spark(daily_returns, price_columns, window)
+    except Exception as e:
+        error_message = f"Erro ao calcular as análises dos retornos: {e}"
+        print(error_message)
+        raise RuntimeError(error_message)
+
+def collect_results(daily_returns, average_returns, max_rows=DEFAULT_MAX_RESULT_ROWS):
+    """
+    Coleta os resultados no driver (via Arrow) quando os retornos diários têm até 'max_rows' linhas.
+    Retorna None se o resultado for maior, indicando que ele deve ser gravado no HDFS.
+    """
+    daily_returns_df = daily_returns.limit(max_rows + 1).toPandas()
+    if len(daily_returns_df) > max_rows:
+        print(f"Resultado com mais de {max_rows} linhas; os resultados serão gravados no HDFS.")
+        return None
+    return daily_returns_df, average_returns.toPandas()
+
+def save_result_file(daily_returns_df, average_returns_df, path, analytics_partial=None):
+    """
+    Salva os resultados em um único arquivo Arrow IPC local: os retornos diários como tabela e as médias
+    e o acumulador das análises nos metadados do schema. O arquivo é gravado com outro nome e renomeado
+    ao final, de forma atômica.
+    """
+    averages = average_returns_df.iloc[0].to_dict() if not average_returns_df.empty else {}
+    table = pa.Table.from_pandas(daily_returns_df, preserve_index=False)
+    metadata = {**(table.schema.metadata or {}), AVERAGE_RETURNS_METADATA_KEY: json.dumps(averages)}
+    if analytics_partial is not None:
+        metadata[ANALYTICS_METADATA_KEY] = json.dumps(analytics_partial)
+    table = table.replace_schema_metadata(metadata)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = f"{path}.tmp"
+    with pa.OSFile(temporary_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(temporary_path, path)
+    print(f"Resultados salvos com sucesso em {path} ({table.num_rows} linhas).")
 
 def save_to_hdfs(df, path, description):
     """
@@ -64,39 +171,47 @@ def save_to_hdfs(df, path, description):
         print(f"Erro ao salvar {description} no HDFS: {e}")
         sys.exit(-1)
 
-def main(initial_date, final_date, job_id, dataset_path):
+def main(initial_date, final_date, job_id, dataset_path, result_path=None, max_result_rows=DEFAULT_MAX_RESULT_ROWS,
+         price_columns=DEFAULT_PRICE_COLUMNS, filesystem_url=DEFAULT_FILESYSTEM_URL, master=DEFAULT_MASTER,
+         analytics_window=DEFAULT_ROLLING_WINDOW, partitions=None):
     # Validar formato das datas
     if not validate_date_format(initial_date) or not validate_date_format(final_date):
         print("Formato de data inválido. Use o formato 'yyyy-MM-dd'.")
         sys.exit(-1)
 
     # Caminhos dos dados no HDFS
-    hdfs_input_dataset_path = f"hdfs://coordinator:9000{dataset_path}"
-    hdfs_output_daily_returns_path = f"hdfs://coordinator:9000/output/{job_id}/daily_returns"
-    hdfs_output_average_daily_return_path = f"hdfs://coordinator:9000/output/{job_id}/average_daily_return"
+    hdfs_input_dataset_path = f"{filesystem_url}{dataset_path}"
+    hdfs_output_daily_returns_path = f"{filesystem_url}/output/{job_id}/daily_returns"
+    hdfs_output_average_daily_return_path = f"{filesystem_url}/output/{job_id}/average_daily_return"
 
+    spark = None
     try:
         # Inicializar a sessão Spark
         spark = SparkSession.builder \
             .appName("Market Data Analysis") \
-            .master("spark://coordinator:7077") \
+            .master(master) \
+            .config("spark.sql.execution.arrow.pyspark.enabled", "true") \
             .getOrCreate()
 
-        # Ler os dados do HDFS
-        df = read_data(spark, hdfs_input_dataset_path)
-        df = df.fillna(0)  # Substituir valores nulos por 0
-        
-        # Calcular os retornos diários
-        daily_returns = calculate_daily_returns(df, initial_date, final_date)
+        # Calcular os retornos diários e as médias
+        daily_returns, average_returns = run_report(
+            spark, hdfs_input_dataset_path, initial_date, final_date, price_columns, partitions
+        )
+
+        # Resultados pequenos são entregues ao controller em um único arquivo Arrow local, sem passar pelo HDFS,
+        # junto com o acumulador das análises. Os retornos ficam em cache para que a coleta e as análises
+        # não releiam o dataset
+        if result_path:
+            daily_returns = daily_returns.persist()
+            results = collect_results(daily_returns, average_returns, max_result_rows)
+            if results is not None:
+                save_result_file(*results, result_path, run_analytics(daily_returns, price_columns, analytics_window))
+                return
         
         # Salvar os retornos diários no HDFS
         save_to_hdfs(daily_returns, hdfs_output_daily_returns_path, "Retornos Diários")
         
-        # Calcular e salvar as médias dos retornos diários
-        average_returns = daily_returns.agg(
-            avg("DOLAR_Retorno").alias("Media_DOLAR_Retorno"),
-            avg("S&P500_Retorno").alias("Media_SP500_Retorno")
-        )
+        # Salvar as médias dos retornos diários
         save_to_hdfs(average_returns, hdfs_output_average_daily_return_path, "Médias dos Retornos Diários")
 
     except Exception as e:
@@ -105,19 +220,33 @@ def main(initial_date, final_date, job_id, dataset_path):
 
     finally:
         # Encerrar a sessão Spark
-        spark.stop()
+        if spark is not None:
+            spark.stop()
 
 if __name__ == "__main__":
     # Verificar os argumentos de entrada
-    if len(sys.argv) != 5:
-        print("Uso: spark_job.py <initial_date> <final_date> <job_id> <dataset_path>")
-        print("Exemplo: spark_job.py 2024-09-15 2024-09-20 123e4567-e89b-12d3-a456-426614174000 /input/market_data.csv")
-        sys.exit(-1)
-
-    initial_date = sys.argv[1]
-    final_date = sys.argv[2]
-    job_id = sys.argv[3]
-    dataset_path = sys.argv[4]
+    parser = argparse.ArgumentParser(
+        prog="spark_job.py",
+        epilog="Exemplo: spark_job.py 2024-09-15 2024-09-20 123e4567-e89b-12d3-a456-426614174000 /input/market_data "
+               "--result-path /tmp/output/123e4567-e89b-12d3-a456-426614174000/result.arrow --columns 'DOLAR,S&P500'"
+    )
+    parser.add_argument("initial_date")
+    parser.add_argument("final_date")
+    parser.add_argument("job_id")
+    parser.add_argument("dataset_path")
+    parser.add_argument("--result-path", help="Arquivo Arrow local onde os resultados pequenos são entregues ao controller.")
+    parser.add_argument("--max-result-rows", type=int, default=DEFAULT_MAX_RESULT_ROWS)
+    parser.add_argument("--columns", default=",".join(DEFAULT_PRICE_COLUMNS), help="Colunas de preço dos ativos, separadas por vírgula.")
+    parser.add_argument("--filesystem-url", default=DEFAULT_FILESYSTEM_URL, help="URL base do sistema de arquivos do dataset e dos resultados.")
+    parser.add_argument("--master", default=DEFAULT_MASTER, help="URL do master Spark.")
+    parser.add_argument("--analytics-window", type=int, default=DEFAULT_ROLLING_WINDOW, help="Pregões da janela móvel das análises.")
+    parser.add_argument("--partitions", default="", help="Partições do dataset com pregões no período ('year=yyyy/month=m'), separadas por vírgula. Padrão: todas.")
+    args = parser.parse_args()
 
     # Executar o job principal
-    main(initial_date, final_date, job_id, dataset_path)
+    main(
+        args.initial_date, args.final_date, args.job_id, args.dataset_path,
+        args.result_path, args.max_result_rows, [column for column in args.columns.split(",") if column],
+        args.filesystem_url.rstrip("/"), args.master, args.analytics_window,
+        [partition for partition in args.partitions.split(",") if partition]
+    )
@@ -0,0 +1,220 @@
+import importlib.util
+import os
+import queue
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+SPARK_MODE_SUBMIT = 'submit'
+SPARK_MODE_SESSION = 'session'
+SPARK_MODES = (SPARK_MODE_SUBMIT, SPARK_MODE_SESSION)
+
+DEFAULT_SPARK_MASTER = 'spark://coordinator:7077'
+DEFAULT_APP_NAME = 'Market Data Analysis'
+
+# Histórico das últimas execuções, usado para comparar os modos de execução
+_job_timings = deque(maxlen=200)
+_job_timings_lock = threading.Lock()
+
+# Módulos de script já carregados, indexados por (caminho, data de modificação)
+_script_modules = {}
+_script_modules_lock = threading.Lock()
+
+
+def get_spark_mode():
+    """
+    Retorna o modo de execução dos jobs Spark configurado na variável de ambiente 'CONTROLLER_SPARK_MODE'.
+
+    Retorna:
+        str: 'submit' para o fluxo legado via spark-submit ou 'session' para a sessão Spark persistente.
+
+    Exceções:
+        ValueError: Lançada se o modo configurado não for reconhecido.
+    """
+    mode = (os.getenv('CONTROLLER_SPARK_MODE') or SPARK_MODE_SUBMIT).strip().lower()
+    if mode not in SPARK_MODES:
+        raise ValueError(f"Modo de execução Spark inválido: '{mode}'. Valores aceitos: {', '.join(SPARK_MODES)}.")
+    return mode
+
+
+def get_spark_master():
+    """
+    Retorna a URL do master Spark configurada na variável de ambiente 'COORDINATOR_URL'
+    (padrão 'spark://coordinator:7077'; 'local[N]' executa o Spark no próprio controller).
+    """
+    return os.getenv('COORDINATOR_URL') or DEFAULT_SPARK_MASTER
+
+
+class SparkSessionPool:
+    """
+    Mantém uma SparkSession aquecida (e um pequeno conjunto de sessões derivadas) durante toda a vida do controller,
+    evitando o custo de inicialização da JVM, registro do driver e aquisição de executores a cada relatório.
+
+    Todas as sessões do pool compartilham o mesmo SparkContext; cada uma possui configurações SQL e
+    views temporárias isoladas, o que permite executar jobs concorrentes sem interferência.
+    """
+
+    def __init__(self, master=None, app_name=DEFAULT_APP_NAME, size=1):
+        if size < 1:
+            raise ValueError("O tamanho do pool de sessões Spark deve ser maior ou igual a 1.")
+
+        self.master = master or get_spark_master()
+        self.app_name = app_name
+        self.size = size
+        self._base_session = None
+        self._sessions = queue.Queue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _get_base_session(self):
+        """Cria a SparkSession base na primeira utilização."""
+        if self._base_session is None:
+            from pyspark.sql import SparkSession
+
+            print(f"Iniciando SparkSession persistente em {self.master}...")
+            self._base_session = SparkSession.builder \
+                .appName(self.app_name) \
+                .master(self.master) \
+                .config("spark.sql.execution.arrow.pyspark.enabled", "true") \
+                .config("spark.scheduler.mode", "FAIR") \
+                .getOrCreate()
+            print("SparkSession persistente iniciada com sucesso.")
+        return self._base_session
+
+    def _create_session(self):
+        """Cria uma nova sessão do pool compartilhando o SparkContext da sessão base."""
+        base_session = self._get_base_session()
+        session = base_session if self._created == 0 else base_session.newSession()
+        self._created += 1
+        return session
+
+    @contextmanager
+    def acquire(self):
+        """
+        Obtém uma sessão do pool, bloqueando enquanto todas estiverem em uso.
+
+        Retorna:
+            SparkSession: Sessão disponível para a execução do job.
+        """
+        with self._lock:
+            if self._sessions.empty() and self._created < self.size:
+                self._sessions.put(self._create_session())
+
+        session = self._sessions.get()
+        try:
+            yield session
+        finally:
+            self._sessions.put(session)
+
+    def stop(self):
+        """Encerra a SparkSession base e, consequentemente, todas as sessões do pool."""
+        with self._lock:
+            if self._base_session is not None:
+                print("Encerrando SparkSession persistente...")
+                self._base_session.stop()
+                self._base_session = None
+                self._sessions = queue.Queue()
+                self._created = 0
+
+
+_session_pool = None
+_session_pool_lock = threading.Lock()
+
+
+def get_session_pool():
+    """
+    Retorna o pool de sessões Spark do processo, criando-o na primeira chamada.
+
+    Variáveis de ambiente:
+        COORDINATOR_URL: URL do master Spark (padrão 'spark://coordinator:7077').
+        CONTROLLER_SPARK_POOL_SIZE: Quantidade máxima de sessões simultâneas (padrão 1).
+    """
+    global _session_pool
+    with _session_pool_lock:
+        if _session_pool is None:
+            pool_size = int(os.getenv('CONTROLLER_SPARK_POOL_SIZE') or 1)
+            _session_pool = SparkSessionPool(size=pool_size)
+        return _session_pool
+
+
+def stop_session_pool():
+    """Encerra o pool de sessões Spark, se tiver sido iniciado."""
+    with _session_pool_lock:
+        if _session_pool is not None:
+            _session_pool.stop()
+
+
+def load_script_module(script_path):
+    """
+    Carrega o script Spark como módulo Python para execução dentro do processo do controller.
+    O módulo é recarregado automaticamente quando o arquivo é modificado.
+
+    Parâmetros:
+        script_path (str): Caminho do script Spark.
+
+    Retorna:
+        module: Módulo carregado a partir do script.
+
+    Exceções:
+        FileNotFoundError: Lançada se o script especificado não for encontrado.
+    """
+    if not os.path.isfile(script_path):
+        raise FileNotFoundError(f"O script especificado não foi encontrado: {script_path}")
+
+    cache_key = (os.path.abspath(script_path), os.path.getmtime(script_path))
+    with _script_modules_lock:
+        module = _script_modules.get(cache_key)
+        if module is None:
+            spec = importlib.util.spec_from_file_location("spark_report_script", script_path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            _script_modules[cache_key] = module
+        return module
+
+
+def record_job_timing(job_id, mode, spark_seconds, total_seconds, success=True):
+    """
+    Registra o tempo de execução de um job para comparação entre os modos de execução.
+
+    Parâmetros:
+        job_id (str): ID do job executado.
+        mode (str): Modo de execução utilizado ('submit', 'session' ou 'cache' quando o resultado veio do cache).
+        spark_seconds (float): Tempo gasto na etapa Spark, em segundos.
+        total_seconds (float): Tempo total do job, em segundos.
+        success (bool): Indica se o job terminou com sucesso.
+    """
+    timing = {
+        'job_id': job_id,
+        'mode': mode,
+        'spark_seconds': round(spark_seconds, 3) if spark_seconds is not None else None,
+        'total_seconds': round(total_seconds, 3),
+        'success': success,
+        'finished_at': datetime.now().isoformat(timespec='seconds')
+    }
+    with _job_timings_lock:
+        _job_timings.append(timing)
+    print(f"Job {job_id} finalizado no modo '{mode}' em {total_seconds:.2f}s (Spark: {timing['spark_seconds']}s).")
+
+
+def get_job_timings():
+    """
+    Retorna o histórico recente de tempos de execução e as médias por modo.
+
+    Retorna:
+        dict: Dicionário com as execuções recentes ('jobs') e o resumo por modo ('summary').
+    """
+    with _job_timings_lock:
+        timings = list(_job_timings)
+
+    summary = {}
+    for mode in sorted({t['mode'] for t in timings if t['mode']} | set(SPARK_MODES)):
+        mode_timings = [t for t in timings if t['mode'] == mode and t['success']]
+        spark_timings = [t['spark_seconds'] for t in mode_timings if t['spark_seconds'] is not None]
+        summary[mode] = {
+            'count': len(mode_timings),
+            'avg_spark_seconds': round(sum(spark_timings) / len(spark_timings), 3) if spark_timings else None,
+            'avg_total_seconds': round(sum(t['total_seconds'] for t in mode_timings) / len(mode_timings), 3) if mode_timings else None
+        }
+
+    return {'jobs': timings, 'summary': summary}
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+from dataset import migrate_csv_snapshots, partition_paths_for_range
+from ingest import ingest_market_data, list_local_partitions, load_manifest
+
+
+class FixtureFetcher:
+    """Fonte de dados com preços sintéticos em dias úteis."""
+
+    def fetch(self, tickers, start_date, end_date):
+        dates = pd.bdate_range(start_date, end_date)
+        return pd.DataFrame({ticker: np.linspace(2, 3, len(dates)) for ticker in tickers}, index=dates)
+
+
+def test_migrated_dataset_keeps_full_coverage(tmp_path):
+    csv_dir, dataset_dir = tmp_path / "csv", str(tmp_path / "dataset")
+    csv_dir.mkdir()
+    dates = pd.bdate_range('2020-01-01', '2020-12-15')
+    pd.DataFrame({'Date': dates.date, 'DOLAR': np.linspace(1, 2, len(dates))}).to_csv(
+        csv_dir / "market_data_2020-12-15.csv", index=False
+    )
+    migrate_csv_snapshots(str(csv_dir), dataset_dir)
+
+    ingest_market_data(FixtureFetcher(), ['BRL=X'], {'BRL=X': 'DOLAR'}, dataset_dir, end_date='2020-12-31')
+
+    # A cobertura parte do histórico migrado, não da sobreposição buscada novamente
+    assert load_manifest(dataset_dir)['tickers']['DOLAR'] == {
+        'ticker': 'BRL=X', 'first_date': '2020-01-01', 'last_date': '2020-12-31'
+    }
+    assert list_local_partitions(dataset_dir) == partition_paths_for_range('2020-01-01', '2020-12-31')
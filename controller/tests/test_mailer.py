@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+
+from benchmark_pipeline import SmtpSink
+from mailer import SMTP_SECURITY_NONE, MailQueue, SmtpConnectionPool, build_message
+
+
+@pytest.fixture
+def start_sink():
+    """Inicia servidores SMTP locais, com as respostas ao DATA programadas (ver SmtpSink), encerrados ao fim do teste."""
+    sinks = []
+
+    def start(data_replies=None):
+        sink = SmtpSink(data_replies=data_replies)
+        sink.start()
+        sinks.append(sink)
+        return sink
+
+    yield start
+    for sink in sinks:
+        sink.shutdown()
+        sink.server_close()
+
+
+def make_queue(sink, size=2, **kwargs):
+    pool = SmtpConnectionPool('127.0.0.1', sink.server_address[1], security=SMTP_SECURITY_NONE, size=size, timeout=5)
+    return MailQueue(pool, **kwargs)
+
+
+def send_all(mail_queue, count):
+    """Envia 'count' mensagens e aguarda o resultado de todas. Retorna a lista de (sucesso, erro, segundos)."""
+    results = []
+    done = threading.Event()
+    lock = threading.Lock()
+    start_time = time.monotonic()
+
+    def on_result(success, error):
+        with lock:
+            results.append((success, error, time.monotonic() - start_time))
+            if len(results) == count:
+                done.set()
+
+    for index in range(count):
+        message = build_message(f"Relatório {index}", "Segue o relatório.", 'origem@example.com', 'destino@example.com')
+        mail_queue.submit(message, on_result)
+    assert done.wait(timeout=10), "As mensagens não foram processadas a tempo."
+    return results
+
+
+def test_pool_reuses_connections(start_sink):
+    smtp_sink = start_sink()
+    mail_queue = make_queue(smtp_sink, size=2, workers=2)
+    try:
+        results = send_all(mail_queue, 20)
+    finally:
+        mail_queue.stop()
+
+    assert all(success for success, _, _ in results)
+    assert smtp_sink.stats()['messages'] == 20
+    assert mail_queue.stats()['connections_opened'] <= 2
+    assert smtp_sink.stats()['connections'] <= 2
+
+
+def test_temporary_failure_is_retried_with_backoff(start_sink):
+    smtp_sink = start_sink(["451 Tente mais tarde", "451 Tente mais tarde"])
+    mail_queue = make_queue(smtp_sink, size=1, workers=1, base_delay=0.1, max_delay=1.0)
+    try:
+        [(success, error, seconds)] = send_all(mail_queue, 1)
+    finally:
+        mail_queue.stop()
+
+    stats = mail_queue.stats()
+    assert success and error is None
+    assert stats['retries'] == 2 and stats['sent'] == 1 and stats['failed'] == 0
+    # Esperas de 0,1s e 0,2s antes da segunda e da terceira tentativas
+    assert seconds >= 0.3
+    # A conexão continua utilizável após a resposta 4xx
+    assert stats['connections_opened'] == 1
+
+
+def test_dropped_connection_is_discarded_and_retried(start_sink):
+    smtp_sink = start_sink([SmtpSink.DISCONNECT])
+    mail_queue = make_queue(smtp_sink, size=1, workers=1, base_delay=0.05)
+    try:
+        [(success, _, _)] = send_all(mail_queue, 1)
+    finally:
+        mail_queue.stop()
+
+    stats = mail_queue.stats()
+    assert success
+    assert stats['retries'] == 1
+    assert stats['connections_opened'] == 2
+
+
+def test_permanent_failure_is_not_retried(start_sink):
+    smtp_sink = start_sink(["550 Caixa postal inexistente"])
+    mail_queue = make_queue(smtp_sink, size=1, workers=1, base_delay=0.05)
+    try:
+        [(success, error, _)] = send_all(mail_queue, 1)
+    finally:
+        mail_queue.stop()
+
+    stats = mail_queue.stats()
+    assert not success and '550' in error
+    assert stats['retries'] == 0 and stats['failed'] == 1
+    assert stats['recent_failures'][0]['attempts'] == 1
+    assert smtp_sink.stats()['messages'] == 0
+
+
+def test_jpg_attachment_uses_jpeg_mime_type(tmp_path):
+    chart_path = tmp_path / "grafico.jpg"
+    chart_path.write_bytes(b"\xff\xd8\xff\xe0")
+
+    message = build_message("Relatório", "Segue o gráfico.", 'origem@example.com', 'destino@example.com', [str(chart_path)])
+
+    [attachment] = list(message.iter_attachments())
+    assert attachment.get_content_type() == 'image/jpeg'
+    assert attachment.get_filename() == "grafico.jpg"
@@ -0,0 +1,189 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analytics import partial_from_frame, summarize
+from batching import slice_report_data
+from dataset import read_partitioned_dataset, write_partitioned_dataset
+from returns import calculate_average_returns, calculate_returns, simple_return_column
+from returns_store import ReturnsStore
+from rolling import calculate_rolling_statistics, rolling_correlation_column, rolling_std_column
+from rollups import aggregate_rollup
+
+PRICE_COLUMNS = ['DOLAR', 'S&P500']
+
+# Intervalos consultados: o período inteiro, intervalos que começam e terminam no meio dos meses, um intervalo que
+# começa na lacuna longa de cotações do S&P500 e um intervalo que começa em um dia sem cotação do DOLAR
+RANGES = [
+    ('2019-01-01', '2021-12-31'),
+    ('2019-05-07', '2019-05-30'),
+    ('2020-03-05', '2020-08-20'),
+    ('2020-04-01', '2021-02-03'),
+    ('2020-06-09', '2020-12-31'),
+]
+
+
+def build_market_data(seed=1):
+    """Preços sintéticos em dias úteis, com cotações ausentes, preços zerados e uma lacuna longa entre meses."""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2019-01-01', '2021-12-31')
+    df = pd.DataFrame({
+        'Date': dates.date,
+        'DOLAR': 4 * np.exp(np.cumsum(rng.normal(0, 0.01, len(dates)))),
+        'S&P500': 3000 * np.exp(np.cumsum(rng.normal(0, 0.01, len(dates))))
+    })
+    for column in PRICE_COLUMNS:
+        df.loc[rng.choice(len(dates), 60, replace=False), column] = np.nan
+        df.loc[rng.choice(len(dates), 10, replace=False), column] = 0.0
+    df.loc[(dates >= '2020-03-01') & (dates < '2020-05-10'), 'S&P500'] = np.nan
+    df.loc[dates == '2020-06-09', 'DOLAR'] = np.nan
+    return df
+
+
+def reference_returns(dataset_dir, initial_date, final_date):
+    """Retornos diários do intervalo calculados do zero, como no relatório."""
+    return calculate_returns(read_partitioned_dataset(dataset_dir, initial_date, final_date), PRICE_COLUMNS)
+
+
+def assert_nested_close(actual, expected, path="resultado"):
+    """Compara dicionários aninhados, com tolerância nos valores numéricos."""
+    if isinstance(expected, dict):
+        assert set(actual) == set(expected), path
+        for key in expected:
+            assert_nested_close(actual[key], expected[key], f"{path}.{key}")
+    elif isinstance(expected, float) and actual is not None:
+        assert actual == pytest.approx(expected, rel=1e-9, abs=1e-12, nan_ok=True), path
+    else:
+        assert actual == expected, path
+
+
+def assert_stores_equal(actual, expected):
+    """Compara as consultas de duas tabelas de retornos em todos os intervalos."""
+    for initial_date, final_date in RANGES:
+        assert_nested_close(
+            actual.range_statistics(initial_date, final_date), expected.range_statistics(initial_date, final_date)
+        )
+        for resolution in ('W', 'M', 'Y'):
+            pd.testing.assert_frame_equal(
+                actual.rollup(initial_date, final_date, resolution), expected.rollup(initial_date, final_date, resolution),
+                check_dtype=False, rtol=1e-9
+            )
+        assert_nested_close(
+            summarize(actual.analytics_partial(initial_date, final_date)),
+            summarize(expected.analytics_partial(initial_date, final_date))
+        )
+        pd.testing.assert_frame_equal(
+            actual.rolling_statistics(initial_date, final_date), expected.rolling_statistics(initial_date, final_date),
+            check_dtype=False, rtol=1e-9
+        )
+
+
+@pytest.fixture(scope="module")
+def dataset_dir(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("dataset"))
+    write_partitioned_dataset(build_market_data(), path, PRICE_COLUMNS)
+    return path
+
+
+@pytest.fixture(scope="module")
+def store(dataset_dir, tmp_path_factory):
+    returns_store = ReturnsStore(str(tmp_path_factory.mktemp("returns")))
+    returns_store.update(dataset_dir, PRICE_COLUMNS, 1)
+    return returns_store
+
+
+@pytest.mark.parametrize("initial_date, final_date", RANGES)
+def test_range_statistics_match_calculate_returns(store, dataset_dir, initial_date, final_date):
+    daily_returns_df = reference_returns(dataset_dir, initial_date, final_date)
+    statistics = store.range_statistics(initial_date, final_date)
+
+    for column in daily_returns_df.columns:
+        if column not in statistics:
+            continue
+        values = daily_returns_df[column].dropna()
+        assert statistics[column]['count'] == len(values), column
+        assert statistics[column]['mean'] == pytest.approx(values.mean(), rel=1e-9), column
+        assert statistics[column]['variance'] == pytest.approx(values.var(), rel=1e-7), column
+
+
+@pytest.mark.parametrize("resolution", ['W', 'M', 'Y'])
+@pytest.mark.parametrize("initial_date, final_date", RANGES)
+def test_rollup_matches_aggregate_rollup(store, dataset_dir, initial_date, final_date, resolution):
+    expected = aggregate_rollup(reference_returns(dataset_dir, initial_date, final_date), PRICE_COLUMNS, resolution)
+
+    rollup_df = store.rollup(initial_date, final_date, resolution)
+
+    pd.testing.assert_frame_equal(rollup_df, expected.reset_index(drop=True), check_dtype=False, rtol=1e-9)
+    assert len(rollup_df) == store.points_by_resolution(initial_date, final_date)[resolution]
+
+
+@pytest.mark.parametrize("initial_date, final_date", RANGES)
+def test_analytics_partial_matches_partial_from_frame(store, dataset_dir, initial_date, final_date):
+    daily_returns_df = reference_returns(dataset_dir, initial_date, final_date)
+
+    assert_nested_close(
+        summarize(store.analytics_partial(initial_date, final_date)),
+        summarize(partial_from_frame(daily_returns_df, PRICE_COLUMNS, store.analytics_window))
+    )
+
+
+@pytest.mark.parametrize("initial_date, final_date", RANGES)
+def test_rolling_statistics_match_calculate_rolling_statistics(store, dataset_dir, initial_date, final_date):
+    # As janelas incluem os pregões anteriores ao intervalo: o resultado é o do histórico completo, recortado
+    history_df = calculate_rolling_statistics(reference_returns(dataset_dir, None, final_date), PRICE_COLUMNS)
+    history_df['Date'] = pd.to_datetime(history_df['Date'])
+    expected = history_df[history_df['Date'] >= initial_date].reset_index(drop=True)
+
+    rolling_df = store.rolling_statistics(initial_date, final_date)
+
+    rolling_df['Date'] = pd.to_datetime(rolling_df['Date'])
+    pd.testing.assert_frame_equal(rolling_df, expected, check_dtype=False, rtol=1e-9, atol=1e-12)
+
+
+def test_rolling_statistics_fill_long_windows_of_short_ranges(store):
+    rolling_df = store.rolling_statistics('2021-03-01', '2021-03-31')
+
+    assert rolling_df[rolling_std_column('DOLAR', 252)].notna().all()
+    assert rolling_df[rolling_correlation_column('DOLAR', 'S&P500', 60)].notna().all()
+
+
+def test_incremental_update_matches_full_rebuild(tmp_path):
+    market_data = build_market_data()
+    dates = pd.to_datetime(market_data['Date'])
+    dataset_dir = str(tmp_path / "dataset")
+
+    # Versão 1 até maio de 2021; na versão 2 chegam os meses seguintes e a correção de uma cotação de maio
+    write_partitioned_dataset(market_data[dates < '2021-06-01'], dataset_dir, PRICE_COLUMNS)
+    incremental = ReturnsStore(str(tmp_path / "incremental"))
+    incremental.update(dataset_dir, PRICE_COLUMNS, 1)
+
+    market_data.loc[dates == '2021-05-20', 'DOLAR'] *= 1.05
+    write_partitioned_dataset(market_data[dates >= '2021-05-01'], dataset_dir, PRICE_COLUMNS)
+    incremental.update(dataset_dir, PRICE_COLUMNS, 2, since_date='2021-05-01')
+
+    rebuilt = ReturnsStore(str(tmp_path / "rebuilt"))
+    rebuilt.update(dataset_dir, PRICE_COLUMNS, 2)
+
+    assert_stores_equal(incremental, rebuilt)
+
+    # A tabela gravada em disco é carregada com as mesmas somas acumuladas e rollups
+    reloaded = ReturnsStore(str(tmp_path / "incremental"))
+    assert reloaded.dataset_version == 2
+    assert_stores_equal(reloaded, rebuilt)
+
+
+def test_slice_matches_standalone_calculation_when_first_quote_is_missing(dataset_dir):
+    # O DOLAR não tem cotação em 2020-06-09: o seu primeiro retorno no recorte é o do pregão seguinte à primeira
+    # cotação válida, como no cálculo isolado do intervalo
+    union_df = reference_returns(dataset_dir, '2020-01-01', '2021-12-31')
+    initial_date, final_date = '2020-06-09', '2020-12-31'
+
+    sliced_df, average_df = slice_report_data(union_df, initial_date, final_date)
+    expected_df = reference_returns(dataset_dir, initial_date, final_date)
+
+    assert pd.isna(sliced_df.loc[:1, simple_return_column('DOLAR')]).all()
+    assert pd.notna(sliced_df.loc[1, simple_return_column('S&P500')])
+    sliced_df['Date'] = pd.to_datetime(sliced_df['Date'])
+    expected_df['Date'] = pd.to_datetime(expected_df['Date'])
+    pd.testing.assert_frame_equal(sliced_df, expected_df, check_dtype=False, rtol=1e-12)
+    pd.testing.assert_frame_equal(average_df, calculate_average_returns(expected_df), check_dtype=False, rtol=1e-12)